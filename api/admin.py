@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Branch, Appointment, FAQEntry, ChatMessage
+from .models import User, Branch, Appointment, FAQEntry, ChatMessage, LLMCall, SlotOccupancy
+from .context_cache import bump_context_version
 from django import forms
 from django.contrib import admin
 from .models import User
@@ -74,13 +75,36 @@ class UserAdmin(admin.ModelAdmin):
 
 @admin.register(Branch)
 class BranchAdmin(admin.ModelAdmin):
-    list_display = ("name", "city", "address", "open_time", "close_time", "slot_minutes")
+    list_display = ("name", "city", "address", "open_time", "close_time", "slot_minutes", "capacity")
     list_filter = ("city",)
     search_fields = ("name", "city", "address")
 
 
+class AppointmentAdminForm(forms.ModelForm):
+    """
+    Aktivan termin u punom slotu odbija se već u formi; Appointment.save to
+    svakako proverava (booking.sync_occupancy), ali bi tada admin dobio grešku 500.
+    """
+    class Meta:
+        model = Appointment
+        fields = "__all__"
+
+    def clean(self):
+        cleaned = super().clean()
+        branch, start_time = cleaned.get("branch"), cleaned.get("start_time")
+        if cleaned.get("status") != "booked" or branch is None or start_time is None:
+            return cleaned
+        if getattr(self.instance, "_held_slot", None) == (branch.id, start_time):
+            return cleaned
+        full = SlotOccupancy.objects.filter(branch=branch, start_time=start_time, booked__gte=branch.capacity)
+        if full.exists():
+            raise forms.ValidationError("Termin je već zauzet (popunjen kapacitet filijale).")
+        return cleaned
+
+
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
+    form = AppointmentAdminForm
     list_display = ("id", "user", "branch", "start_time", "status", "created_at")
     list_filter = ("status", "branch", "start_time")
     search_fields = ("user__username", "branch__name", "branch__address")
@@ -97,9 +121,11 @@ class FAQEntryAdmin(admin.ModelAdmin):
 
     def activate_selected(self, request, queryset):
         queryset.update(is_active=True)
+        bump_context_version()
 
     def deactivate_selected(self, request, queryset):
         queryset.update(is_active=False)
+        bump_context_version()
 
     activate_selected.short_description = "Activate selected FAQ entries"
     deactivate_selected.short_description = "Deactivate selected FAQ entries"
@@ -114,3 +140,10 @@ class ChatMessageAdmin(admin.ModelAdmin):
 
     def short_content(self, obj):
         return (obj.content[:80] + "...") if len(obj.content) > 80 else obj.content
+
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "kind", "outcome", "intent", "model", "prompt_tokens", "completion_tokens", "latency_ms")
+    list_filter = ("kind", "outcome", "intent", "stream")
+    ordering = ("-created_at",)
@@ -0,0 +1,207 @@
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.utils import timezone
+
+from .context_cache import get_snapshot
+from .slots import free_slots, next_free_slots
+from .text_normalize import fold
+
+_WORD_RE = re.compile(r"\w+")
+_DMY_RE = re.compile(r"\b(\d{1,2})\.\s?(\d{1,2})\.?(?:\s?(\d{4})\.?)?(?!\d)")
+_ISO_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+
+_RELATIVE_DAYS = {"danas": 0, "sutra": 1, "prekosutra": 2}
+_WEEKDAYS = {
+    0: ("ponedeljak", "ponedeljka", "ponedeljku"),
+    1: ("utorak", "utorka", "utorku"),
+    2: ("sreda", "sredu", "srede"),
+    3: ("četvrtak", "četvrtka", "četvrtku"),
+    4: ("petak", "petka"),
+    5: ("subota", "subotu", "subote"),
+    6: ("nedelja", "nedelju", "nedelje"),
+}
+_WEEKDAY_BY_WORD = {fold(w): d for d, words in _WEEKDAYS.items() for w in words}
+_DAY_LABELS = ("u ponedeljak", "u utorak", "u sredu", "u četvrtak", "u petak", "u subotu", "u nedelju")
+
+# Reči koje ne razlikuju filijale po imenu.
+_GENERIC_NAME_WORDS = frozenset({"filijala", "filijale", "ekspozitura", "poslovnica", "banka", "centar"})
+
+MAX_LISTED = 5
+MAX_SLOT_BRANCHES = 3
+MAX_SLOTS_SHOWN = 8
+
+
+def _stem(word: str) -> str:
+    """Grubo skidanje padežnog nastavka: "Beograd" hvata i "Beogradu", "Novi Sad" i "Novom Sadu"."""
+    cut = 3 if len(word) >= 7 else 2
+    return word[: max(3, len(word) - cut)]
+
+
+def _stems(name: str, skip=frozenset()) -> Tuple[str, ...]:
+    return tuple(_stem(w) for w in _WORD_RE.findall(fold(name)) if w not in skip)
+
+
+def _mentions(tokens: Sequence[str], stems: Tuple[str, ...]) -> bool:
+    n = len(stems)
+    if not n:
+        return False
+    return any(
+        all(tokens[i + j].startswith(stems[j]) for j in range(n))
+        for i in range(len(tokens) - n + 1)
+    )
+
+
+@dataclass(frozen=True)
+class Entities:
+    city: Optional[str]
+    branches: Tuple[Dict, ...]
+    day: Optional[date]
+
+
+def extract_day(tokens: Sequence[str], text: str, today: date) -> Optional[date]:
+    m = _ISO_RE.search(text)
+    if m:
+        try:
+            return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        except ValueError:
+            pass
+
+    m = _DMY_RE.search(text)
+    if m:
+        year = int(m.group(3)) if m.group(3) else today.year
+        try:
+            day = date(year, int(m.group(2)), int(m.group(1)))
+            if not m.group(3) and day < today:
+                day = day.replace(year=year + 1)
+            return day
+        except ValueError:
+            pass  # npr. "8.30" je vreme, ne datum
+
+    for t in tokens:
+        if t in _RELATIVE_DAYS:
+            return today + timedelta(days=_RELATIVE_DAYS[t])
+        if t in _WEEKDAY_BY_WORD:
+            return today + timedelta(days=(_WEEKDAY_BY_WORD[t] - today.weekday()) % 7)
+    return None
+
+
+def extract(message: str, branches: Sequence[Dict], today: Optional[date] = None) -> Entities:
+    """Grad, filijala i datum iz poruke; filijale i gradovi se prepoznaju iz snapshot-a."""
+    text = fold(message)
+    tokens = _WORD_RE.findall(text)
+    today = today or timezone.localdate()
+
+    by_name = tuple(b for b in branches if _mentions(tokens, _stems(b["name"], _GENERIC_NAME_WORDS)))
+    city = None
+    for c in sorted({b["city"] for b in branches}, key=len, reverse=True):
+        if _mentions(tokens, _stems(c)):
+            city = c
+            break
+
+    if by_name:
+        matched = tuple(b for b in by_name if city is None or b["city"] == city) or by_name
+    elif city:
+        matched = tuple(b for b in branches if b["city"] == city)
+    else:
+        matched = ()
+    return Entities(city=city, branches=matched, day=extract_day(tokens, text, today))
+
+
+def _hours(b: Dict) -> str:
+    return f"{b['open_time'].strftime('%H:%M')} do {b['close_time'].strftime('%H:%M')}"
+
+
+def _more(total: int) -> str:
+    return f" i još {total - MAX_LISTED}" if total > MAX_LISTED else ""
+
+
+def _scope(ents: Entities) -> str:
+    return f" ({ents.city})" if ents.city else ""
+
+
+def hours_reply(message: str) -> Dict:
+    snap = get_snapshot()
+    ents = extract(message, snap.branches)
+    targets = ents.branches or snap.branches
+    if not targets:
+        reply = "Trenutno nema dostupnih filijala."
+    elif len(targets) == 1:
+        b = targets[0]
+        reply = f"Filijala {b['name']} ({b['city']}, {b['address']}) radi od {_hours(b)}."
+    elif len({_hours(b) for b in targets}) == 1:
+        who = "Filijale" + _scope(ents) if ents.branches else "Sve filijale"
+        reply = f"{who} rade od {_hours(targets[0])}."
+    else:
+        lines = [f"{b['name']} ({b['city']}) od {_hours(b)}" for b in targets[:MAX_LISTED]]
+        reply = "Radno vreme filijala: " + "; ".join(lines) + _more(len(targets)) + "."
+    return {"intent": "branches_hours", "reply": reply, "link": "/branches"}
+
+
+def branches_reply(message: str) -> Dict:
+    snap = get_snapshot()
+    ents = extract(message, snap.branches)
+    targets = ents.branches or snap.branches
+    if not targets:
+        return {"intent": "branches_list", "reply": "Trenutno nema dostupnih filijala.", "link": ""}
+
+    lines = [f"{b['name']}, {b['address']} ({b['city']})" for b in targets[:MAX_LISTED]]
+    reply = f"Naše filijale{_scope(ents)}: " + "; ".join(lines) + _more(len(targets)) + "."
+    return {"intent": "branches_list", "reply": reply, "link": "/branches"}
+
+
+def _day_label(day: date, today: date) -> str:
+    delta = (day - today).days
+    if delta == 0:
+        return "danas"
+    if delta == 1:
+        return "sutra"
+    if 1 < delta < 7:
+        return _DAY_LABELS[day.weekday()]
+    return "za " + day.strftime("%d.%m.%Y.")
+
+
+def _slot_line(b: Dict, slots: List) -> str:
+    shown = ", ".join(timezone.localtime(s).strftime("%H:%M") for s in slots[:MAX_SLOTS_SHOWN])
+    rest = f" (ukupno {len(slots)})" if len(slots) > MAX_SLOTS_SHOWN else ""
+    return f"{b['name']} ({b['city']}): {shown}{rest}"
+
+
+def slots_reply(message: str) -> Dict:
+    snap = get_snapshot()
+    today = timezone.localdate()
+    ents = extract(message, snap.branches, today)
+    targets = ents.branches or (snap.branches if len(snap.branches) == 1 else ())
+
+    if not targets:
+        cities = ", ".join(sorted({b["city"] for b in snap.branches}))
+        reply = (
+            f"Za koju filijalu ili grad tražite termin? Imamo filijale u: {cities}."
+            if cities else "Trenutno nema dostupnih filijala."
+        )
+        return {"intent": "appointments_slots", "reply": reply, "link": "/reserve"}
+
+    day = ents.day or today
+    label = _day_label(day, today)
+    if day < today:
+        return {"intent": "appointments_slots", "reply": "Termine mogu da proverim samo od danas nadalje.", "link": "/reserve"}
+
+    lines = []
+    for b in targets[:MAX_SLOT_BRANCHES]:
+        slots = free_slots(b["id"], b["open_time"], b["close_time"], b["slot_minutes"], day)
+        if slots:
+            lines.append(_slot_line(b, slots))
+
+    if lines:
+        reply = f"Slobodni termini {label}: " + "; ".join(lines) + "."
+    elif ents.day is None and (found := next_free_slots(targets, limit=MAX_SLOT_BRANCHES)):
+        # Bez traženog dana: prvi slobodni termini u narednim danima, preko svih filijala.
+        reply = f"Danas nema slobodnih termina{_scope(ents)}. Prvi slobodni: " + "; ".join(
+            f"{b['name']} ({b['city']}) {_day_label(timezone.localdate(s), today)} u {timezone.localtime(s).strftime('%H:%M')}"
+            for s, b in found
+        ) + "."
+    else:
+        reply = f"Nema slobodnih termina {label}{_scope(ents)}. Pokušajte drugi dan."
+    return {"intent": "appointments_slots", "reply": reply, "link": "/reserve"}
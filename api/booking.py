@@ -0,0 +1,121 @@
+"""
+Zakazivanje sa kapacitetom: SlotOccupancy drži broj zauzetih mesta po
+(filijala, termin). Mesto se uzima uslovnim UPDATE-om (booked < capacity)
+u istoj transakciji sa upisom termina, pa nema brojanja Appointment redova
+ni trke između provere i upisa.
+"""
+import os
+import time
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Count, F
+from rest_framework.exceptions import APIException
+
+from .context_cache import bump_context_version
+from .models import Appointment, Branch, SlotOccupancy
+from .slots import slot_cache
+
+# SQLite pod naletom upisa vraća "database is locked"; toliko puta se upis ponavlja.
+BOOKING_RETRIES = max(1, int(os.getenv("BOOKING_RETRIES", "3")))
+
+
+class SlotTaken(APIException):
+    status_code = 409
+    default_detail = "Termin je već zauzet."
+    default_code = "slot_taken"
+
+
+def _take(branch: Branch, start_time: datetime) -> bool:
+    """Uzima jedno mesto u slotu ako ga ima; red se pravi tek pri prvom zakazivanju."""
+    taken = SlotOccupancy.objects.filter(
+        branch=branch, start_time=start_time, booked__lt=branch.capacity
+    ).update(booked=F("booked") + 1)
+    if taken or branch.capacity < 1:
+        return bool(taken)
+    SlotOccupancy.objects.bulk_create([SlotOccupancy(branch=branch, start_time=start_time)], ignore_conflicts=True)
+    return SlotOccupancy.objects.filter(
+        branch=branch, start_time=start_time, booked__lt=branch.capacity
+    ).update(booked=F("booked") + 1) == 1
+
+
+def _held(appt: Appointment) -> Optional[Tuple[int, datetime]]:
+    return (appt.branch_id, appt.start_time) if appt.status == "booked" else None
+
+
+def sync_occupancy(appt: Appointment, deleted: bool = False) -> None:
+    """
+    Usklađuje SlotOccupancy posle save()/delete() mimo book()/cancel() (admin,
+    brisanje korisnika...): oslobađa stari slot i uzima novi uz istu proveru
+    kapaciteta kao book(); pun slot diže SlotTaken i Appointment.save se poništava.
+    Stari slot je onaj koji je red imao pri čitanju iz baze (Appointment.from_db).
+    """
+    old = getattr(appt, "_held_slot", None)
+    new = None if deleted else _held(appt)
+    if old == new:
+        return
+    if old:
+        SlotOccupancy.objects.filter(branch_id=old[0], start_time=old[1], booked__gt=0).update(booked=F("booked") - 1)
+        branch = appt.branch if old[0] == appt.branch_id else Branch.objects.filter(pk=old[0]).first()
+        if branch is not None:
+            slot_cache.invalidate(branch, old[1])
+    if new:
+        if not _take(appt.branch, new[1]):
+            raise SlotTaken()
+        slot_cache.invalidate(appt.branch, new[1])
+    appt._held_slot = new
+
+
+def book(branch: Branch, user, start_time: datetime) -> Appointment:
+    for attempt in range(BOOKING_RETRIES):
+        try:
+            with transaction.atomic():
+                if not _take(branch, start_time):
+                    raise SlotTaken()
+                appt = Appointment(branch=branch, user=user, start_time=start_time)
+                appt._held_slot = _held(appt)  # mesto je već uzeto iznad
+                appt.save(force_insert=True)
+            break
+        except IntegrityError:
+            # uniq_booked_slot_user; uzeto mesto se vraća zajedno sa transakcijom.
+            raise SlotTaken("Već imate zakazan ovaj termin.")
+        except OperationalError as e:
+            if "locked" not in str(e) or attempt == BOOKING_RETRIES - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+    slot_cache.invalidate(branch, start_time)
+    return appt
+
+
+def cancel(appt: Appointment) -> bool:
+    """Otkazuje termin i vraća mesto u slot; False ako je već otkazan (i istovremeno)."""
+    with transaction.atomic():
+        if not Appointment.objects.filter(pk=appt.pk, status="booked").update(status="canceled"):
+            return False
+        SlotOccupancy.objects.filter(
+            branch_id=appt.branch_id, start_time=appt.start_time, booked__gt=0
+        ).update(booked=F("booked") - 1)
+    appt.status = "canceled"
+    appt._held_slot = None
+    slot_cache.invalidate(appt.branch, appt.start_time)
+    return True
+
+
+def rebuild_occupancy(branch_ids: Optional[Iterable[int]] = None) -> int:
+    """Ponovo računa SlotOccupancy iz aktivnih termina (posle uvoza ili izmena mimo API-ja)."""
+    appts = Appointment.objects.filter(status="booked")
+    occupancy = SlotOccupancy.objects.all()
+    if branch_ids is not None:
+        branch_ids = list(branch_ids)
+        appts = appts.filter(branch_id__in=branch_ids)
+        occupancy = occupancy.filter(branch_id__in=branch_ids)
+    rows = [
+        SlotOccupancy(branch_id=r["branch_id"], start_time=r["start_time"], booked=r["n"])
+        for r in appts.values("branch_id", "start_time").annotate(n=Count("id"))
+    ]
+    with transaction.atomic():
+        occupancy.delete()
+        SlotOccupancy.objects.bulk_create(rows, batch_size=500)
+    bump_context_version()  # keširane bitmape punih slotova više ne važe
+    return len(rows)
@@ -0,0 +1,13 @@
+from contextvars import ContextVar
+
+# Kojim putem je odgovorena tekuća chat poruka (po niti / async task-u):
+# faq, router, fast, cache, coalesced, llm, repair_local, repair_remote, fallback.
+_path: ContextVar[str] = ContextVar("chat_path", default="")
+
+
+def mark(name: str) -> None:
+    _path.set(name)
+
+
+def current() -> str:
+    return _path.get()
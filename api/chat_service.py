@@ -0,0 +1,193 @@
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import chat_path
+from .circuit_breaker import CircuitOpenError
+from .context_cache import build_context
+from .faq_matcher import amatch_faq, aroute_message, match_faq, route_message
+from .groq_client import ChatTurn, groq_chat_json, groq_chat_json_async
+from .models import ChatMessage
+from .session_history import SessionHistory
+from .write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+# Frontend bez session_id deli ovu sesiju, pa se za nju istorija ne koristi (vidi _history_key).
+DEFAULT_SESSION = "default"
+HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+# Ukupan rok za odgovor na jednu poruku; LLM dobija ono što ostane posle FAQ/konteksta.
+DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "20"))
+MIN_LLM_SECONDS = float(os.getenv("CHAT_MIN_LLM_SECONDS", "1"))
+
+FALLBACK_REPLY = "Mogu da pomognem sa informacijama o filijalama, terminima, dokumentima i uslugama banke."
+
+
+def fallback_response() -> Dict:
+    return {"intent": "fallback", "reply": FALLBACK_REPLY, "link": ""}
+
+
+chat_log = WriteBehindBuffer(
+    ChatMessage,
+    flush_size=settings.CHAT_LOG_FLUSH_SIZE,
+    flush_interval=settings.CHAT_LOG_FLUSH_INTERVAL,
+    enabled=settings.CHAT_LOG_WRITE_BEHIND,
+)
+
+
+def _history_key(user, session_id: str) -> Optional[str]:
+    """
+    Istorija pripada prijavljenom korisniku; session_id samo razdvaja njegove
+    razgovore. Anonimni session_id niko ne izdaje ni proverava (tuđi se lako
+    pošalje), pa anonimne poruke idu bez istorije, kao i DEFAULT_SESSION.
+    """
+    if session_id == DEFAULT_SESSION or user is None or user.pk is None:
+        return None
+    return f"{user.pk}:{session_id}"
+
+
+def _load_history(key: str, limit: int) -> List[ChatTurn]:
+    chat_log.flush()
+    user_id, _, session_id = key.partition(":")
+    rows = (
+        ChatMessage.objects.filter(user_id=int(user_id), session_id=session_id)
+        .order_by("-created_at", "-id")
+        .values("role", "content")[:limit]
+    )
+    return [{"role": r["role"], "content": r["content"]} for r in reversed(rows)]
+
+
+session_history = SessionHistory(
+    _load_history,
+    max_turns=HISTORY_TURNS,
+    max_sessions=int(os.getenv("CHAT_HISTORY_MAX_SESSIONS", "2000")),
+    max_chars=int(os.getenv("CHAT_HISTORY_MAX_CHARS", "4000000")),
+)
+
+
+def history_for(session_id: str, user=None) -> List[ChatTurn]:
+    key = _history_key(user, session_id)
+    return session_history.get(key) if key else []
+
+
+def save_message(user, session_id: str, role: str, content: str) -> None:
+    chat_log.add(ChatMessage(
+        user=user,
+        session_id=session_id,
+        role=role,
+        content=content,
+    ))
+    key = _history_key(user, session_id)
+    if key:
+        session_history.append(key, role, content)
+
+
+async def asave_message(user, session_id: str, role: str, content: str) -> None:
+    await chat_log.aadd(ChatMessage(
+        user=user,
+        session_id=session_id,
+        role=role,
+        content=content,
+    ))
+    key = _history_key(user, session_id)
+    if key:
+        await sync_to_async(session_history.append)(key, role, content)
+
+
+def llm_time_left(started: float) -> Optional[float]:
+    """Preostalo vreme za LLM, ili None kad ga nema dovoljno (odmah fallback)."""
+    left = DEADLINE_SECONDS - (time.monotonic() - started)
+    return left if left >= MIN_LLM_SECONDS else None
+
+
+def _llm_failed(e: Exception) -> Dict:
+    chat_path.mark("fallback")
+    if isinstance(e, CircuitOpenError):
+        logger.debug("Chat LLM skipped, circuit open")
+    else:
+        logger.info("Chat LLM path failed: %s", e)
+    return fallback_response()
+
+
+def _faq_response(faq: Dict) -> Dict:
+    return {"intent": faq.get("intent", "faq"), "reply": faq["reply"], "link": faq.get("link", "")}
+
+
+def _ai_response(ai: Dict) -> Dict:
+    return {
+        "intent": ai.get("intent", "unknown"),
+        "reply": ai.get("reply", "Nemam odgovor trenutno."),
+        "link": ai.get("link", "") or "",
+    }
+
+
+def answer(msg: str, session_id: str, user=None) -> Dict:
+    """
+    Ceo tok jedne chat poruke: upis pitanja, FAQ (ključne reči pa naučeni
+    router), pa LLM (ili fallback), upis odgovora.
+    LLM dobija ostatak roka CHAT_DEADLINE_SECONDS; dok je prekidač otvoren, odmah ide fallback.
+    """
+    started = time.monotonic()
+    history = history_for(session_id, user)
+    save_message(user, session_id, "user", msg)
+
+    chat_path.mark("")
+    faq = match_faq(msg)
+    if faq:
+        chat_path.mark("faq")
+    else:
+        faq = route_message(msg)
+        if faq:
+            chat_path.mark("router")
+    if faq:
+        out = _faq_response(faq)
+    else:
+        try:
+            context = build_context(msg)
+            left = llm_time_left(started)
+            if left is None:
+                raise TimeoutError("chat deadline exceeded before LLM call")
+            ai = groq_chat_json(msg, context=context, history=history, max_history_turns=HISTORY_TURNS, timeout=left)
+            out = _ai_response(ai)
+        except Exception as e:
+            out = _llm_failed(e)
+
+    save_message(user, session_id, "assistant", out["reply"])
+    return out
+
+
+async def aanswer(msg: str, session_id: str, user=None) -> Dict:
+    started = time.monotonic()
+    history = await sync_to_async(history_for)(session_id, user)
+    await asave_message(user, session_id, "user", msg)
+
+    out: Optional[Dict] = None
+    chat_path.mark("")
+    faq = await amatch_faq(msg)
+    if faq:
+        chat_path.mark("faq")
+    else:
+        faq = await aroute_message(msg)
+        if faq:
+            chat_path.mark("router")
+    if faq:
+        out = _faq_response(faq)
+    else:
+        try:
+            context = await sync_to_async(build_context)(msg)
+            left = llm_time_left(started)
+            if left is None:
+                raise TimeoutError("chat deadline exceeded before LLM call")
+            ai = await groq_chat_json_async(
+                msg, context=context, history=history, max_history_turns=HISTORY_TURNS, timeout=left
+            )
+            out = _ai_response(ai)
+        except Exception as e:
+            out = _llm_failed(e)
+
+    await asave_message(user, session_id, "assistant", out["reply"])
+    return out
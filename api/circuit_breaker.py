@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Prekidač oko spoljnog poziva (Groq), po procesu.
+    - closed: pozivi prolaze; pamti se ishod i trajanje u kliznom prozoru od window sekundi
+    - kad u prozoru ima bar min_calls poziva i udeo grešaka ili sporih poziva
+      (dužih od slow_seconds) pređe failure_rate -> open
+    - open: pozivi se odmah odbijaju (CircuitOpenError) narednih open_seconds
+    - half_open: propušta se najviše probes probnih poziva; uspeh zatvara, greška ponovo otvara
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 30.0,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_seconds: float = 8.0,
+        open_seconds: float = 30.0,
+        probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.clock = clock
+        self._lock = threading.Lock()
+        # (vreme završetka, greška, trajanje)
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(self.clock())
+
+    def allow(self) -> bool:
+        """Da li poziv sme da krene. Posle True obavezno ide record()."""
+        with self._lock:
+            state = self._current_state(self.clock())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def _trip(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self.trips += 1
+
+    def record(self, ok: bool, duration: float) -> None:
+        with self._lock:
+            now = self.clock()
+            bad = not ok or duration > self.slow_seconds
+            state = self._current_state(now)
+
+            if state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if bad:
+                    self._trip(now)
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                return
+            if state == OPEN:
+                return
+
+            self._calls.append((now, bad, duration))
+            self._prune(now)
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, b, _ in self._calls if b)
+                if failures / len(self._calls) >= self.failure_rate:
+                    self._trip(now)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        started = time.monotonic()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self.record(ok, time.monotonic() - started)
+
+    async def acall(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        started = time.monotonic()
+        ok = False
+        try:
+            result = await fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self.record(ok, time.monotonic() - started)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._state = CLOSED
+            self._probes_in_flight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.clock()
+            self._prune(now)
+            state = self._current_state(now)
+            durations = sorted(d for _, _, d in self._calls)
+            failures = sum(1 for _, b, _ in self._calls if b)
+            n = len(durations)
+            return {
+                "name": self.name,
+                "state": state,
+                "window_calls": n,
+                "failure_rate": round(failures / n, 3) if n else 0.0,
+                "p50_ms": round(durations[n // 2] * 1000) if n else None,
+                "p95_ms": round(durations[max(0, int(n * 0.95) - 1)] * 1000) if n else None,
+                "open_for_s": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if state == OPEN else 0,
+                "rejected": self.rejected,
+                "trips": self.trips,
+            }
+
+
+def _env(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+def breaker_from_env(name: str, prefix: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        window=_env(f"{prefix}_WINDOW", "30"),
+        min_calls=int(_env(f"{prefix}_MIN_CALLS", "10")),
+        failure_rate=_env(f"{prefix}_FAILURE_RATE", "0.5"),
+        slow_seconds=_env(f"{prefix}_SLOW_SECONDS", "8"),
+        open_seconds=_env(f"{prefix}_OPEN_SECONDS", "30"),
+        probes=int(_env(f"{prefix}_PROBES", "1")),
+    )
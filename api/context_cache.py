@@ -0,0 +1,92 @@
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from django.core.cache import cache
+
+from .faq_index import faq_index
+from .models import Branch
+
+VERSION_KEY = "api:context_version"
+CONTEXT_FAQ_K = int(os.getenv("CHAT_CONTEXT_FAQ_K", "5"))
+
+
+def context_version() -> str:
+    """
+    Token verzije podataka koji ulaze u kontekst (filijale + FAQ).
+    Čuva se u deljenom Django kešu, pa ga vide svi gunicorn workeri;
+    drugi keševi mogu da ga koriste kao deo ključa.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_context_version() -> str:
+    version = uuid.uuid4().hex
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+@dataclass(frozen=True)
+class ContextSnapshot:
+    version: str
+    branches: Tuple[Dict, ...]
+    text: str
+
+
+def _load_snapshot(version: str) -> ContextSnapshot:
+    branches = tuple(
+        Branch.objects.all().order_by("city", "name").values(
+            "id", "name", "address", "city", "open_time", "close_time", "slot_minutes", "capacity"
+        )
+    )
+    branch_lines = [
+        f"- {b['name']} ({b['city']}): {b['open_time'].strftime('%H:%M')}–{b['close_time'].strftime('%H:%M')}"
+        for b in branches[:10]
+    ]
+
+    text = ""
+    if branch_lines:
+        text = "Filijale (top 10):\n" + "\n".join(branch_lines)
+
+    return ContextSnapshot(version=version, branches=branches, text=text)
+
+
+_lock = threading.Lock()
+_snapshot: Optional[ContextSnapshot] = None
+
+
+def get_snapshot() -> ContextSnapshot:
+    global _snapshot
+    version = context_version()
+    snap = _snapshot
+    if snap is not None and snap.version == version:
+        return snap
+
+    with _lock:
+        snap = _snapshot
+        if snap is None or snap.version != version:
+            snap = _snapshot = _load_snapshot(version)
+    return snap
+
+
+def build_context(message: str = "") -> str:
+    """
+    Filijale iz snapshot-a + FAQ unosi najrelevantniji za poruku (BM25).
+    Kada je sve zagrejano, ne radi nijedan upit ka bazi.
+    """
+    snap = get_snapshot()
+    parts = [snap.text] if snap.text else []
+
+    if message:
+        faqs = faq_index.search(message, snap.version, k=CONTEXT_FAQ_K)
+        faq_lines = [f"- Q: {f['question']} | A: {f['answer'][:120]}..." for f in faqs]
+        if faq_lines:
+            parts.append("FAQ (najrelevantnije):\n" + "\n".join(faq_lines))
+
+    return "\n\n".join(parts)
@@ -0,0 +1,185 @@
+import re
+import threading
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import FAQEntry
+from .text_normalize import fold
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Upoređuje se sa tokenima posle fold, pa su dovoljni oblici sa dijakriticima.
+STOPWORDS = frozenset(fold("""
+a ako ali bi bio biti da do i ih ili iz je jer joj još ka kad kada kako kao ko
+koja koje koji kojim kod li me mi mo na nas ne nego neki ni njih o od ok on ona
+oni ono pa po pri sa sam se si smo ste su ta taj te ti to tu u uz vi za že šta
+""").split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Isto kao faq_matcher: bez dijakritika, ćirilica u latinicu (text_normalize.fold)."""
+    return [t for t in _TOKEN_RE.findall(fold(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    BM25 indeks u memoriji. Dokumenti se dodaju/uklanjaju pojedinačno, a
+    težine se (vektorski, NumPy) preračunavaju tek pri prvoj pretrazi posle izmene.
+    Matrica je u CSC obliku (po terminu), pa upit sabira samo postinge svojih termina.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._vocab: Dict[str, int] = {}
+        self._docs: Dict[Any, Tuple[np.ndarray, np.ndarray]] = {}
+        self._payloads: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._doc_ids: List[Any] = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._docs
+
+    def doc_ids(self):
+        return self._docs.keys()
+
+    def upsert(self, doc_id, text: str, payload: Any = None) -> None:
+        counts = Counter(tokenize(text))
+        with self._lock:
+            term_ids = np.fromiter(
+                (self._vocab.setdefault(t, len(self._vocab)) for t in counts),
+                dtype=np.int32,
+                count=len(counts),
+            )
+            tfs = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            self._docs[doc_id] = (term_ids, tfs)
+            self._payloads[doc_id] = payload
+            self._dirty = True
+
+    def remove(self, doc_id) -> None:
+        with self._lock:
+            if self._docs.pop(doc_id, None) is not None:
+                self._payloads.pop(doc_id, None)
+                self._dirty = True
+
+    def _materialize(self) -> None:
+        doc_ids = list(self._docs)
+        n_docs = len(doc_ids)
+        n_terms = len(self._vocab)
+        if not n_docs:
+            self._doc_ids, self._indptr = [], np.zeros(n_terms + 1, dtype=np.int64)
+            self._rows, self._weights = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            self._dirty = False
+            return
+
+        parts = [self._docs[d] for d in doc_ids]
+        lengths = np.fromiter((len(p[0]) for p in parts), dtype=np.int64, count=n_docs)
+        terms = np.concatenate([p[0] for p in parts])
+        tfs = np.concatenate([p[1] for p in parts])
+        rows = np.repeat(np.arange(n_docs, dtype=np.int32), lengths)
+
+        dl = np.bincount(rows, weights=tfs, minlength=n_docs)
+        avgdl = dl.mean() or 1.0
+        df = np.bincount(terms, minlength=n_terms)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        norm = self.k1 * (1.0 - self.b + self.b * dl[rows] / avgdl)
+        weights = idf[terms] * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+        order = np.argsort(terms, kind="stable")
+        self._rows = rows[order]
+        self._weights = weights[order].astype(np.float32)
+        self._indptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        self._doc_ids = doc_ids
+        self._dirty = False
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[Any, float, Any]]:
+        with self._lock:
+            if self._dirty:
+                self._materialize()
+            term_ids = sorted({self._vocab[t] for t in tokenize(query) if t in self._vocab})
+            if not term_ids or not self._doc_ids:
+                return []
+
+            indptr = self._indptr
+            slices = [slice(indptr[t], indptr[t + 1]) for t in term_ids]
+            rows = np.concatenate([self._rows[s] for s in slices])
+            weights = np.concatenate([self._weights[s] for s in slices])
+            if not len(rows):
+                return []
+
+            scores = np.bincount(rows, weights=weights, minlength=len(self._doc_ids))
+            k = min(k, int(np.count_nonzero(scores)))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [
+                (self._doc_ids[i], float(scores[i]), self._payloads[self._doc_ids[i]])
+                for i in top
+            ]
+
+
+class FAQIndex:
+    """
+    BM25 indeks nad aktivnim FAQEntry redovima. Sinhronizuje se sa bazom samo
+    kada se promeni verzija konteksta, i tada učitava samo nove/izmenjene redove.
+    """
+
+    # Tolerancija za upise koji su se desili tokom prethodne sinhronizacije.
+    SKEW = timedelta(seconds=5)
+
+    def __init__(self):
+        self.index = BM25Index()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._synced_at = None
+
+    def _add(self, row: Dict) -> None:
+        self.index.upsert(row["id"], f"{row['question']} {row['answer']}", row)
+
+    def sync(self, version: str) -> None:
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            started = timezone.now()
+            fields = ("id", "intent", "question", "answer", "link")
+
+            if self._synced_at is None:
+                for row in FAQEntry.objects.filter(is_active=True).values(*fields):
+                    self._add(row)
+            else:
+                active = set(FAQEntry.objects.filter(is_active=True).values_list("id", flat=True))
+                for doc_id in [d for d in self.index.doc_ids() if d not in active]:
+                    self.index.remove(doc_id)
+                new_ids = [i for i in active if i not in self.index]
+                changed = FAQEntry.objects.filter(
+                    Q(id__in=new_ids) | Q(updated_at__gte=self._synced_at - self.SKEW),
+                    is_active=True,
+                ).values(*fields)
+                for row in changed:
+                    self._add(row)
+
+            self._synced_at = started
+            self._version = version
+
+    def search(self, query: str, version: str, k: int = 5) -> List[Dict]:
+        self.sync(version)
+        return [payload for _, _, payload in self.index.search(query, k)]
+
+
+faq_index = FAQIndex()
@@ -1,79 +1,182 @@
 from typing import Optional, Dict
-from .models import Branch
-import requests
+from . import answer_engine
+from .models import FAQEntry
+from .intent_matcher import IntentMatcher, MatcherCache, Target
+from .intent_router import intent_router
+from .context_cache import context_version
+from .text_normalize import fold
+from .weather import WeatherError, aget_current_weather, get_current_weather
+from asgiref.sync import sync_to_async
+
+# Redosled je ujedno i prioritet kada dve namere imaju jednako dug pogodak.
+INTENT_KEYWORDS = (
+    ("weather_current", ("stepeni", "temperatura", "vreme", "vrijeme")),
+    ("branches_hours", ("radno vreme", "radno vrijeme", "kada rade", "kada radi", "do kada radi", "radite", "radite li")),
+    ("branches_list", ("filijale", "poslovnice", "gde se nalazite", "adresa")),
+    ("docs_required", ("dokument", "papiri", "šta mi treba")),
+    ("appointments_slots", ("slobodn", "ima li termin", "ima li mesta")),
+    ("appointments_help", ("termin", "zakaz", "rezerv")),
+)
+
+# Kraća FAQ pitanja bi hvatala previše poruka.
+MIN_FAQ_PATTERN_LEN = 8
+
 
 def normalize(text: str) -> str:
-    return text.lower()
+    """Isto se primenjuje na ključne reči, FAQ pitanja i poruku (vidi text_normalize.fold)."""
+    return fold(text)
+
+
+def _faq_pattern(question: str) -> str:
+    return normalize(question).strip().rstrip("?!. ").strip()
+
+
+def build_matcher() -> IntentMatcher:
+    rules = []
+    for priority, (intent, keywords) in enumerate(INTENT_KEYWORDS):
+        rules.append((Target(intent=intent, priority=priority), [normalize(k) for k in keywords]))
+
+    entries = FAQEntry.objects.filter(is_active=True).order_by("id")
+    for i, entry in enumerate(entries, start=len(rules)):
+        pattern = _faq_pattern(entry.question)
+        if len(pattern) < MIN_FAQ_PATTERN_LEN:
+            continue
+        rules.append((Target(intent=entry.intent, priority=i, payload=entry), [pattern]))
+
+    return IntentMatcher(rules)
+
+
+matcher_cache = MatcherCache(build_matcher, context_version)
+
+
+def _weather_payload(data: Dict) -> Dict:
+    return {
+        "intent": "weather_current",
+        "reply": (
+        f"Trenutno je {round(data['temperature'])}°C u {data['city']}, "
+        f"osjeća se kao {round(data['feels_like'])}°C."
+                ),
+        "link": ""
+    }
+
+
+_WEATHER_UNAVAILABLE = {
+    "intent": "weather_current",
+    "reply": "Ne mogu trenutno da dohvatim vremensku prognozu.",
+    "link": ""
+}
+
+
+def _weather_reply(msg: str) -> Dict:
+    try:
+        return _weather_payload(get_current_weather())
+    except WeatherError:
+        return dict(_WEATHER_UNAVAILABLE)
+
+
+async def _aweather_reply(msg: str) -> Dict:
+    try:
+        return _weather_payload(await aget_current_weather())
+    except WeatherError:
+        return dict(_WEATHER_UNAVAILABLE)
+
+
+def _docs_reply(msg: str) -> Dict:
+    return {
+        "intent": "docs_required",
+        "reply": (
+            "Potrebna dokumentacija zavisi od usluge. "
+            "Za otvaranje računa obično je potrebna lična karta, "
+            "a za kredite i dodatna finansijska dokumentacija."
+        ),
+        "link": ""
+    }
+
+
+def _appointments_reply(msg: str) -> Dict:
+    return {
+        "intent": "appointments_help",
+        "reply": (
+            "Termin se zakazuje izborom filijale po adresi, "
+            "a zatim dostupnog slobodnog termina."
+        ),
+        "link": ""
+    }
+
+
+_HANDLERS = {
+    "weather_current": _weather_reply,
+    "branches_hours": answer_engine.hours_reply,
+    "branches_list": answer_engine.branches_reply,
+    "appointments_slots": answer_engine.slots_reply,
+    "docs_required": _docs_reply,
+    "appointments_help": _appointments_reply,
+}
+# Namere sa lokalnim odgovorom; sve ostalo za intent_router je "general" (LLM).
+LOCAL_INTENTS = frozenset(_HANDLERS)
+
+
+def _top_hit(msg: str):
+    hits = matcher_cache.get().match(msg)
+    return hits[0] if hits else None
+
+
+def match_intent(message: str) -> Optional[str]:
+    """Namera najboljeg pogotka determinističkog matchera (ključne reči i FAQ), bez odgovora."""
+    top = _top_hit(normalize(message))
+    return top.intent if top is not None else None
+
+
+def _entry_reply(entry: FAQEntry) -> Dict:
+    return {"intent": entry.intent, "reply": entry.answer, "link": entry.link}
+
 
 def match_faq(message: str) -> Optional[Dict]:
     msg = normalize(message)
-    if any(k in msg for k in ["stepeni", "temperatura", "vreme", "vrijeme"]):
-        try:
-            r = requests.get(
-                "http://localhost:8000/api/weather/",
-                timeout=5
-            )
-            r.raise_for_status()
-            data = r.json()
-
-            return {
-                "intent": "weather_current",
-                "reply": (
-                f"Trenutno je {round(data['temperature'])}°C u {data['city']}, "
-                f"osjeća se kao {round(data['feels_like'])}°C."
-                        ),          
-                "link": ""
-            }
-        except Exception:
-            return {
-                "intent": "weather_current",
-                "reply": "Ne mogu trenutno da dohvatim vremensku prognozu.",
-                "link": ""
-            }
-    
-    if any(k in msg for k in ["radno vreme", "radno vrijeme", "kada rade", "radite", "radite li"]):
-        return {
-            "intent": "branches_hours",
-            "reply": "Filijale rade radnim danima od 08:00 do 16:00.",
-            "link": ""
-        }
-   
-    if any(k in msg for k in ["filijale", "poslovnice", "gde se nalazite", "adresa"]):
-        branches = Branch.objects.all().order_by("city", "name")
-        if not branches:
-            return {
-                "intent": "branches_list",
-                "reply": "Trenutno nema dostupnih filijala.",
-                "link": ""
-            }
-
-        lines = [f"{b.city}, {b.address}" for b in branches[:5]]
-        reply = "Naše filijale se nalaze na sledećim adresama: " + "; ".join(lines) + "."
-        return {
-            "intent": "branches_list",
-            "reply": reply,
-            "link": ""
-        }
-
-    if any(k in msg for k in ["dokument", "papiri", "šta mi treba", "sta mi treba"]):
-        return {
-            "intent": "docs_required",
-            "reply": (
-                "Potrebna dokumentacija zavisi od usluge. "
-                "Za otvaranje računa obično je potrebna lična karta, "
-                "a za kredite i dodatna finansijska dokumentacija."
-            ),
-            "link": ""
-        }
-
-    if any(k in msg for k in ["termin", "zakaz", "rezerv"]):
-        return {
-            "intent": "appointments_help",
-            "reply": (
-                "Termin se zakazuje izborom filijale po adresi, "
-                "a zatim dostupnog slobodnog termina."
-            ),
-            "link": ""
-        }
-
-    return None
+    top = _top_hit(msg)
+    if top is None:
+        return None
+
+    if top.payload is not None:
+        return _entry_reply(top.payload)
+
+    return _HANDLERS[top.intent](msg)
+
+
+async def amatch_faq(message: str) -> Optional[Dict]:
+    msg = normalize(message)
+    top = await sync_to_async(_top_hit)(msg)
+    if top is None:
+        return None
+
+    if top.payload is not None:
+        return _entry_reply(top.payload)
+
+    return await _adispatch(top.intent, msg)
+
+
+async def _adispatch(intent: str, msg: str) -> Dict:
+    if intent == "weather_current":
+        return await _aweather_reply(msg)
+    return await sync_to_async(_HANDLERS[intent])(msg)
+
+
+def _routed_intent(msg: str) -> Optional[str]:
+    intent = intent_router.route(msg)
+    return intent if intent in _HANDLERS else None
+
+
+def route_message(message: str) -> Optional[Dict]:
+    """
+    Drugi, statistički korak posle match_faq: naučeni klasifikator
+    (intent_router) za poruke bez ključne reči; None znači LLM.
+    """
+    msg = normalize(message)
+    intent = _routed_intent(msg)
+    return _HANDLERS[intent](msg) if intent else None
+
+
+async def aroute_message(message: str) -> Optional[Dict]:
+    msg = normalize(message)
+    intent = _routed_intent(msg)
+    return await _adispatch(intent, msg) if intent else None
@@ -3,11 +3,25 @@ import json
 import logging
 import datetime
 import re
-from typing import Any, Dict, List, Optional, Literal, TypedDict
-
-from openai import OpenAI
+import time
+import threading
+import importlib.util
+import asyncio
+import weakref
+from typing import Any, Dict, Iterator, List, Optional, Literal, Tuple, TypedDict
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 
+from . import chat_path
+from .circuit_breaker import CircuitOpenError, breaker_from_env
+from .json_repair import repair_json, repair_stats
+from .llm_ledger import llm_ledger
+from .prompt_budget import assemble, estimate_tokens, prompt_meter
+from .single_flight import SingleFlight
+from .response_cache import cache_key, response_cache
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -92,12 +106,158 @@ Sadržaj za popravku:
 """.strip()
 
 
-def groq_client() -> OpenAI:
-    key = os.getenv("GROQ_API_KEY")
-    if not key:
-        raise RuntimeError("Nedostaje GROQ_API_KEY env var.")
-    base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
-    return OpenAI(api_key=key, base_url=base_url)
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+def _request_timeout(read: Optional[float] = None) -> httpx.Timeout:
+    """
+    Rok za jedan poziv: posebno za uspostavu konekcije i za čitanje odgovora.
+    """
+    connect = _env_float("GROQ_CONNECT_TIMEOUT", "5")
+    if read is None:
+        read = _env_float("GROQ_READ_TIMEOUT", "30")
+    return httpx.Timeout(read, connect=min(connect, read))
+
+
+def _pool_limits(default_max_connections: str = "20") -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("GROQ_POOL_MAX_CONNECTIONS", default_max_connections)),
+        max_keepalive_connections=int(os.getenv("GROQ_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=_env_float("GROQ_KEEPALIVE_EXPIRY", "60"),
+    )
+
+
+def _use_http2() -> bool:
+    http2 = os.getenv("GROQ_HTTP2", "auto")
+    return importlib.util.find_spec("h2") is not None if http2 == "auto" else http2 == "1"
+
+
+class _ClientManager:
+    """
+    Jedan OpenAI klijent po procesu, sa deljenim httpx poolom konekcija
+    (keep-alive, HTTP/2 ako je h2 instaliran). Posle fork-a (gunicorn --preload)
+    dete pravi svoj pool umesto da deli sokete roditelja.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Optional[Tuple[OpenAI, OpenAI]] = None
+        self._signature = None
+        self._pid = os.getpid()
+
+    def _build(self, key: str, base_url: str) -> OpenAI:
+        http_client = httpx.Client(limits=_pool_limits(), timeout=_request_timeout(), http2=_use_http2())
+        client = OpenAI(
+            api_key=key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", "2")),
+        )
+        client.chat.completions  # SDK lenjo uvozi resurse (~0.5 s); ovde, a ne usred roka poziva
+        return client
+
+    def get(self, retries: bool = True) -> OpenAI:
+        """retries=False: isti pool, ali bez ponovnih pokušaja (poziv sa rokom poruke)."""
+        key = os.getenv("GROQ_API_KEY")
+        if not key:
+            raise RuntimeError("Nedostaje GROQ_API_KEY env var.")
+        base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+        signature = (key, base_url)
+
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+
+        clients = self._clients
+        if clients is None or self._signature != signature:
+            with self._lock:
+                if self._clients is None or self._signature != signature:
+                    old = self._clients
+                    client = self._build(key, base_url)
+                    self._clients = (client, client.with_options(max_retries=0))
+                    self._signature = signature
+                    if old is not None:
+                        old[0].close()
+                clients = self._clients
+        return clients[0] if retries else clients[1]
+
+    def reset_after_fork(self) -> None:
+        # Soketi pripadaju roditelju; ne zatvaramo ih, samo ih zaboravljamo.
+        self._lock = threading.Lock()
+        self._clients = None
+        self._signature = None
+        self._pid = os.getpid()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._clients is not None:
+                self._clients[0].close()  # kopija bez ponovnih pokušaja deli isti httpx klijent
+            self._clients = None
+            self._signature = None
+
+
+client_manager = _ClientManager()
+
+
+class _AsyncClientManager:
+    """
+    AsyncOpenAI klijent po event loop-u (httpx.AsyncClient pool je vezan za
+    loop u kome je napravljen). Pod uvicorn workerom to je jedan klijent po procesu.
+    """
+
+    def __init__(self):
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[Any, AsyncOpenAI, AsyncOpenAI]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get(self, retries: bool = True) -> AsyncOpenAI:
+        key = os.getenv("GROQ_API_KEY")
+        if not key:
+            raise RuntimeError("Nedostaje GROQ_API_KEY env var.")
+        base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+        signature = (key, base_url)
+
+        loop = asyncio.get_running_loop()
+        cached = self._clients.get(loop)
+        if cached is not None and cached[0] == signature:
+            return cached[1] if retries else cached[2]
+
+        http_client = httpx.AsyncClient(
+            limits=_pool_limits(default_max_connections="100"),
+            timeout=_request_timeout(),
+            http2=_use_http2(),
+        )
+        client = AsyncOpenAI(
+            api_key=key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", "2")),
+        )
+        client.chat.completions  # vidi _ClientManager._build
+        no_retry = client.with_options(max_retries=0)
+        self._clients[loop] = (signature, client, no_retry)
+        return client if retries else no_retry
+
+    def reset_after_fork(self) -> None:
+        self._clients = weakref.WeakKeyDictionary()
+
+
+async_client_manager = _AsyncClientManager()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=client_manager.reset_after_fork)
+    os.register_at_fork(after_in_child=async_client_manager.reset_after_fork)
+
+
+def groq_client(retries: bool = True) -> OpenAI:
+    return client_manager.get(retries)
+
+
+# Stanje Groq-a po procesu; podešava se GROQ_BREAKER_* promenljivama.
+llm_breaker = breaker_from_env("groq", "GROQ_BREAKER")
+
+# Isto pitanje (isti cache_key) u isto vreme -> jedan poziv ka Groq-u.
+llm_flights = SingleFlight()
 
 
 def _extract_first_json_object_balanced(text: str) -> str:
@@ -138,20 +298,6 @@ def _normalize_output(data: Dict[str, Any]) -> BotResponse:
     return {"intent": intent, "reply": reply, "link": link}  
 
 
-def _build_user_content(user_message: str, context: str = "", state: Optional[Dict[str, Any]] = None) -> str:
-    user_message = (user_message or "").strip()
-
-    parts: List[str] = []
-    if state:
-        parts.append("STATE (pouzdan izvor istine):\n" + json.dumps(state, ensure_ascii=False))
-
-    if context.strip():
-        parts.append("KONTEKST (pouzdan izvor istine):\n" + context.strip())
-
-    parts.append("PITANJE KORISNIKA:\n" + user_message)
-    return "\n\n".join(parts).strip()
-
-
 def _compact_history(history: List[ChatTurn], max_turns: int) -> List[ChatTurn]:
     """
     Ne šalji cijelu istoriju:
@@ -220,12 +366,40 @@ def _time_reply() -> str:
     return f"Trenutno je {now.strftime('%H:%M')}."
 
 
+def _quick_reply(msg: str) -> Optional[BotResponse]:
+    if not msg:
+        return {"intent": "unknown", "reply": "Napiši pitanje pa ću pomoći.", "link": ""}
+
+    if _is_date_question(msg):
+        return {"intent": "today_date", "reply": _today_reply(), "link": ""}
+
+    if _is_time_question(msg):
+        return {"intent": "current_time", "reply": _time_reply(), "link": ""}
+
+    return None
+
+
+def _time_left(deadline: Optional[float]) -> Optional[float]:
+    """Ostatak roka (time.monotonic) u trenutku poziva; None kad roka nema."""
+    if deadline is None:
+        return None
+    return max(0.05, deadline - time.monotonic())
+
+
+def _coalesce_wait(deadline: Optional[float]) -> float:
+    """Koliko pratilac čeka tuđi poziv: do sopstvenog roka (time.monotonic), kao da je sam zvao model."""
+    if deadline is None:
+        return _env_float("GROQ_READ_TIMEOUT", "30")
+    return max(0.0, deadline - time.monotonic())
+
+
 def groq_chat_json(
     user_message: str,
     context: str = "",
     history: Optional[List[ChatTurn]] = None,
     state: Optional[Dict[str, Any]] = None,
     max_history_turns: int = 6,  
+    timeout: Optional[float] = None,
 ) -> BotResponse:
     """
     user_message: trenutno pitanje korisnika
@@ -233,102 +407,540 @@ def groq_chat_json(
     history: lista prethodnih poruka [{"role":"user"/"assistant","content":"..."}]
     state: struktura (filijala/datum/usluga/slotovi...) - najstabilnije za rezervacije
     max_history_turns: koliko zadnjih poruka da proslediš modelu (preporuka 4-8)
+    timeout: ukupan rok (u sekundama) za odgovor modela, bez ponovnih pokušaja; i pratilac
+        spojenog poziva čeka najviše toliko. Bez njega važi GROQ_READ_TIMEOUT po pozivu.
     """
-
+    deadline = time.monotonic() + timeout if timeout else None
     msg = (user_message or "").strip()
-    if not msg:
-        return {"intent": "unknown", "reply": "Napiši pitanje pa ću pomoći.", "link": ""}
+    quick = _quick_reply(msg)
+    if quick is not None:
+        chat_path.mark("fast")
+        return quick
+
+    cacheable = not history and response_cache.enabled
+    key = ""
+    if cacheable:
+        key = cache_key(msg, context=context, state=state)
+        cached = response_cache.get(key)
+        if cached is not None:
+            chat_path.mark("cache")
+            llm_ledger.record("cache", intent=cached.get("intent", ""))
+            return cached
+
+    def call():
+        return llm_breaker.call(_complete, msg, context, history, state, max_history_turns, timeout)
+
+    if cacheable:
+        chat_path.mark("coalesced")  # lider ovo prepisuje svojim putem
+        out, parsed = llm_flights.do(key, call, timeout=_coalesce_wait(deadline))
+        if chat_path.current() == "coalesced":
+            llm_ledger.record("coalesced", intent=out.get("intent", ""))
+    else:
+        out, parsed = call()
+    if cacheable and parsed:
+        response_cache.put(key, out)
+    return out
 
-    if _is_date_question(msg):
-        return {"intent": "today_date", "reply": _today_reply(), "link": ""}
 
-    if _is_time_question(msg):
-        return {"intent": "current_time", "reply": _time_reply(), "link": ""}
+def _build_messages(
+    msg: str,
+    context: str,
+    history: Optional[List[ChatTurn]],
+    state: Optional[Dict[str, Any]],
+    max_history_turns: int,
+) -> List[Dict[str, str]]:
+    compact = _compact_history(history, max_history_turns) if history else []
+    messages, stats = assemble(SYSTEM_PROMPT, msg, context=context, history=compact, state=state)
+    prompt_meter.record(stats)
+    logger.info(
+        "LLM prompt ~%d tokens (budget %d, dropped history=%d context=%d state=%s)",
+        stats.input_tokens, stats.budget, stats.dropped_history, stats.dropped_context, stats.dropped_state,
+    )
+    return messages
+
+
+def _create_completion(client: OpenAI, **kwargs):
+    try:
+        return client.chat.completions.create(response_format={"type": "json_object"}, **kwargs)
+    except TypeError:
+        return client.chat.completions.create(**kwargs)
 
-    client = groq_client()
 
-    model = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
+def _parse_local(content: str) -> Tuple[Optional[BotResponse], bool]:
+    """
+    Lokalno parsiranje sa popravkom čestih grešaka (vidi json_repair).
+    Drugi element je False za odsečen izlaz: takav odgovor se prikazuje, ali ne kešira.
+    """
+    data, paths = repair_json(content)
+    repair_stats.record(paths)
+    if data is None:
+        return None, False
+    chat_path.mark("llm" if paths == ("direct",) else "repair_local")
+    return _normalize_output(data), "truncated" not in paths
 
-    user_content = _build_user_content(msg, context=context, state=state)
 
-    messages: List[Dict[str, str]] = [{"role": "system", "content": SYSTEM_PROMPT}]
+def _ledger_outcome(parsed: bool) -> str:
+    """Ishod completion poziva za llm_ledger, iz putanje koju je ostavilo parsiranje."""
+    path = chat_path.current()
+    if path == "repair_local":
+        return "repaired"
+    if path == "repair_remote" and parsed:
+        return "repair_remote"
+    return "ok" if parsed else "unparsed"
 
-    if history:
-        compact = _compact_history(history, max_history_turns)
-        for turn in compact:
-            messages.append({"role": turn["role"], "content": turn["content"]})
 
-    messages.append({"role": "user", "content": user_content})
+def _repair_request(content: str, request_timeout: httpx.Timeout) -> Dict[str, Any]:
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": REPAIR_PROMPT + "\n\n" + content},
+        ],
+        "temperature": 0.0,
+        "max_tokens": 250,
+        "timeout": request_timeout,
+    }
 
-    temperature = float(os.getenv("GROQ_TEMPERATURE", "0.7"))
-    max_tokens = int(os.getenv("GROQ_MAX_TOKENS", "500"))
 
+def _repair_timeout(request_timeout: httpx.Timeout, deadline: Optional[float]) -> Optional[httpx.Timeout]:
+    """
+    Rok za repair poziv u okviru roka cele poruke; None kad je preostalo
+    vreme kraće od GROQ_REPAIR_MIN_SECONDS (tada se repair preskače).
+    """
+    if deadline is None:
+        return request_timeout
+    left = deadline - time.monotonic()
+    if left < _env_float("GROQ_REPAIR_MIN_SECONDS", "2"):
+        return None
+    return _request_timeout(left)
+
+
+def _parse_repaired(repaired: str) -> Optional[BotResponse]:
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            response_format={"type": "json_object"},
+        return _normalize_output(json.loads(repaired))
+    except Exception:
+        repaired_blob = _extract_first_json_object_balanced(repaired)
+        if repaired_blob:
+            return _normalize_output(json.loads(repaired_blob))
+    return None
+
+
+def _unparsed_output(content: str) -> BotResponse:
+    return {
+        "intent": "general",
+        "reply": content[:600] if content else "Nisam uspeo da generišem validan odgovor.",
+        "link": "",
+    }
+
+
+_EMPTY_OUTPUT: BotResponse = {"intent": "unknown", "reply": "Nisam dobio odgovor od modela.", "link": ""}
+
+
+def _parse_content(
+    client: OpenAI,
+    model: str,
+    content: str,
+    request_timeout: httpx.Timeout,
+    deadline: Optional[float] = None,
+) -> Tuple[BotResponse, bool]:
+    """
+    Parsira izlaz modela; ako ni lokalna popravka (json_repair) ne uspe,
+    radi se repair poziv. Drugi element je True samo ako je odgovor
+    uspešno i celovito parsiran kao JSON, pa sme da se kešira.
+    deadline (time.monotonic) je rok cele poruke; repair se radi samo ako ima vremena.
+    """
+    if not content:
+        return dict(_EMPTY_OUTPUT), False
+
+    out, complete = _parse_local(content)
+    if out is not None:
+        return out, complete
+
+    repair_timeout = _repair_timeout(request_timeout, deadline)
+    if repair_timeout is None:
+        repair_stats.record(("remote_skipped",))
+        return _unparsed_output(content), False
+
+    repair_stats.record(("remote",))
+    chat_path.mark("repair_remote")
+    started = time.perf_counter()
+    try:
+        repair_resp = _create_completion(client, model=model, **_repair_request(content, repair_timeout))
+        latency = time.perf_counter() - started
+        out = _parse_repaired((repair_resp.choices[0].message.content or "").strip())
+        llm_ledger.record(
+            "repair", outcome="ok" if out else "unparsed", model=model,
+            intent=out["intent"] if out else "", usage=repair_resp.usage, latency=latency,
         )
-    except TypeError:
-        resp = client.chat.completions.create(
+        if out is not None:
+            return out, True
+    except Exception as e:
+        llm_ledger.record("repair", outcome="error", model=model, latency=time.perf_counter() - started)
+        logger.info("Repair pass failed: %s", e)
+
+    return _unparsed_output(content), False
+
+
+def _complete(
+    msg: str,
+    context: str,
+    history: Optional[List[ChatTurn]],
+    state: Optional[Dict[str, Any]],
+    max_history_turns: int,
+    timeout: Optional[float],
+) -> Tuple[BotResponse, bool]:
+    deadline = time.monotonic() + timeout if timeout else None
+    # Sa rokom poruke nema ponovnih pokušaja: svaki bi dobio ceo rok iznova.
+    client = groq_client(retries=not timeout)
+    model = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
+    request_timeout = _request_timeout(_time_left(deadline))
+
+    started = time.perf_counter()
+    try:
+        resp = _create_completion(
+            client,
             model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
+            messages=_build_messages(msg, context, history, state, max_history_turns),
+            temperature=float(os.getenv("GROQ_TEMPERATURE", "0.7")),
+            max_tokens=int(os.getenv("GROQ_MAX_TOKENS", "500")),
+            timeout=request_timeout,
         )
+    except Exception:
+        llm_ledger.record("completion", outcome="error", model=model, latency=time.perf_counter() - started)
+        raise
+    latency = time.perf_counter() - started
 
     content = (resp.choices[0].message.content or "").strip()
-    if not content:
-        return {"intent": "unknown", "reply": "Nisam dobio odgovor od modela.", "link": ""}
+    chat_path.mark("llm")
+    out, parsed = _parse_content(client, model, content, request_timeout, deadline)
+    llm_ledger.record(
+        "completion", outcome=_ledger_outcome(parsed), model=model,
+        intent=out["intent"], usage=resp.usage, latency=latency,
+    )
+    return out, parsed
+
+
+_REPLY_KEY_RE = re.compile(r'"reply"\s*:\s*"')
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ReplyStreamExtractor:
+    """
+    Iz delimičnog JSON-a koji stiže token po token izvlači vrednost polja
+    "reply" čim se pojavi, uključujući JSON escape sekvence.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._state = "seek"
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> str:
+        self._buf += chunk or ""
+        if self._state == "seek":
+            m = _REPLY_KEY_RE.search(self._buf, max(0, self._pos - 16))
+            if not m:
+                self._pos = len(self._buf)
+                return ""
+            self._pos = m.end()
+            self._state = "in"
+        if self._state != "in":
+            return ""
+
+        out: List[str] = []
+        buf, i, n = self._buf, self._pos, len(self._buf)
+        while i < n:
+            ch = buf[i]
+            if ch == '"':
+                self._state = "done"
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= n:
+                break
+            esc = buf[i + 1]
+            if esc == "u":
+                if i + 6 > n:
+                    break
+                try:
+                    code = int(buf[i + 2 : i + 6], 16)
+                except ValueError:
+                    code = 0xFFFD
+                step = 6
+                if 0xD800 <= code < 0xDC00:
+                    if i + 12 > n:
+                        break
+                    try:
+                        low = int(buf[i + 8 : i + 12], 16) if buf[i + 6 : i + 8] == "\\u" else 0
+                    except ValueError:
+                        low = 0
+                    if 0xDC00 <= low < 0xE000:
+                        code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                        step = 12
+                    else:
+                        code = 0xFFFD
+                elif 0xDC00 <= code < 0xE000:
+                    code = 0xFFFD
+                out.append(chr(code))
+                i += step
+            else:
+                out.append(_JSON_ESCAPES.get(esc, esc))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
+def _chunk_usage(chunk) -> Any:
+    # OpenAI šalje usage u poslednjem chunk-u, Groq u x_groq.usage.
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = (getattr(chunk, "x_groq", None) or {}).get("usage")
+    return usage
+
+
+def _estimated_usage(messages: List[Dict[str, str]], content: str) -> Dict[str, int]:
+    return {
+        "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+        "completion_tokens": estimate_tokens(content),
+    }
+
 
-    # 3) Parse
+def groq_chat_stream(
+    user_message: str,
+    context: str = "",
+    history: Optional[List[ChatTurn]] = None,
+    state: Optional[Dict[str, Any]] = None,
+    max_history_turns: int = 6,
+    timeout: Optional[float] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Isto kao groq_chat_json, ali model odgovara sa stream=True. Generiše
+    {"type": "delta", "text": ...} za svaki novi deo polja "reply", i na kraju
+    {"type": "done", "response": BotResponse} sa konačnim (parsiranim) odgovorom.
+    """
+    msg = (user_message or "").strip()
+    quick = _quick_reply(msg)
+
+    cacheable = quick is None and not history and response_cache.enabled
+    key = ""
+    if cacheable:
+        key = cache_key(msg, context=context, state=state)
+        quick = response_cache.get(key)
+
+    if quick is not None:
+        if cacheable:
+            llm_ledger.record("cache", intent=quick.get("intent", ""), stream=True)
+        yield {"type": "delta", "text": quick["reply"]}
+        yield {"type": "done", "response": quick}
+        return
+
+    if not llm_breaker.allow():
+        raise CircuitOpenError(llm_breaker.name)
+    started = time.monotonic()
+    ok = False
     try:
-        return _normalize_output(json.loads(content))
-    except Exception:
-        pass
+        deadline = time.monotonic() + timeout if timeout else None
+        client = groq_client(retries=not timeout)
+        model = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
+        request_timeout = _request_timeout(_time_left(deadline))
 
-    blob = _extract_first_json_object_balanced(content)
-    if blob:
+        messages = _build_messages(msg, context, history, state, max_history_turns)
+        call_started = time.perf_counter()
         try:
-            return _normalize_output(json.loads(blob))
+            stream = _create_completion(
+                client,
+                model=model,
+                messages=messages,
+                temperature=float(os.getenv("GROQ_TEMPERATURE", "0.7")),
+                max_tokens=int(os.getenv("GROQ_MAX_TOKENS", "500")),
+                timeout=request_timeout,
+                stream=True,
+            )
         except Exception:
-            pass
+            llm_ledger.record("completion", outcome="error", model=model, stream=True,
+                              latency=time.perf_counter() - call_started)
+            raise
+
+        extractor = ReplyStreamExtractor()
+        parts: List[str] = []
+        usage = None
+        for chunk in stream:
+            # Read timeout važi po chunk-u; spor, ali živ stream bi ga inače preživeo.
+            if deadline is not None and time.monotonic() > deadline:
+                stream.close()
+                llm_ledger.record("completion", outcome="error", model=model, stream=True,
+                                  latency=time.perf_counter() - call_started)
+                raise TimeoutError("LLM stream exceeded chat deadline")
+            usage = _chunk_usage(chunk) or usage
+            if not chunk.choices:
+                continue
+            piece = chunk.choices[0].delta.content or ""
+            if not piece:
+                continue
+            parts.append(piece)
+            text = extractor.feed(piece)
+            if text:
+                yield {"type": "delta", "text": text}
+
+        latency = time.perf_counter() - call_started
+        content = "".join(parts).strip()
+        chat_path.mark("llm")
+        out, parsed = _parse_content(client, model, content, request_timeout, deadline)
+        llm_ledger.record(
+            "completion", outcome=_ledger_outcome(parsed), model=model, intent=out["intent"], stream=True,
+            usage=usage or _estimated_usage(messages, content), latency=latency,
+        )
+        if cacheable and parsed:
+            response_cache.put(key, out)
+        ok = True
+    except GeneratorExit:
+        # Klijent je prekinuo vezu; to nije greška Groq-a.
+        ok = True
+        raise
+    finally:
+        llm_breaker.record(ok, time.monotonic() - started)
+    yield {"type": "done", "response": out}
+
+
+async def _acreate_completion(client: AsyncOpenAI, **kwargs):
+    try:
+        return await client.chat.completions.create(response_format={"type": "json_object"}, **kwargs)
+    except TypeError:
+        return await client.chat.completions.create(**kwargs)
+
+
+async def _acomplete(
+    msg: str,
+    context: str,
+    history: Optional[List[ChatTurn]],
+    state: Optional[Dict[str, Any]],
+    max_history_turns: int,
+    timeout: Optional[float],
+) -> Tuple[BotResponse, bool]:
+    deadline = time.monotonic() + timeout if timeout else None
+    client = async_client_manager.get(retries=not timeout)
+    model = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
+    request_timeout = _request_timeout(_time_left(deadline))
 
+    started = time.perf_counter()
     try:
-        repair_messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": REPAIR_PROMPT + "\n\n" + content},
-        ]
+        resp = await _acreate_completion(
+            client,
+            model=model,
+            messages=_build_messages(msg, context, history, state, max_history_turns),
+            temperature=float(os.getenv("GROQ_TEMPERATURE", "0.7")),
+            max_tokens=int(os.getenv("GROQ_MAX_TOKENS", "500")),
+            timeout=request_timeout,
+        )
+    except Exception:
+        await llm_ledger.arecord("completion", outcome="error", model=model, latency=time.perf_counter() - started)
+        raise
+    latency = time.perf_counter() - started
+    content = (resp.choices[0].message.content or "").strip()
+    chat_path.mark("llm")
+
+    out: Optional[BotResponse] = None
+    parsed = False
+    if not content:
+        out = dict(_EMPTY_OUTPUT)
+    else:
+        out, parsed = _parse_local(content)
+
+    repair_timeout = _repair_timeout(request_timeout, deadline) if out is None else None
+    if out is None and repair_timeout is None:
+        repair_stats.record(("remote_skipped",))
+    elif out is None:
+        repair_stats.record(("remote",))
+        chat_path.mark("repair_remote")
+        repair_started = time.perf_counter()
         try:
-            repair_resp = client.chat.completions.create(
-                model=model,
-                messages=repair_messages,
-                temperature=0.0,
-                max_tokens=250,
-                response_format={"type": "json_object"},
-            )
-        except TypeError:
-            repair_resp = client.chat.completions.create(
-                model=model,
-                messages=repair_messages,
-                temperature=0.0,
-                max_tokens=250,
+            repair_resp = await _acreate_completion(client, model=model, **_repair_request(content, repair_timeout))
+            repair_latency = time.perf_counter() - repair_started
+            out = _parse_repaired((repair_resp.choices[0].message.content or "").strip())
+            parsed = out is not None
+            await llm_ledger.arecord(
+                "repair", outcome="ok" if parsed else "unparsed", model=model,
+                intent=out["intent"] if out else "", usage=repair_resp.usage, latency=repair_latency,
             )
+        except Exception as e:
+            await llm_ledger.arecord("repair", outcome="error", model=model,
+                                     latency=time.perf_counter() - repair_started)
+            logger.info("Repair pass failed: %s", e)
+
+    if out is None:
+        out = _unparsed_output(content)
+    await llm_ledger.arecord(
+        "completion", outcome=_ledger_outcome(parsed), model=model,
+        intent=out["intent"], usage=resp.usage, latency=latency,
+    )
+    return out, parsed
+
+
+async def _acomplete_within(
+    msg: str,
+    context: str,
+    history: Optional[List[ChatTurn]],
+    state: Optional[Dict[str, Any]],
+    max_history_turns: int,
+    timeout: Optional[float],
+) -> Tuple[BotResponse, bool]:
+    """_acomplete pod ukupnim rokom: pokriva i čekanje na konekciju iz pool-a i repair poziv."""
+    if not timeout:
+        return await _acomplete(msg, context, history, state, max_history_turns, timeout)
+    try:
+        return await asyncio.wait_for(_acomplete(msg, context, history, state, max_history_turns, timeout), timeout)
+    except asyncio.TimeoutError:
+        await llm_ledger.arecord("completion", outcome="error", model=os.getenv("GROQ_MODEL", "openai/gpt-oss-120b"),
+                                 latency=timeout)
+        raise
 
-        repaired = (repair_resp.choices[0].message.content or "").strip()
-        try:
-            return _normalize_output(json.loads(repaired))
-        except Exception:
-            repaired_blob = _extract_first_json_object_balanced(repaired)
-            if repaired_blob:
-                return _normalize_output(json.loads(repaired_blob))
-    except Exception as e:
-        logger.info("Repair pass failed: %s", e)
 
-    return {
-        "intent": "general",
-        "reply": content[:600] if content else "Nisam uspeo da generišem validan odgovor.",
-        "link": "",
-    }
+async def groq_chat_json_async(
+    user_message: str,
+    context: str = "",
+    history: Optional[List[ChatTurn]] = None,
+    state: Optional[Dict[str, Any]] = None,
+    max_history_turns: int = 6,
+    timeout: Optional[float] = None,
+) -> BotResponse:
+    """
+    Async varijanta groq_chat_json (AsyncOpenAI); dok čeka model ne drži
+    worker, pa jedan uvicorn worker opslužuje mnogo razgovora istovremeno.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    msg = (user_message or "").strip()
+    quick = _quick_reply(msg)
+    if quick is not None:
+        chat_path.mark("fast")
+        return quick
+
+    cacheable = not history and response_cache.enabled
+    key = ""
+    if cacheable:
+        key = cache_key(msg, context=context, state=state)
+        cached = response_cache.get(key)
+        if cached is not None:
+            chat_path.mark("cache")
+            await llm_ledger.arecord("cache", intent=cached.get("intent", ""))
+            return cached
+
+    def call():
+        return llm_breaker.acall(_acomplete_within, msg, context, history, state, max_history_turns, timeout)
+
+    if cacheable:
+        chat_path.mark("coalesced")  # lider ovo prepisuje svojim putem
+        out, parsed = await llm_flights.ado(key, call, timeout=_coalesce_wait(deadline))
+        if chat_path.current() == "coalesced":
+            await llm_ledger.arecord("coalesced", intent=out.get("intent", ""))
+    else:
+        out, parsed = await call()
+
+    if cacheable and parsed:
+        response_cache.put(key, out)
+    return out
@@ -0,0 +1,146 @@
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+class Automaton:
+    """
+    Aho-Corasick automat nad karakterima: svi paterni se traže u jednom
+    prolazu kroz tekst, bez obzira na to koliko ih ima.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        outputs: List[List[int]] = [[]]
+        for pattern in patterns:
+            idx = len(self.patterns)
+            self.patterns.append(pattern)
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(idx)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                outputs[nxt].extend(outputs[self._fail[nxt]])
+
+        self._out = [tuple(o) for o in outputs]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def iter_matches(self, text: str) -> Iterator[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield from out[state]
+
+
+@dataclass
+class Target:
+    intent: str
+    priority: int
+    payload: Any = None
+
+
+@dataclass
+class Hit:
+    target: Target
+    longest: int
+    matched: List[str] = field(default_factory=list)
+
+    @property
+    def intent(self) -> str:
+        return self.target.intent
+
+    @property
+    def payload(self) -> Any:
+        return self.target.payload
+
+    def rank_key(self) -> Tuple[int, int, int]:
+        return (-self.longest, -len(self.matched), self.target.priority)
+
+
+class IntentMatcher:
+    """
+    Jedan automat za sve namere (ugrađene ključne reči + FAQ pitanja).
+    Pogoci se rangiraju po najdužem poklopljenom paternu, zatim po broju
+    različitih paterna i na kraju po prioritetu cilja.
+    """
+
+    def __init__(self, rules: Sequence[Tuple[Target, Sequence[str]]]):
+        self.targets: List[Target] = []
+        pattern_targets: Dict[str, List[int]] = {}
+        for target, keywords in rules:
+            t_idx = len(self.targets)
+            self.targets.append(target)
+            for kw in keywords:
+                if kw:
+                    pattern_targets.setdefault(kw, []).append(t_idx)
+
+        self._automaton = Automaton(pattern_targets.keys())
+        self._pattern_targets = [tuple(pattern_targets[p]) for p in self._automaton.patterns]
+
+    @property
+    def pattern_count(self) -> int:
+        return len(self._automaton)
+
+    def match(self, text: str) -> List[Hit]:
+        hits: Dict[int, Hit] = {}
+        patterns = self._automaton.patterns
+        for p_idx in set(self._automaton.iter_matches(text)):
+            pattern = patterns[p_idx]
+            for t_idx in self._pattern_targets[p_idx]:
+                hit = hits.get(t_idx)
+                if hit is None:
+                    hit = hits[t_idx] = Hit(target=self.targets[t_idx], longest=0)
+                hit.matched.append(pattern)
+                hit.longest = max(hit.longest, len(pattern))
+        return sorted(hits.values(), key=Hit.rank_key)
+
+
+class MatcherCache:
+    """
+    Čuva izgrađen matcher i gradi ga ponovo tek kada se promeni verzija
+    podataka (npr. nakon izmene FAQ unosa u bilo kom workeru).
+    """
+
+    def __init__(self, builder, version):
+        self._builder = builder
+        self._version = version
+        self._lock = threading.Lock()
+        self._matcher: Optional[IntentMatcher] = None
+        self._built_for: Optional[str] = None
+
+    def get(self) -> IntentMatcher:
+        version = self._version()
+        if self._matcher is None or self._built_for != version:
+            with self._lock:
+                if self._matcher is None or self._built_for != version:
+                    self._matcher = self._builder()
+                    self._built_for = version
+        return self._matcher
@@ -0,0 +1,159 @@
+"""
+Mali multinomijalni naive Bayes nad heširanim n-gramima (reči, parovi reči,
+3-grami karaktera) za poruke koje FAQ matcher nije prepoznao. Trenira se
+offline (manage.py train_intent_router) i čuva kao .npz; u runtime-u je
+predikcija jedan NumPy zbir po kolonama, reda desetak mikrosekundi.
+"""
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .text_normalize import fold
+
+logger = logging.getLogger(__name__)
+
+# Sve što nema lokalni odgovor (kurs, cene, opšta pitanja...) ide na LLM.
+GENERAL = "general"
+DEFAULT_DIM = 1 << 12
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _hash(feature: str, dim: int) -> int:
+    # crc32 je stabilan između procesa (za razliku od hash()).
+    return zlib.crc32(feature.encode()) % dim
+
+
+def features(text: str, dim: int) -> np.ndarray:
+    words = _WORD_RE.findall(fold(text))
+    feats = [f"w:{w}" for w in words]
+    feats += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f" {w} "
+        feats += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return np.fromiter((_hash(f, dim) for f in feats), dtype=np.int64, count=len(feats))
+
+
+class IntentRouter:
+    def __init__(self, labels: Sequence[str], log_prior: np.ndarray, log_prob: np.ndarray, known: np.ndarray):
+        self.labels = tuple(labels)
+        self.log_prior = log_prior.astype(np.float32)
+        self.log_prob = log_prob.astype(np.float32)  # (klase, dim)
+        self.known = known.astype(bool)
+        self.dim = self.log_prob.shape[1]
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """(namera, verovatnoća); bez ijedne poznate osobine vraća (general, 0)."""
+        idx = features(text, self.dim)
+        idx = idx[self.known[idx]]
+        if not idx.size:
+            return GENERAL, 0.0
+        scores = self.log_prior + self.log_prob[:, idx].sum(axis=1)
+        scores = np.exp(scores - scores.max())
+        best = int(scores.argmax())
+        return self.labels[best], float(scores[best] / scores.sum())
+
+    def save(self, path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez_compressed(
+            tmp, labels=np.array(self.labels), log_prior=self.log_prior,
+            log_prob=self.log_prob, known=self.known,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path) -> "IntentRouter":
+        with np.load(path, allow_pickle=False) as data:
+            return cls([str(x) for x in data["labels"]], data["log_prior"], data["log_prob"], data["known"])
+
+
+def train(samples: Iterable[Sequence], dim: int = DEFAULT_DIM, alpha: float = 0.5) -> IntentRouter:
+    """samples: (tekst, namera) ili (tekst, namera, težina); Laplace/Lidstone izravnavanje sa alpha."""
+    rows: List[Tuple[int, np.ndarray, float]] = []
+    index: Dict[str, int] = {}
+    for text, intent, *weight in samples:
+        rows.append((index.setdefault(intent, len(index)), features(text, dim), weight[0] if weight else 1.0))
+    if not rows:
+        raise ValueError("Nema primera za treniranje")
+
+    counts = np.zeros((len(index), dim), dtype=np.float64)
+    docs = np.zeros(len(index), dtype=np.float64)
+    for label, idx, weight in rows:
+        np.add.at(counts[label], idx, weight)
+        docs[label] += weight
+
+    smoothed = counts + alpha
+    log_prob = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+    log_prior = np.log(docs / docs.sum())
+    return IntentRouter(list(index), log_prior, log_prob, counts.sum(axis=0) > 0)
+
+
+def router_path() -> Path:
+    return Path(os.getenv("INTENT_ROUTER_PATH", str(Path(settings.BASE_DIR) / "data" / "intent_router.npz")))
+
+
+class RouterHolder:
+    """Lenjo učitan artefakt; ponovo se čita tek kad se fajl promeni (novi trening)."""
+
+    def __init__(self, path_fn=router_path):
+        self._path_fn = path_fn
+        self._lock = threading.Lock()
+        self._router: Optional[IntentRouter] = None
+        self._stamp = None
+        self.min_confidence = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE", "0.9"))
+        self.enabled = os.getenv("INTENT_ROUTER", "1") == "1"
+        self.routed = Counter()
+
+    def get(self) -> Optional[IntentRouter]:
+        if not self.enabled:
+            return None
+        path = self._path_fn()
+        try:
+            st = path.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    try:
+                        self._router = IntentRouter.load(path)
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.warning("Intent router %s not loaded: %s", path, e)
+                        self._router = None
+                    self._stamp = stamp
+        return self._router
+
+    def route(self, text: str) -> Optional[str]:
+        """Namera sa lokalnim odgovorom ako je model dovoljno siguran, inače None (LLM)."""
+        router = self.get()
+        if router is None:
+            return None
+        intent, confidence = router.predict(text)
+        if intent == GENERAL or confidence < self.min_confidence:
+            self.routed["llm"] += 1
+            return None
+        self.routed[intent] += 1
+        return intent
+
+    def stats(self) -> Dict:
+        router = self._router
+        return {
+            "loaded": router is not None,
+            "labels": list(router.labels) if router else [],
+            "min_confidence": self.min_confidence,
+            "routed": dict(self.routed),
+        }
+
+
+intent_router = RouterHolder()
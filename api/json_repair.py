@@ -0,0 +1,235 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*\s*(.*?)\s*(?:```|$)", re.S)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+PATHS = (
+    "direct",
+    "fence",
+    "extract",
+    "single_quotes",
+    "newlines",
+    "inner_quotes",
+    "trailing_comma",
+    "literals",
+    "truncated",
+    "failed",
+    "remote",
+    "remote_skipped",
+)
+
+
+class RepairStats:
+    """Brojači po putanji popravke (jedan poziv može da prođe više putanja)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = dict.fromkeys(PATHS, 0)
+
+    def record(self, paths) -> None:
+        with self._lock:
+            for p in paths:
+                self.counts[p] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+repair_stats = RepairStats()
+
+
+def _strip_fence(text: str) -> Optional[str]:
+    m = _FENCE_RE.search(text)
+    return m.group(1) if m else None
+
+
+def _closes_string(text: str, i: int) -> bool:
+    """Navodnik u stringu zatvara string samo ako posle njega sledi struktura JSON-a."""
+    j = i + 1
+    n = len(text)
+    while j < n and text[j] in " \t\r\n":
+        j += 1
+    return j >= n or text[j] in ",:}]"
+
+
+class _Scanner:
+    """
+    Jedan prolaz kroz tekst koji prepisuje "skoro JSON" u validan JSON:
+    stringovi u jednostrukim navodnicima, sirovi prelomi reda i neescapovani
+    navodnici u stringu, zarezi pre } i ], Python literali, i odsečen kraj
+    (zatvaraju se otvoreni string i zagrade, odbacuje se nedovršen ključ).
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.out: List[str] = []
+        self.paths: Set[str] = set()
+        # [zagrada, stanje, dužina izlaza pre poslednjeg para ključ/vrednost]
+        self.stack: List[List[Any]] = []
+        self.end = len(text)
+
+    def _value_started(self) -> None:
+        if self.stack:
+            self.stack[-1][1] = "after"
+
+    def _string(self, i: int) -> int:
+        text = self.text
+        quote = text[i]
+        if quote == "'":
+            self.paths.add("single_quotes")
+        buf = ['"']
+        i += 1
+        n = len(text)
+        while i < n:
+            ch = text[i]
+            if ch == "\\" and i + 1 < n:
+                nxt = text[i + 1]
+                buf.append("'" if nxt == "'" else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                if _closes_string(text, i):
+                    buf.append('"')
+                    self.out.append("".join(buf))
+                    return i + 1
+                self.paths.add("inner_quotes")
+                buf.append('\\"' if quote == '"' else "'")
+            elif ch == '"':
+                buf.append('\\"')
+            elif ch in _ESCAPES:
+                self.paths.add("newlines")
+                buf.append(_ESCAPES[ch])
+            elif ch < " ":
+                buf.append("\\u%04x" % ord(ch))
+            else:
+                buf.append(ch)
+            i += 1
+
+        self.paths.add("truncated")
+        if buf[-1] == "\\":
+            buf.pop()
+        buf.append('"')
+        self.out.append("".join(buf))
+        return n
+
+    def _drop_trailing_comma(self, count: bool = True) -> None:
+        while self.out and self.out[-1].isspace():
+            self.out.pop()
+        if self.out and self.out[-1] == ",":
+            self.out.pop()
+            if count:
+                self.paths.add("trailing_comma")
+
+    def run(self) -> str:
+        text = self.text
+        n = len(text)
+        i = 0
+        while i < n:
+            ch = text[i]
+            top = self.stack[-1] if self.stack else None
+
+            if ch in "\"'":
+                in_key = top is not None and top[0] == "{" and top[1] == "key"
+                i = self._string(i)
+                if in_key:
+                    top[1] = "colon"
+                else:
+                    self._value_started()
+                continue
+
+            if ch in "{[":
+                self._value_started()
+                self.stack.append([ch, "key" if ch == "{" else "value", len(self.out) + 1])
+                self.out.append(ch)
+            elif ch in "}]":
+                self._drop_trailing_comma()
+                if self.stack:
+                    self.stack.pop()
+                self.out.append(ch)
+                if not self.stack:
+                    self.end = i + 1
+                    return "".join(self.out)
+            elif ch == ",":
+                if top is not None:
+                    top[1] = "key" if top[0] == "{" else "value"
+                    top[2] = len(self.out)
+                self.out.append(ch)
+            elif ch == ":":
+                if top is not None:
+                    top[1] = "value"
+                self.out.append(ch)
+            elif ch.isspace():
+                self.out.append(ch)
+            else:
+                m = re.match(r"[\w.+-]+", text[i:])
+                word = m.group(0) if m else ch
+                if word in _LITERALS:
+                    self.paths.add("literals")
+                    word = _LITERALS[word]
+                self._value_started()
+                self.out.append(word)
+                i += len(word) if m else 1
+                continue
+            i += 1
+
+        if self.stack:
+            self.paths.add("truncated")
+            top = self.stack[-1]
+            if top[0] == "{" and top[1] in ("colon", "value"):
+                del self.out[top[2]:]
+            self._drop_trailing_comma(count=False)
+            for bracket, _, _ in reversed(self.stack):
+                self.out.append("}" if bracket == "{" else "]")
+        return "".join(self.out)
+
+
+def _loads_object(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(text)
+    except (ValueError, RecursionError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def repair_json(text: str) -> Tuple[Optional[Dict[str, Any]], Tuple[str, ...]]:
+    """
+    Pokušava da iz izlaza modela dobije JSON objekat bez novog LLM poziva.
+    Vraća (objekat ili None, putanje popravke koje su primenjene).
+    """
+    text = (text or "").strip()
+    data = _loads_object(text)
+    if data is not None:
+        return data, ("direct",)
+
+    paths: List[str] = []
+    fenced = _strip_fence(text)
+    if fenced is not None:
+        paths.append("fence")
+        text = fenced
+        data = _loads_object(text)
+        if data is not None:
+            return data, tuple(paths)
+
+    start = text.find("{")
+    if start == -1:
+        return None, tuple(paths) + ("failed",)
+
+    scanner = _Scanner(text[start:])
+    candidate = scanner.run()
+    if start > 0 or text[start + scanner.end:].strip():
+        paths.append("extract")
+    paths.extend(p for p in PATHS if p in scanner.paths)
+
+    data = _loads_object(candidate)
+    if data is None:
+        paths.append("failed")
+    return data, tuple(paths)
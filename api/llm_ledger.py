@@ -0,0 +1,154 @@
+"""
+Evidencija LLM poziva (model LLMCall): tokeni, latencija, ishod i da li je
+odgovor došao iz keša ili posle popravke. Upis ide preko WriteBehindBuffer-a
+(serije, pozadinska nit), pa snimanje ne usporava chat.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncHour
+
+from .models import LLMCall
+from .write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+_LLM = Q(kind__in=("completion", "repair"))
+
+
+def _usage(usage: Any) -> Tuple[int, int]:
+    """(prompt, completion) iz OpenAI usage objekta ili dict-a."""
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0)
+    return int(getattr(usage, "prompt_tokens", 0) or 0), int(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def prices() -> Dict[str, float]:
+    """Cena u USD po milion tokena (ulaz/izlaz); podrazumevano cenovnik za gpt-oss-120b."""
+    return {
+        "input": float(os.getenv("GROQ_PRICE_INPUT_PER_MTOK", "0.15")),
+        "output": float(os.getenv("GROQ_PRICE_OUTPUT_PER_MTOK", "0.75")),
+    }
+
+
+class LLMLedger:
+    def __init__(self, buffer: WriteBehindBuffer, enabled: bool = True):
+        self.buffer = buffer
+        self.enabled = enabled
+
+    def _row(self, kind: str, outcome: str, model: str, intent: str, usage: Any, latency: float, stream: bool) -> LLMCall:
+        prompt, completion = _usage(usage)
+        return LLMCall(
+            kind=kind,
+            outcome=outcome,
+            model=model[:80],
+            intent=(intent or "")[:50],
+            stream=stream,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            latency_ms=max(0, round(latency * 1000)),
+        )
+
+    def record(
+        self,
+        kind: str,
+        outcome: str = "ok",
+        model: str = "",
+        intent: str = "",
+        usage: Any = None,
+        latency: float = 0.0,
+        stream: bool = False,
+    ) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.buffer.add(self._row(kind, outcome, model, intent, usage, latency, stream))
+        except Exception as e:
+            # Evidencija nikad ne sme da obori odgovor korisniku.
+            logger.warning("LLM ledger write failed: %s", e)
+
+    async def arecord(
+        self,
+        kind: str,
+        outcome: str = "ok",
+        model: str = "",
+        intent: str = "",
+        usage: Any = None,
+        latency: float = 0.0,
+        stream: bool = False,
+    ) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self.buffer.aadd(self._row(kind, outcome, model, intent, usage, latency, stream))
+        except Exception as e:
+            logger.warning("LLM ledger write failed: %s", e)
+
+    def flush(self) -> None:
+        self.buffer.flush()
+
+    def report(self, since: datetime, until: Optional[datetime] = None) -> Dict[str, Any]:
+        self.flush()
+        qs = LLMCall.objects.filter(created_at__gte=since)
+        if until is not None:
+            qs = qs.filter(created_at__lt=until)
+
+        price = prices()
+        by_hour = qs.annotate(hour=TruncHour("created_at")).values("hour").annotate(**_AGGREGATES).order_by("hour")
+        by_intent = qs.values("intent").annotate(**_AGGREGATES).order_by("-requests", "intent")
+        return {
+            "since": since,
+            "until": until,
+            "price_per_mtok": price,
+            "totals": _finish(qs.aggregate(**_AGGREGATES), price),
+            "by_hour": [_finish(row, price) for row in by_hour],
+            "by_intent": [_finish(row, price) for row in by_intent],
+        }
+
+
+_AGGREGATES = {
+    "requests": Count("id"),
+    "llm_calls": Count("id", filter=_LLM),
+    "completions": Count("id", filter=Q(kind="completion")),
+    "repair_calls": Count("id", filter=Q(kind="repair")),
+    "repaired_locally": Count("id", filter=Q(kind="completion", outcome="repaired")),
+    "repaired_remotely": Count("id", filter=Q(kind="completion", outcome="repair_remote")),
+    "unparsed": Count("id", filter=Q(kind="completion", outcome="unparsed")),
+    "cache_hits": Count("id", filter=Q(kind="cache")),
+    "coalesced": Count("id", filter=Q(kind="coalesced")),
+    "errors": Count("id", filter=Q(outcome="error")),
+    "prompt_tokens": Sum("prompt_tokens", default=0),
+    "completion_tokens": Sum("completion_tokens", default=0),
+    "avg_latency_ms": Avg("latency_ms", filter=_LLM & ~Q(outcome="error")),
+}
+
+
+def _finish(row: Dict[str, Any], price: Dict[str, float]) -> Dict[str, Any]:
+    completions = row["completions"]
+    row["avg_latency_ms"] = round(row["avg_latency_ms"] or 0.0, 1)
+    row["repair_rate"] = (
+        round((row["repaired_locally"] + row["repaired_remotely"] + row["unparsed"]) / completions, 4)
+        if completions else 0.0
+    )
+    row["cache_rate"] = round((row["cache_hits"] + row["coalesced"]) / row["requests"], 4) if row["requests"] else 0.0
+    row["cost_usd"] = round(
+        (row["prompt_tokens"] * price["input"] + row["completion_tokens"] * price["output"]) / 1_000_000, 6
+    )
+    return row
+
+
+llm_ledger = LLMLedger(
+    WriteBehindBuffer(
+        LLMCall,
+        flush_size=settings.CHAT_LOG_FLUSH_SIZE,
+        flush_interval=settings.CHAT_LOG_FLUSH_INTERVAL,
+        enabled=settings.CHAT_LOG_WRITE_BEHIND,
+    ),
+    enabled=os.getenv("LLM_LEDGER", "1") == "1",
+)
@@ -0,0 +1,343 @@
+"""
+Lokalni OpenAI-kompatibilan server umesto Groq-a (POST .../chat/completions),
+za benchmarke i CI bez GROQ_API_KEY:
+
+    python manage.py llm_standin --fixtures api/testdata/llm_fixtures.jsonl --latency lognormal:600,0.4
+    GROQ_BASE_URL=http://127.0.0.1:8089/v1 GROQ_API_KEY=x python manage.py runserver
+
+Fixture je JSONL, jedan snimljen odgovor po redu:
+
+    {"question": "Kakav je kurs evra?", "content": "{\"intent\": ...}", "latency_ms": 640,
+     "usage": {"prompt_tokens": 410, "completion_tokens": 38, "total_tokens": 448}}
+
+Odgovor se bira po normalizovanom pitanju (deo posle "PITANJE KORISNIKA:" u
+poslednjoj user poruci); bez pogotka vraća se default_content. U režimu
+snimanja (upstream) zahtev ide na pravi API, a odgovor se dopisuje u fixture.
+"""
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .prompt_budget import estimate_tokens
+from .response_cache import normalize_question
+
+QUESTION_MARKER = "PITANJE KORISNIKA:"
+DEFAULT_CONTENT = json.dumps(
+    {"intent": "general", "reply": "Ovo je testni odgovor.", "link": ""},
+    ensure_ascii=False,
+)
+STREAM_CHUNK_CHARS = 12
+# Deo ukupnog kašnjenja koji protekne pre prvog stream chunk-a.
+STREAM_TTFT_SHARE = 0.3
+
+Latency = Callable[[random.Random, Optional[Dict]], float]
+
+
+def parse_latency(spec: str) -> Latency:
+    """
+    Raspodela kašnjenja u ms -> funkcija koja vraća sekunde:
+    none | fixed:MS | uniform:MIN,MAX | normal:MEAN,SD | lognormal:MEDIAN,SIGMA | recorded[:FALLBACK_MS]
+    """
+    kind, _, args = (spec or "none").partition(":")
+    nums = [float(x) for x in args.split(",") if x.strip()]
+
+    if kind == "none":
+        return lambda rng, rec: 0.0
+    if kind == "fixed" and len(nums) == 1:
+        return lambda rng, rec: nums[0] / 1000
+    if kind == "uniform" and len(nums) == 2:
+        return lambda rng, rec: rng.uniform(nums[0], nums[1]) / 1000
+    if kind == "normal" and len(nums) == 2:
+        return lambda rng, rec: max(0.0, rng.gauss(nums[0], nums[1])) / 1000
+    if kind == "lognormal" and len(nums) == 2:
+        mu = math.log(nums[0])
+        return lambda rng, rec: rng.lognormvariate(mu, nums[1]) / 1000
+    if kind == "recorded":
+        fallback = nums[0] if nums else 0.0
+        return lambda rng, rec: ((rec or {}).get("latency_ms", fallback)) / 1000
+    raise ValueError(f"Nepoznata raspodela kašnjenja: {spec!r}")
+
+
+def _malform_fence(c: str) -> str:
+    return "```json\n" + c + "\n```"
+
+
+def _malform_prose(c: str) -> str:
+    return "Naravno, evo odgovora:\n" + c
+
+
+def _malform_trailing_comma(c: str) -> str:
+    return c[:-1].rstrip() + ",}" if c.endswith("}") else c
+
+
+def _malform_truncate(c: str) -> str:
+    return c[: max(1, int(len(c) * 0.7))]
+
+
+def _malform_single_quotes(c: str) -> str:
+    return c.replace("'", "’").replace('"', "'")
+
+
+MALFORMERS: Tuple[Callable[[str], str], ...] = (
+    _malform_fence,
+    _malform_prose,
+    _malform_trailing_comma,
+    _malform_truncate,
+    _malform_single_quotes,
+)
+
+
+def question_of(messages: List[Dict]) -> str:
+    for m in reversed(messages or []):
+        if m.get("role") == "user":
+            content = m.get("content") or ""
+            _, marker, tail = content.rpartition(QUESTION_MARKER)
+            return (tail if marker else content).strip()
+    return ""
+
+
+def load_fixtures(path) -> Dict[str, Dict]:
+    fixtures: Dict[str, Dict] = {}
+    p = Path(path)
+    if not p.exists():
+        return fixtures
+    for line in p.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            rec = json.loads(line)
+            fixtures[normalize_question(rec["question"])] = rec
+    return fixtures
+
+
+@dataclass
+class StandinConfig:
+    fixtures: Dict[str, Dict] = field(default_factory=dict)
+    default_content: str = DEFAULT_CONTENT
+    latency: Latency = field(default_factory=lambda: parse_latency("none"))
+    malformed_rate: float = 0.0
+    error_rate: float = 0.0
+    error_codes: Tuple[int, ...] = (500, 503, 429)
+    seed: Optional[int] = None
+    # Režim snimanja: pravi API i fajl u koji se dopisuju odgovori.
+    upstream: str = ""
+    upstream_key: str = ""
+    record_to: str = ""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        self.server.count("requests")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": "not found"}})
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            return self._json(400, {"error": {"message": "invalid json"}})
+
+        cfg: StandinConfig = self.server.config
+        if cfg.upstream:
+            content, usage = self._record(body)
+            if content is None:
+                return
+            delay = 0.0
+        else:
+            rec, content = self.server.pick(body)
+            delay = self.server.draw(cfg.latency, rec)
+            code = self.server.maybe_error()
+            if code:
+                time.sleep(delay)
+                self.server.count("errors")
+                return self._json(code, {"error": {"message": "stand-in injected error", "code": code}})
+            content = self.server.maybe_malform(content)
+            usage = dict((rec or {}).get("usage") or {}) or {
+                "prompt_tokens": sum(estimate_tokens(m.get("content") or "") for m in body.get("messages") or []),
+                "completion_tokens": estimate_tokens(content),
+            }
+            usage.setdefault("total_tokens", usage["prompt_tokens"] + usage["completion_tokens"])
+
+        if body.get("stream"):
+            self.server.count("streamed")
+            self._stream(content, delay)
+        else:
+            time.sleep(delay)
+            self._json(200, self._completion(content, usage))
+
+    def _completion(self, content: str, usage: Dict) -> Dict:
+        return {
+            "id": "standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "standin",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    def _json(self, code: int, payload: Dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, content: str, delay: float) -> None:
+        chunks = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)] or [""]
+        first = delay * STREAM_TTFT_SHARE
+        gap = (delay - first) / max(1, len(chunks) - 1)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        time.sleep(first)
+        for i, piece in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            event = {
+                "id": "standin",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "standin",
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _record(self, body: Dict) -> Tuple[Optional[str], Dict]:
+        cfg: StandinConfig = self.server.config
+        upstream_body = dict(body, stream=False)
+        req = urllib.request.Request(
+            cfg.upstream.rstrip("/") + "/chat/completions",
+            data=json.dumps(upstream_body).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {cfg.upstream_key}" if cfg.upstream_key else self.headers.get("Authorization", ""),
+            },
+            method="POST",
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                payload = json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            self.server.count("errors")
+            self._json(e.code, {"error": {"message": f"upstream: {e.reason}"}})
+            return None, {}
+        except (urllib.error.URLError, TimeoutError) as e:
+            self.server.count("errors")
+            self._json(502, {"error": {"message": f"upstream: {e}"}})
+            return None, {}
+
+        content = payload["choices"][0]["message"].get("content") or ""
+        usage = payload.get("usage") or {}
+        self.server.save({
+            "question": question_of(body.get("messages")),
+            "content": content,
+            "latency_ms": round((time.perf_counter() - started) * 1000),
+            "usage": {k: usage[k] for k in ("prompt_tokens", "completion_tokens", "total_tokens") if k in usage},
+        })
+        return content, usage
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandinServer(ThreadingHTTPServer):
+    request_queue_size = 512
+    daemon_threads = True
+
+    def __init__(self, address, config: StandinConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.rng = random.Random(config.seed)
+        self.stats: Dict[str, int] = dict.fromkeys(
+            ("connections", "requests", "replayed", "defaulted", "malformed", "errors", "streamed", "recorded"), 0
+        )
+
+    def handle_error(self, request, client_address):
+        # Klijent je odustao pre odgovora (npr. istekao rok poruke); to nije greška stand-in-a.
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    # Brojač "connections" koriste i stariji benchmarki.
+    @property
+    def connections(self) -> int:
+        return self.stats["connections"]
+
+    @connections.setter
+    def connections(self, value: int) -> None:
+        with self.lock:
+            self.stats["connections"] = value
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += n
+
+    def pick(self, body: Dict) -> Tuple[Optional[Dict], str]:
+        rec = self.config.fixtures.get(normalize_question(question_of(body.get("messages"))))
+        self.count("replayed" if rec else "defaulted")
+        return rec, (rec["content"] if rec else self.config.default_content)
+
+    def draw(self, latency: Latency, rec: Optional[Dict]) -> float:
+        with self.lock:
+            return latency(self.rng, rec)
+
+    def maybe_error(self) -> int:
+        cfg = self.config
+        with self.lock:
+            if cfg.error_rate and self.rng.random() < cfg.error_rate:
+                return self.rng.choice(cfg.error_codes)
+        return 0
+
+    def maybe_malform(self, content: str) -> str:
+        cfg = self.config
+        with self.lock:
+            if not (cfg.malformed_rate and self.rng.random() < cfg.malformed_rate):
+                return content
+            malform = self.rng.choice(MALFORMERS)
+            self.stats["malformed"] += 1
+        return malform(content)
+
+    def save(self, rec: Dict) -> None:
+        with self.lock:
+            self.config.fixtures[normalize_question(rec["question"])] = rec
+            if self.config.record_to:
+                with open(self.config.record_to, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self.stats["recorded"] += 1
+
+
+def start_standin(config: Optional[StandinConfig] = None, host: str = "127.0.0.1", port: int = 0) -> Tuple[StandinServer, str]:
+    """Pokreće server u pozadinskoj niti; vraća (server, base_url za GROQ_BASE_URL)."""
+    server = StandinServer((host, port), config or StandinConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
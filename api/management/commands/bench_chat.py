@@ -0,0 +1,288 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import time as dtime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from api.chat_service import chat_log
+from api.context_cache import bump_context_version
+from api.llm_ledger import llm_ledger
+from api.llm_standin import StandinConfig, load_fixtures, parse_latency, start_standin
+from api.models import Branch, FAQEntry
+from api.response_cache import response_cache
+from api.weather import provider as weather_provider
+
+FIXTURES = Path(__file__).resolve().parents[2] / "testdata" / "llm_fixtures.jsonl"
+
+MESSAGES: Dict[str, Tuple[str, ...]] = {
+    "faq": (
+        "Koje je radno vreme?",
+        "Kada radi filijala u Novom Sadu?",
+        "Gde se nalaze vaše filijale?",
+        "Koja dokumenta su potrebna za račun?",
+        "Kako da zakažem termin?",
+        "Ima li slobodnih termina sutra u Beogradu?",
+        "Kako da blokiram izgubljenu karticu?",
+    ),
+    "datetime": ("Koji je datum danas?", "Koliko je sati?"),
+    "weather": ("Kakvo je vreme napolju?", "Koliko je stepeni?"),
+    "llm": (
+        "Kakav je kurs evra?",
+        "Koliko košta vođenje računa?",
+        "Kako da aktiviram mobilno bankarstvo?",
+        "Mogu li da podignem kredit online?",
+        "Šta je IPS plaćanje?",
+        "Da li imate štednju u dinarima?",
+    ),
+}
+DEFAULT_MIX = "faq=40,datetime=10,weather=10,llm=40"
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    v = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(v[min(len(v) - 1, int(round(p * (len(v) - 1))))], 2)
+
+    return {
+        "count": len(v),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(v[-1], 2),
+        "mean_ms": round(statistics.fmean(v), 2),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class Command(BaseCommand):
+    help = "Load test za /api/chat/ (ceo ChatView stack) nad LLM stand-in serverom; rezultat kao JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="udeo kategorija poruka, npr. faq=40,llm=60")
+        parser.add_argument("--llm-latency", default="lognormal:600,0.4", help="raspodela kašnjenja stand-in LLM-a")
+        parser.add_argument("--malformed-rate", type=float, default=0.1)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--weather-latency", type=float, default=0.3, help="sekunde po pozivu OpenWeather stub-a")
+        parser.add_argument("--llm-cache", action="store_true", help="ne gasi keš LLM odgovora")
+        parser.add_argument("--use-db", action="store_true", help="koristi podešenu bazu umesto privremene test baze")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="", help="JSON fajl (podrazumevano data/bench/bench_chat-<vreme>.json)")
+        parser.add_argument("--compare", default="", help="prethodni JSON rezultat za poređenje")
+
+    def handle(self, *args, **opts):
+        mix = self._parse_mix(opts["mix"])
+        rng = random.Random(opts["seed"])
+        cats = list(mix)
+        plan = [
+            (cat, rng.choice(MESSAGES[cat]))
+            for cat in rng.choices(cats, weights=[mix[c] for c in cats], k=opts["warmup"] + opts["requests"])
+        ]
+
+        old_db = None
+        if not opts["use_db"]:
+            old_db = connection.settings_dict["NAME"]
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._seed_data()
+            with self._stubs(opts):
+                results, elapsed = self._run(plan, opts)
+        finally:
+            chat_log.flush()
+            llm_ledger.flush()
+            if old_db is not None:
+                connection.creation.destroy_test_db(old_db, verbosity=0)
+
+        report = self._report(results[opts["warmup"]:], elapsed, opts)
+        self._write(report, opts)
+
+    def _parse_mix(self, spec: str) -> Dict[str, float]:
+        mix = {}
+        for part in spec.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name not in MESSAGES:
+                raise CommandError(f"Nepoznata kategorija {name!r}; dostupne: {', '.join(MESSAGES)}")
+            mix[name] = float(weight or 1)
+        return mix
+
+    def _seed_data(self):
+        if not Branch.objects.exists():
+            Branch.objects.bulk_create([
+                Branch(name="Knez Mihailova", address="Knez Mihailova 10", city="Beograd"),
+                Branch(name="Novi Beograd", address="Bulevar Mihajla Pupina 4", city="Beograd",
+                       open_time=dtime(9, 0), close_time=dtime(17, 0)),
+                Branch(name="Bulevar", address="Bulevar oslobođenja 5", city="Novi Sad", slot_minutes=20),
+            ])
+        if not FAQEntry.objects.exists():
+            FAQEntry.objects.create(
+                intent="faq",
+                question="Kako da blokiram izgubljenu karticu?",
+                answer="Pozovite kontakt centar 0-24 ili blokirajte karticu u mobilnoj aplikaciji.",
+            )
+        bump_context_version()
+
+    class _stubs:
+        """LLM stand-in, stub za OpenWeather i ugašen keš LLM odgovora dok traje merenje."""
+
+        def __init__(self, opts):
+            self.opts = opts
+
+        def __enter__(self):
+            opts = self.opts
+            self.server, base_url = start_standin(StandinConfig(
+                fixtures=load_fixtures(FIXTURES),
+                latency=parse_latency(opts["llm_latency"]),
+                malformed_rate=opts["malformed_rate"],
+                error_rate=opts["error_rate"],
+                seed=opts["seed"],
+            ))
+            self.env = {k: os.environ.get(k) for k in ("GROQ_BASE_URL", "GROQ_API_KEY")}
+            os.environ.update(GROQ_BASE_URL=base_url, GROQ_API_KEY="standin")
+
+            delay = opts["weather_latency"]
+
+            def fake_weather(city):
+                time.sleep(delay)
+                return {"city": city, "temperature": 21.0, "feels_like": 20.0, "humidity": 40,
+                        "description": "vedro", "wind": 2.0}
+
+            self.weather_fetch = weather_provider._fetch
+            weather_provider._fetch = fake_weather
+            weather_provider.clear()
+
+            self.cache_ttl = response_cache.ttl
+            if not opts["llm_cache"]:
+                response_cache.ttl = 0
+            response_cache.clear()
+            return self
+
+        def __exit__(self, *exc):
+            self.server.shutdown()
+            for k, v in self.env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+            weather_provider._fetch = self.weather_fetch
+            weather_provider.clear()
+            response_cache.ttl = self.cache_ttl
+            return False
+
+    def _run(self, plan, opts):
+        results: List[Dict] = [None] * len(plan)
+        cursor = iter(range(len(plan)))
+        lock = threading.Lock()
+        warmup = opts["warmup"]
+        started_at = [None]
+
+        def worker(n: int):
+            client = Client()
+            session = f"bench-{n}"
+            while True:
+                with lock:
+                    i = next(cursor, None)
+                    if i is None:
+                        break
+                    if i == warmup and started_at[0] is None:
+                        started_at[0] = time.perf_counter()
+                cat, msg = plan[i]
+                t0 = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    r = client.post("/api/chat/", {"message": msg, "session_id": session}, content_type="application/json")
+                results[i] = {
+                    "category": cat,
+                    "path": r.get("X-Chat-Path") or "unknown",
+                    "status": r.status_code,
+                    "ms": (time.perf_counter() - t0) * 1000,
+                    "queries": len(queries),
+                }
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(opts["concurrency"])]
+        t_all = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - (started_at[0] or t_all)
+        return results, elapsed
+
+    def _group(self, rows: List[Dict], field: str, elapsed: float) -> Dict[str, Dict]:
+        groups = defaultdict(list)
+        for row in rows:
+            groups[row[field]].append(row)
+        out = {}
+        for name, items in sorted(groups.items()):
+            stats = _percentiles([r["ms"] for r in items])
+            stats["rps"] = round(len(items) / elapsed, 2) if elapsed else 0.0
+            stats["queries_per_request"] = round(statistics.fmean(r["queries"] for r in items), 2)
+            stats["errors"] = sum(1 for r in items if r["status"] >= 400)
+            out[name] = stats
+        return out
+
+    def _report(self, rows: List[Dict], elapsed: float, opts) -> Dict:
+        overall = _percentiles([r["ms"] for r in rows])
+        overall["rps"] = round(len(rows) / elapsed, 2) if elapsed else 0.0
+        overall["queries_per_request"] = round(statistics.fmean(r["queries"] for r in rows), 2) if rows else 0.0
+        overall["errors"] = sum(1 for r in rows if r["status"] >= 400)
+        overall["elapsed_s"] = round(elapsed, 3)
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": _git_revision(),
+            "config": {k: opts[k] for k in (
+                "requests", "concurrency", "warmup", "mix", "llm_latency", "malformed_rate",
+                "error_rate", "weather_latency", "llm_cache", "seed",
+            )},
+            "overall": overall,
+            "by_path": self._group(rows, "path", elapsed),
+            "by_category": self._group(rows, "category", elapsed),
+        }
+
+    def _write(self, report: Dict, opts):
+        out = opts["output"] or str(
+            Path(settings.BASE_DIR) / "data" / "bench" / f"bench_chat-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        Path(out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        previous = {}
+        if opts["compare"]:
+            previous = json.loads(Path(opts["compare"]).read_text(encoding="utf-8"))
+
+        self.stdout.write(f"{'putanja':<16}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>8}{'upita':>7}")
+        rows = [("UKUPNO", report["overall"], previous.get("overall"))]
+        rows += [(k, v, previous.get("by_path", {}).get(k)) for k, v in report["by_path"].items()]
+        for name, s, prev in rows:
+            line = (f"{name:<16}{s['count']:>6}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}"
+                    f"{s['rps']:>8.1f}{s['queries_per_request']:>7.1f}")
+            if prev and prev.get("count"):
+                line += f"   p95 {s['p95_ms'] - prev['p95_ms']:+.1f}ms, rps {s['rps'] - prev['rps']:+.1f}"
+            self.stdout.write(line)
+        self.stdout.write(f"\nrezultat: {out}")
@@ -0,0 +1,60 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.llm_standin import StandinConfig, load_fixtures, parse_latency, start_standin
+
+
+class Command(BaseCommand):
+    help = "Lokalni OpenAI-kompatibilan stand-in za Groq: replay fixture-a ili snimanje pravog saobraćaja."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8089)
+        parser.add_argument("--fixtures", default="api/testdata/llm_fixtures.jsonl",
+                            help="JSONL sa snimljenim odgovorima (u režimu snimanja se dopisuje)")
+        parser.add_argument("--latency", default="recorded:600",
+                            help="none | fixed:MS | uniform:MIN,MAX | normal:MEAN,SD | lognormal:MEDIAN,SIGMA | recorded[:MS]")
+        parser.add_argument("--malformed-rate", type=float, default=0.0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--error-codes", default="500,503,429")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--record", action="store_true",
+                            help="prosleđuj na --upstream i snimaj odgovore u --fixtures")
+        parser.add_argument("--upstream", default="https://api.groq.com/openai/v1")
+
+    def handle(self, *args, **opts):
+        try:
+            latency = parse_latency(opts["latency"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        config = StandinConfig(
+            fixtures=load_fixtures(opts["fixtures"]),
+            latency=latency,
+            malformed_rate=opts["malformed_rate"],
+            error_rate=opts["error_rate"],
+            error_codes=tuple(int(c) for c in opts["error_codes"].split(",") if c.strip()),
+            seed=opts["seed"],
+        )
+        if opts["record"]:
+            key = os.getenv("GROQ_API_KEY", "")
+            if not key:
+                raise CommandError("Za snimanje je potreban GROQ_API_KEY.")
+            config.upstream = opts["upstream"]
+            config.upstream_key = key
+            config.record_to = opts["fixtures"]
+
+        server, base_url = start_standin(config, host=opts["host"], port=opts["port"])
+        mode = f"snimanje -> {opts['fixtures']}" if opts["record"] else f"replay ({len(config.fixtures)} fixture-a)"
+        self.stdout.write(f"LLM stand-in na {base_url}, {mode}")
+        self.stdout.write(f"  GROQ_BASE_URL={base_url} GROQ_API_KEY=standin")
+        try:
+            while True:
+                time.sleep(30)
+                self.stdout.write(json.dumps(server.stats))
+        except KeyboardInterrupt:
+            server.shutdown()
+            self.stdout.write(json.dumps(server.stats))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.booking import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = "Ponovo računa SlotOccupancy iz aktivnih termina (npr. posle bulk_create/update ili uvoza termina)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branch", type=int, action="append", help="samo ove filijale (može više puta)")
+
+    def handle(self, *args, **opts):
+        slots = rebuild_occupancy(opts["branch"])
+        self.stdout.write(self.style.SUCCESS(f"Zauzetost obnovljena za {slots} slotova."))
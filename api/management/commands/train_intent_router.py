@@ -0,0 +1,112 @@
+import json
+import random
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.faq_matcher import INTENT_KEYWORDS, LOCAL_INTENTS, match_intent, normalize
+from api.intent_router import DEFAULT_DIM, GENERAL, intent_router, router_path, train
+from api.models import ChatMessage, FAQEntry
+
+# Označeni primeri za trening; api/testdata ostaje samo za testove i benchmark.
+SEED = Path(__file__).resolve().parents[2] / "intent_seed.jsonl"
+
+
+def _label(intent) -> str:
+    return intent if intent in LOCAL_INTENTS else GENERAL
+
+
+def _read_jsonl(path: Path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+class Command(BaseCommand):
+    help = "Trenira naive Bayes router namera (heširani n-grami, NumPy) i čuva ga kao .npz artefakt."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="", help="podrazumevano INTENT_ROUTER_PATH ili data/intent_router.npz")
+        parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="broj heš kofica")
+        parser.add_argument("--alpha", type=float, default=0.5)
+        parser.add_argument("--log-messages", type=int, default=0,
+                            help="koliko poslednjih korisničkih poruka iz ChatMessage ulazi u korpus (podrazumevano 0)")
+        parser.add_argument("--log-weight", type=float, default=0.25,
+                            help="težina poruke iz logova u odnosu na označeni primer")
+        parser.add_argument("--extra", action="append", default=[],
+                            help="dodatni JSONL sa {\"message\", \"intent\"} (može više puta)")
+        parser.add_argument("--holdout", type=float, default=0.2, help="udeo primera za procenu pre konačnog treninga")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        samples = self._corpus(opts)
+        if len({label for _, label, _ in samples}) < 2:
+            raise CommandError("Korpus ima manje od dve namere")
+
+        if opts["holdout"] > 0:
+            self._evaluate(samples, opts)
+
+        router = train(samples, dim=opts["dim"], alpha=opts["alpha"])
+        out = Path(opts["output"]) if opts["output"] else router_path()
+        router.save(out)
+
+        t0 = time.perf_counter()
+        for text, _, _ in samples:
+            router.predict(text)
+        per_msg = (time.perf_counter() - t0) / len(samples) * 1e6
+        self.stdout.write(
+            f"{len(samples)} primera, namere: {', '.join(router.labels)}\n"
+            f"artefakt: {out} ({out.stat().st_size // 1024} KB), predikcija ~{per_msg:.0f} us/poruka"
+        )
+
+    def _corpus(self, opts):
+        samples = {}
+        # Ključne reči i označeni primeri imaju prednost nad pseudo-oznakama iz logova.
+        for intent, keywords in INTENT_KEYWORDS:
+            for k in keywords:
+                samples.setdefault(normalize(k), (_label(intent), 1.0))
+        for path in [SEED, *map(Path, opts["extra"])]:
+            for rec in _read_jsonl(path):
+                samples.setdefault(normalize(rec["message"]), (_label(rec["intent"]), 1.0))
+        for question, intent in FAQEntry.objects.filter(is_active=True).values_list("question", "intent"):
+            samples.setdefault(normalize(question), (_label(intent), 1.0))
+
+        if opts["log_messages"]:
+            # Logovi nemaju oznaku; uzimaju se samo poruke koje matcher prepoznaje kao lokalnu nameru,
+            # sa manjom težinom. Neprepoznate se ne proglašavaju za "general".
+            logged = (
+                ChatMessage.objects.filter(role="user")
+                .order_by("-created_at")
+                .values_list("content", flat=True)[: opts["log_messages"]]
+            )
+            for content in logged:
+                msg = normalize(content).strip()
+                if msg and msg not in samples:
+                    intent = match_intent(msg)
+                    if intent in LOCAL_INTENTS:
+                        samples[msg] = (intent, opts["log_weight"])
+        return [(text, label, weight) for text, (label, weight) in samples.items()]
+
+    def _evaluate(self, samples, opts):
+        rng = random.Random(opts["seed"])
+        shuffled = samples[:]
+        rng.shuffle(shuffled)
+        cut = int(len(shuffled) * (1 - opts["holdout"]))
+        train_set, test_set = shuffled[:cut], shuffled[cut:]
+        if not train_set or not test_set:
+            return
+
+        router = train(train_set, dim=opts["dim"], alpha=opts["alpha"])
+        threshold = intent_router.min_confidence
+        correct = routed = routed_wrong = local = 0
+        for text, label, _ in test_set:
+            intent, confidence = router.predict(text)
+            correct += intent == label
+            local += label != GENERAL
+            if intent != GENERAL and confidence >= threshold:
+                routed += 1
+                routed_wrong += intent != label
+        self.stdout.write(
+            f"holdout {len(test_set)}: tačnost {correct / len(test_set):.2%}, "
+            f"lokalno rutirano {routed} (od {local} lokalnih), pogrešno rutirano {routed_wrong} "
+            f"pri pragu {threshold}"
+        )
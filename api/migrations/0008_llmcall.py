@@ -0,0 +1,32 @@
+# Generated by Django 5.2.11 on 2026-10-18 14:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_chatmessage_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('kind', models.CharField(choices=[('completion', 'Completion'), ('repair', 'Repair'), ('cache', 'Cache hit'), ('coalesced', 'Coalesced')], default='completion', max_length=12)),
+                ('outcome', models.CharField(choices=[('ok', 'OK'), ('repaired', 'Repaired locally'), ('repair_remote', 'Repaired remotely'), ('unparsed', 'Unparsed'), ('error', 'Error')], default='ok', max_length=14)),
+                ('model', models.CharField(blank=True, default='', max_length=80)),
+                ('intent', models.CharField(blank=True, default='', max_length=50)),
+                ('stream', models.BooleanField(default=False)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='api_llmcall_created_0fc5c8_idx'), models.Index(fields=['intent', 'created_at'], name='api_llmcall_intent_4db839_idx')],
+            },
+        ),
+    ]
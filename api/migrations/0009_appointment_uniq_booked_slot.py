@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+def cancel_duplicate_bookings(apps, schema_editor):
+    """Postojeći dupli termini (trka pre ograničenja): ostaje najranije zakazan, ostali se otkazuju."""
+    Appointment = apps.get_model("api", "Appointment")
+    dupes = (
+        Appointment.objects.filter(status="booked")
+        .values("branch_id", "start_time")
+        .annotate(n=models.Count("id"))
+        .filter(n__gt=1)
+    )
+    for d in dupes:
+        ids = list(
+            Appointment.objects.filter(status="booked", branch_id=d["branch_id"], start_time=d["start_time"])
+            .order_by("created_at", "id")
+            .values_list("id", flat=True)
+        )
+        Appointment.objects.filter(id__in=ids[1:]).update(status="canceled")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_llmcall'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'booked')), fields=('branch', 'start_time'), name='uniq_booked_slot'),
+        ),
+    ]
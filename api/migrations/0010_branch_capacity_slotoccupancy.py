@@ -0,0 +1,60 @@
+# Generated by Django 5.2.11 on 2026-10-18 14:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_occupancy(apps, schema_editor):
+    """Zauzetost postojećih slotova iz aktivnih termina."""
+    Appointment = apps.get_model("api", "Appointment")
+    SlotOccupancy = apps.get_model("api", "SlotOccupancy")
+    rows = (
+        Appointment.objects.filter(status="booked")
+        .values("branch_id", "start_time")
+        .annotate(n=models.Count("id"))
+    )
+    SlotOccupancy.objects.bulk_create(
+        [SlotOccupancy(branch_id=r["branch_id"], start_time=r["start_time"], booked=r["n"]) for r in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_appointment_uniq_booked_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('booked', models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='appointment',
+            name='uniq_booked_slot',
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='capacity',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'booked')), fields=('branch', 'start_time', 'user'), name='uniq_booked_slot_user'),
+        ),
+        migrations.AddField(
+            model_name='slotoccupancy',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='api.branch'),
+        ),
+        migrations.AddConstraint(
+            model_name='slotoccupancy',
+            constraint=models.UniqueConstraint(fields=('branch', 'start_time'), name='uniq_slot_occupancy'),
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from datetime import time
 
 
@@ -57,6 +58,8 @@ class Branch(models.Model):
     close_time = models.TimeField(default=time(16, 0))
 
     slot_minutes = models.PositiveIntegerField(default=30)
+    # Broj šaltera: koliko termina može istovremeno da se zakaže u istom slotu.
+    capacity = models.PositiveSmallIntegerField(default=1)
 
     def __str__(self):
         return f"{self.name} - {self.city}"
@@ -87,10 +90,46 @@ class Appointment(models.Model):
             models.Index(fields=["branch", "start_time", "status"]),
             models.Index(fields=["user", "start_time", "status"]),
         ]
+        constraints = [
+            # Kapacitet slota čuva SlotOccupancy; ovde samo: isti korisnik ne zauzima isti slot dvaput.
+            models.UniqueConstraint(
+                fields=["branch", "start_time", "user"],
+                condition=models.Q(status="booked"),
+                name="uniq_booked_slot_user",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} @ {self.branch} - {self.start_time} ({self.status})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        appt = super().from_db(db, field_names, values)
+        # Slot koji red drži u bazi; po njemu signali (api.signals) usklađuju SlotOccupancy.
+        if not {"branch_id", "start_time", "status"} & appt.get_deferred_fields():
+            appt._held_slot = (appt.branch_id, appt.start_time) if appt.status == "booked" else None
+        return appt
+
+    def save(self, *args, **kwargs):
+        # post_save uzima mesto u slotu; kad ga nema (SlotTaken), poništava se i upis termina.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+
+class SlotOccupancy(models.Model):
+    """Broj zauzetih mesta po (filijala, početak termina); menja se samo uslovnim UPDATE-om."""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="occupancy")
+    start_time = models.DateTimeField()
+    booked = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["branch", "start_time"], name="uniq_slot_occupancy"),
+        ]
+
+    def __str__(self):
+        return f"{self.branch} - {self.start_time}: {self.booked}"
+
 
 
 class FAQEntry(models.Model):
@@ -125,7 +164,8 @@ class ChatMessage(models.Model):
     role = models.CharField(max_length=10)  
     content = models.TextField()
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Ne auto_now_add: poruke se upisuju odloženo (bulk_create), a vreme mora biti vreme zahteva.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         indexes = [
@@ -135,3 +175,39 @@ class ChatMessage(models.Model):
 
     def __str__(self):
         return f"{self.session_id} [{self.role}] {self.created_at}"
+
+
+class LLMCall(models.Model):
+    """Jedan red po LLM pozivu (i po odgovoru iz keša), za troškove i latenciju."""
+    KIND_CHOICES = (
+        ("completion", "Completion"),
+        ("repair", "Repair"),
+        ("cache", "Cache hit"),
+        ("coalesced", "Coalesced"),
+    )
+    OUTCOME_CHOICES = (
+        ("ok", "OK"),
+        ("repaired", "Repaired locally"),
+        ("repair_remote", "Repaired remotely"),
+        ("unparsed", "Unparsed"),
+        ("error", "Error"),
+    )
+
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, default="completion")
+    outcome = models.CharField(max_length=14, choices=OUTCOME_CHOICES, default="ok")
+    model = models.CharField(max_length=80, blank=True, default="")
+    intent = models.CharField(max_length=50, blank=True, default="")
+    stream = models.BooleanField(default=False)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["intent", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at} {self.kind}/{self.outcome} {self.model}"
@@ -0,0 +1,164 @@
+import json
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Brza procena bez tokenizera: reči i znakovi interpunkcije, uz dodatak za
+# duge reči (BPE ih deli na više delova). Za srpski tekst procena je
+# nešto iznad stvarnog broja tokena, što je bezbednija strana.
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return sum(1 + len(p) // 5 for p in _PIECE_RE.findall(text))
+
+
+def input_token_budget() -> int:
+    return int(os.getenv("GROQ_INPUT_TOKEN_BUDGET", "3000"))
+
+
+@dataclass
+class PromptStats:
+    input_tokens: int
+    budget: int
+    dropped_history: int = 0
+    dropped_context: int = 0
+    dropped_state: bool = False
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.dropped_history or self.dropped_context or self.dropped_state)
+
+
+class _ContextItems:
+    """
+    Kontekst je niz blokova ("Naslov:\\n- stavka\\n- stavka") poređanih po
+    važnosti, a stavke u bloku po relevantnosti. Odsecanje ide od poslednje
+    stavke poslednjeg bloka naviše; blok bez stavki nestaje zajedno sa naslovom.
+    """
+
+    def __init__(self, context: str):
+        self.blocks: List[List[str]] = [b.split("\n") for b in context.strip().split("\n\n") if b.strip()]
+
+    def drop_last(self) -> bool:
+        if not self.blocks:
+            return False
+        block = self.blocks[-1]
+        if block[-1].startswith("- ") and sum(line.startswith("- ") for line in block) > 1:
+            block.pop()
+        else:
+            self.blocks.pop()
+        return True
+
+    def text(self) -> str:
+        return "\n\n".join("\n".join(b) for b in self.blocks)
+
+
+def _user_content(msg: str, context: str, state: Optional[Dict[str, Any]]) -> str:
+    parts: List[str] = []
+    if state:
+        parts.append("STATE (pouzdan izvor istine):\n" + json.dumps(state, ensure_ascii=False))
+    if context:
+        parts.append("KONTEKST (pouzdan izvor istine):\n" + context)
+    parts.append("PITANJE KORISNIKA:\n" + msg)
+    return "\n\n".join(parts).strip()
+
+
+def assemble(
+    system: str,
+    msg: str,
+    context: str = "",
+    history: Optional[List[Dict[str, str]]] = None,
+    state: Optional[Dict[str, Any]] = None,
+    budget: Optional[int] = None,
+) -> Tuple[List[Dict[str, str]], PromptStats]:
+    """
+    Slaže poruke za model tako da procena ulaznih tokena stane u budžet.
+    Redosled odsecanja: najstarija istorija, pa najslabije rangirani kontekst,
+    pa state. Sistemski prompt i pitanje se nikad ne seku.
+    """
+    budget = input_token_budget() if budget is None else budget
+    msg = (msg or "").strip()
+    turns = list(history or [])
+    items = _ContextItems(context or "")
+    stats = PromptStats(input_tokens=0, budget=budget)
+
+    fixed = MESSAGE_OVERHEAD * 2 + estimate_tokens(system)
+    turn_costs = [MESSAGE_OVERHEAD + estimate_tokens(t["content"]) for t in turns]
+    history_cost = sum(turn_costs)
+
+    def user_cost() -> int:
+        return estimate_tokens(_user_content(msg, items.text(), state))
+
+    total = fixed + history_cost + user_cost()
+    while total > budget and turns:
+        turns.pop(0)
+        history_cost -= turn_costs.pop(0)
+        stats.dropped_history += 1
+        total = fixed + history_cost + user_cost()
+
+    while total > budget and items.drop_last():
+        stats.dropped_context += 1
+        total = fixed + history_cost + user_cost()
+
+    if total > budget and state:
+        state = None
+        stats.dropped_state = True
+        total = fixed + history_cost + user_cost()
+
+    messages = [{"role": "system", "content": system}]
+    messages.extend({"role": t["role"], "content": t["content"]} for t in turns)
+    messages.append({"role": "user", "content": _user_content(msg, items.text(), state)})
+    stats.input_tokens = total
+    return messages, stats
+
+
+class PromptMeter:
+    """Zbirne metrike veličine ulaza po pozivu (za admin statistiku)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.truncated = 0
+            self.input_tokens = 0
+            self.max_input_tokens = 0
+            self.dropped_history = 0
+            self.dropped_context = 0
+            self.dropped_state = 0
+
+    def record(self, stats: PromptStats) -> None:
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += stats.input_tokens
+            self.max_input_tokens = max(self.max_input_tokens, stats.input_tokens)
+            self.dropped_history += stats.dropped_history
+            self.dropped_context += stats.dropped_context
+            self.dropped_state += int(stats.dropped_state)
+            if stats.truncated:
+                self.truncated += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "truncated": self.truncated,
+                "avg_input_tokens": math.ceil(self.input_tokens / self.calls) if self.calls else 0,
+                "max_input_tokens": self.max_input_tokens,
+                "dropped_history": self.dropped_history,
+                "dropped_context": self.dropped_context,
+                "dropped_state": self.dropped_state,
+                "budget": input_token_budget(),
+            }
+
+
+prompt_meter = PromptMeter()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    "Koje su filijale?" i "koje su  filijale" daju isti ključ.
+    """
+    text = _PUNCT_RE.sub(" ", (text or "").lower())
+    return _WS_RE.sub(" ", text).strip()
+
+
+def cache_key(question: str, context: str = "", state: Optional[Dict[str, Any]] = None) -> str:
+    h = hashlib.sha1()
+    h.update(normalize_question(question).encode())
+    h.update(b"\0")
+    h.update(hashlib.sha1((context or "").strip().encode()).digest())
+    h.update(b"\0")
+    if state:
+        h.update(json.dumps(state, ensure_ascii=False, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _entry_size(value: Dict[str, str]) -> int:
+    return 64 + sum(len(k) + len(str(v)) for k, v in value.items())
+
+
+class ResponseCache:
+    """
+    LRU + TTL keš odgovora modela, ograničen brojem unosa i približnom
+    veličinom u bajtovima.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 2 * 1024 * 1024, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, int, Dict[str, str]]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key: str, value: Dict[str, str]) -> None:
+        size = _entry_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl, size, dict(value))
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("GROQ_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("GROQ_CACHE_MAX_BYTES", str(2 * 1024 * 1024))),
+    ttl=float(os.getenv("GROQ_CACHE_TTL", "600")),
+)
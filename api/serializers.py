@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
+from .booking import book
 from .models import Branch, Appointment
 
 User = get_user_model()
@@ -39,7 +40,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 class BranchSerializer(serializers.ModelSerializer):
     class Meta:
         model = Branch
-        fields = ("id", "name", "address", "city", "open_time", "close_time", "slot_minutes")
+        fields = ("id", "name", "address", "city", "open_time", "close_time", "slot_minutes", "capacity")
 
 class AppointmentSerializer(serializers.ModelSerializer):
     branch = BranchSerializer(read_only=True)
@@ -78,14 +79,6 @@ class AppointmentSerializer(serializers.ModelSerializer):
         if (st_local.minute % branch.slot_minutes) != 0:
             raise serializers.ValidationError({"start_time": f"Termin mora biti poravnat na slot od {branch.slot_minutes} min."})
 
-        exists = Appointment.objects.filter(
-            branch=branch,
-            start_time=start_time,
-            status="booked"
-        ).exists()
-        if exists:
-            raise serializers.ValidationError({"start_time": "Termin je već zauzet."})
-
         attrs["branch"] = branch
         attrs["user"] = request.user
         return attrs
@@ -94,7 +87,8 @@ class AppointmentSerializer(serializers.ModelSerializer):
         branch = validated_data.pop("branch")
         user = validated_data.pop("user")
         validated_data.pop("branch_id", None)
-        return Appointment.objects.create(branch=branch, user=user, **validated_data)
+        # Bez provere unapred: mesto se uzima atomično u SlotOccupancy (409 ako ga nema).
+        return book(branch, user, validated_data["start_time"])
 
     
 class ChatRequestSerializer(serializers.Serializer):
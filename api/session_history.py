@@ -0,0 +1,127 @@
+import threading
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Deque, List
+
+from django.core.cache import cache
+
+from .groq_client import ChatTurn
+
+MAX_TURN_CHARS = 800
+
+
+class _Ring:
+    __slots__ = ("turns", "chars", "stamp")
+
+    def __init__(self, turns: Deque[ChatTurn], stamp):
+        self.turns = turns
+        self.chars = sum(len(t["content"]) for t in turns)
+        self.stamp = stamp
+
+
+class SessionHistory:
+    """
+    Poslednjih max_turns poruka po sesiji, u memoriji.
+    - promašaj: učitavanje iz baze (loader), jednom po sesiji
+    - svaki upis poruke dopunjuje ring, bez upita
+    - LRU izbacivanje sesija preko max_sessions ili max_chars ukupno
+    U deljenom kešu se čuva oznaka poslednjeg upisa po sesiji, pa worker čiji
+    ring je zastareo (poruku je obradio drugi worker) ponovo učita istoriju.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, int], List[ChatTurn]],
+        max_turns: int = 6,
+        max_sessions: int = 2000,
+        max_chars: int = 4_000_000,
+    ):
+        self.loader = loader
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._rings: "OrderedDict[str, _Ring]" = OrderedDict()
+        self._chars = 0
+        self._token = uuid.uuid4().hex
+        self._seq = 0
+
+    @staticmethod
+    def _stamp_key(session_id: str) -> str:
+        return f"chat:hist:{session_id}"
+
+    def get(self, session_id: str) -> List[ChatTurn]:
+        if self.max_turns <= 0:
+            return []
+        stamp = cache.get(self._stamp_key(session_id))
+        with self._lock:
+            ring = self._rings.get(session_id)
+            if ring is not None and ring.stamp == stamp:
+                self._rings.move_to_end(session_id)
+                self.hits += 1
+                return list(ring.turns)
+            self.misses += 1
+
+        turns = deque(
+            ({"role": t["role"], "content": t["content"][:MAX_TURN_CHARS]} for t in self.loader(session_id, self.max_turns)),
+            maxlen=self.max_turns,
+        )
+        with self._lock:
+            self._store(session_id, _Ring(turns, stamp))
+            return list(turns)
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        if self.max_turns <= 0:
+            return
+        with self._lock:
+            ring = self._rings.get(session_id)
+            if ring is None:
+                # Sledeći get() ionako učitava iz baze.
+                cache.delete(self._stamp_key(session_id))
+                return
+            if len(ring.turns) == ring.turns.maxlen:
+                dropped = ring.turns[0]
+                ring.chars -= len(dropped["content"])
+                self._chars -= len(dropped["content"])
+            content = content[:MAX_TURN_CHARS]
+            ring.turns.append({"role": role, "content": content})
+            ring.chars += len(content)
+            self._chars += len(content)
+            self._seq += 1
+            ring.stamp = (self._token, self._seq)
+            self._rings.move_to_end(session_id)
+            self._evict()
+            stamp = ring.stamp
+        cache.set(self._stamp_key(session_id), stamp, None)
+
+    def _store(self, session_id: str, ring: _Ring) -> None:
+        old = self._rings.pop(session_id, None)
+        if old is not None:
+            self._chars -= old.chars
+        self._rings[session_id] = ring
+        self._chars += ring.chars
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._rings and (len(self._rings) > self.max_sessions or self._chars > self.max_chars):
+            _, ring = self._rings.popitem(last=False)
+            self._chars -= ring.chars
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rings.clear()
+            self._chars = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._rings),
+                "chars": self._chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .booking import sync_occupancy
+from .context_cache import bump_context_version
+from .models import Appointment, Branch, FAQEntry
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+@receiver(post_save, sender=FAQEntry)
+@receiver(post_delete, sender=FAQEntry)
+def context_data_changed(sender, **kwargs):
+    bump_context_version()
+
+
+# SlotOccupancy prati i izmene termina mimo booking.book/cancel (admin, kaskadno brisanje).
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, **kwargs):
+    sync_occupancy(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    sync_occupancy(instance, deleted=True)
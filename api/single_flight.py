@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class CoalesceTimeout(TimeoutError):
+    pass
+
+
+@dataclass
+class _Flight:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Spaja istovremene pozive sa istim ključem u procesu: prvi (lider) radi
+    posao, ostali čekaju njegov rezultat (ili grešku) najviše timeout sekundi.
+    Radi i za niti (do) i za korutine na istoj petlji (ado).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._flights.pop(key, None)
+                flight.done.set()
+            return flight.result
+
+        if not flight.done.wait(timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise CoalesceTimeout(key)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        flights = self._async_flights.setdefault(loop, {})
+        future = flights.get(key)
+
+        if future is None:
+            future = flights[key] = loop.create_future()
+            self.leaders += 1
+            try:
+                result = await fn()
+            except BaseException as e:
+                # Otkazan lider ne sme da otkaže pratioce; oni dobijaju CoalesceTimeout.
+                future.set_exception(CoalesceTimeout(key) if isinstance(e, asyncio.CancelledError) else e)
+                future.exception()  # da asyncio ne prijavi "exception was never retrieved"
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                flights.pop(key, None)
+
+        self.followers += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise CoalesceTimeout(key) from None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "in_flight": len(self._flights) + sum(len(f) for f in self._async_flights.values()),
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "timeouts": self.timeouts,
+                "coalesce_ratio": round(self.followers / total, 4) if total else 0.0,
+            }
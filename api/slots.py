@@ -0,0 +1,255 @@
+import heapq
+import os
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from itertools import islice
+from time import time_ns
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .context_cache import context_version
+from .models import SlotOccupancy
+
+# Bitmape popunjenih termina po (filijala, dan); sigurnosna granica ako neka izmena zaobiđe invalidaciju.
+SLOT_CACHE_TTL = int(os.getenv("SLOT_CACHE_TTL", "600"))
+
+# Pretraga "prvog slobodnog termina": koliko dana unapred i najviše dana bitmapa po dohvatanju.
+NEXT_SLOT_HORIZON_DAYS = int(os.getenv("NEXT_SLOT_HORIZON_DAYS", "92"))
+NEXT_SLOT_MAX_CHUNK_DAYS = 16
+
+
+@lru_cache(maxsize=256)
+def slot_template(open_time: time, close_time: time, slot_minutes: int) -> Tuple[time, ...]:
+    """Početna vremena termina jednog dana; deli se između filijala sa istim radnim vremenom."""
+    start = open_time.hour * 60 + open_time.minute
+    end = close_time.hour * 60 + close_time.minute
+    return tuple(time(m // 60, m % 60) for m in range(start, end, slot_minutes))
+
+
+@lru_cache(maxsize=4096)
+def _day_grid(day: date, open_time: time, close_time: time, slot_minutes: int, tz) -> Tuple[datetime, ...]:
+    return tuple(
+        timezone.make_aware(datetime.combine(day, t), tz)
+        for t in slot_template(open_time, close_time, slot_minutes)
+    )
+
+
+def slot_grid(day: date, open_time: time, close_time: time, slot_minutes: int) -> List[datetime]:
+    """Svi termini jednog dana u filijali (aware, u tekućoj vremenskoj zoni)."""
+    return list(_day_grid(day, open_time, close_time, slot_minutes, timezone.get_current_timezone()))
+
+
+def _cache_key(
+    version: str, generation: int, branch_id: int, day: date, open_time: time, close_time: time, slot_minutes: int
+) -> str:
+    return (
+        f"slots:booked:{version}:{branch_id}:{day.isoformat()}:{generation}:"
+        f"{open_time.strftime('%H%M')}-{close_time.strftime('%H%M')}:{slot_minutes}"
+    )
+
+
+def _generation_key(branch_id: int, day: date) -> str:
+    return f"slots:gen:{branch_id}:{day.isoformat()}"
+
+
+def _query_booked(
+    branch_id: int, open_time: time, close_time: time, slot_minutes: int, first: date, last: date
+) -> Dict[date, int]:
+    """Jedan upit nad SlotOccupancy za dane first..last; bit i je 1 ako je i-ti termin dana popunjen."""
+    n = len(slot_template(open_time, close_time, slot_minutes))
+    tz = timezone.get_current_timezone()
+    base = open_time.hour * 60 + open_time.minute
+    booked: Dict[date, int] = {}
+    for start in SlotOccupancy.objects.filter(
+        branch_id=branch_id,
+        booked__gte=F("branch__capacity"),
+        start_time__gte=timezone.make_aware(datetime.combine(first, open_time), tz),
+        start_time__lt=timezone.make_aware(datetime.combine(last, close_time), tz),
+    ).values_list("start_time", flat=True):
+        local = timezone.localtime(start, tz)
+        offset = local.hour * 60 + local.minute - base
+        if local.second or local.microsecond or offset < 0 or offset % slot_minutes:
+            continue  # van mreže termina; takav ne zauzima nijedan termin
+        idx = offset // slot_minutes
+        if idx < n:
+            booked[local.date()] = booked.get(local.date(), 0) | (1 << idx)
+    return booked
+
+
+def _days(first: date, last: date) -> Iterable[date]:
+    day = first
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+class SlotCache:
+    """
+    Popunjeni termini (SlotOccupancy.booked >= capacity) po (filijala, dan,
+    radno vreme) kao int bitmape u deljenom Django kešu, pa ih vide svi
+    workeri. Ključ sadrži generaciju (filijala, dan) koju zakazivanje i
+    otkazivanje povećavaju, pa bitmapa pročitana pre izmene, a upisana posle
+    nje, ostaje pod starim ključem i više se ne čita. Promena filijale (i
+    kapaciteta) menja context_version, a time i ključ.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def booked(
+        self, branch_id: int, open_time: time, close_time: time, slot_minutes: int, first: date, last: date
+    ) -> Dict[date, int]:
+        version = context_version()
+        days = list(_days(first, last))
+        generations = self._generations(branch_id, days)
+        keys = {
+            d: _cache_key(version, generations[d], branch_id, d, open_time, close_time, slot_minutes)
+            for d in days if generations[d] is not None
+        }
+        found = cache.get_many(list(keys.values()))
+        result = {d: found[k] for d, k in keys.items() if k in found}
+        missing = [d for d in days if d not in result]
+        self.hits += len(result)
+        self.misses += len(missing)
+        if missing:
+            fresh = _query_booked(branch_id, open_time, close_time, slot_minutes, missing[0], missing[-1])
+            for d in missing:
+                result[d] = fresh.get(d, 0)
+            cache.set_many({keys[d]: result[d] for d in missing if d in keys}, SLOT_CACHE_TTL)
+        return result
+
+    def _generations(self, branch_id: int, days: Sequence[date]) -> Dict[date, Optional[int]]:
+        keys = {d: _generation_key(branch_id, d) for d in days}
+        found = cache.get_many(list(keys.values()))
+        new = [k for k in keys.values() if k not in found]
+        if new:
+            # Izbačena generacija kreće od novog broja, da se ne poklopi sa nekom starom bitmapom.
+            start = time_ns()
+            for k in new:
+                cache.add(k, start, None)
+            found.update(cache.get_many(new))
+        # None (generacija odmah izbačena iz keša): dan se čita iz baze i ne kešira.
+        return {d: found.get(k) for d, k in keys.items()}
+
+    def invalidate(self, branch, start_time: datetime) -> None:
+        key = _generation_key(branch.id, timezone.localtime(start_time).date())
+        self._bump(key)
+        if transaction.get_connection().in_atomic_block:
+            # I posle commita: čitalac koji je između dva povećanja video staru bazu
+            # upisao je bitmapu pod generacijom koja tada prestaje da važi.
+            transaction.on_commit(lambda: self._bump(key))
+
+    @staticmethod
+    def _bump(key: str) -> None:
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass  # nema generacije: prvo čitanje pravi novu, pa stare bitmape ionako ne važe
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "templates": slot_template.cache_info().currsize}
+
+
+slot_cache = SlotCache()
+
+
+def free_slots(
+    branch_id: int,
+    open_time: time,
+    close_time: time,
+    slot_minutes: int,
+    day: date,
+    now: Optional[datetime] = None,
+) -> List[datetime]:
+    """Slobodni budući termini filijale za dan (bitmapa iz slot_cache, upit samo na promašaj)."""
+    grid = _day_grid(day, open_time, close_time, slot_minutes, timezone.get_current_timezone())
+    if not grid:
+        return []
+
+    booked = slot_cache.booked(branch_id, open_time, close_time, slot_minutes, day, day)[day]
+    now = now or timezone.now()
+    return [s for i, s in enumerate(grid) if s > now and not booked >> i & 1]
+
+
+def availability(
+    branch_id: int,
+    open_time: time,
+    close_time: time,
+    slot_minutes: int,
+    first: date,
+    last: date,
+    now: Optional[datetime] = None,
+) -> Tuple[Tuple[time, ...], List[Tuple[date, int]]]:
+    """
+    Slobodni termini za dane first..last (uključivo) kao bitmape: bit i je 1
+    ako je i-ti termin iz slot_template slobodan. Nedostajući dani iz slot_cache
+    se čitaju jednim upitom, bez pravljenja datetime-a po terminu.
+    """
+    template = slot_template(open_time, close_time, slot_minutes)
+    n = len(template)
+    if not n or last < first:
+        return template, []
+
+    booked = slot_cache.booked(branch_id, open_time, close_time, slot_minutes, first, last)
+
+    now_local = timezone.localtime(now or timezone.now())
+    today, now_time = now_local.date(), now_local.time()
+    full = (1 << n) - 1
+    past_today = 0
+    for i, t in enumerate(template):
+        if t <= now_time:
+            past_today |= 1 << i
+
+    days = []
+    for day in _days(first, last):
+        if day < today:
+            bits = 0
+        else:
+            bits = full & ~booked[day]
+            if day == today:
+                bits &= ~past_today
+        days.append((day, bits))
+    return template, days
+
+
+def _branch_stream(branch: Dict, after: datetime, last: date) -> Iterator[Tuple[datetime, int, Dict]]:
+    """
+    Slobodni termini jedne filijale posle `after`, hronološki. Bitmape se čitaju
+    u blokovima od 1, 2, 4... dana: kad ima mesta odmah, dira se samo jedan dan.
+    """
+    open_time, close_time, slot_minutes = branch["open_time"], branch["close_time"], branch["slot_minutes"]
+    if not slot_template(open_time, close_time, slot_minutes):
+        return
+    tz = timezone.get_current_timezone()
+    first = timezone.localtime(after, tz).date()
+    chunk = 1
+    while first <= last:
+        chunk_end = min(first + timedelta(days=chunk - 1), last)
+        chunk = min(chunk * 2, NEXT_SLOT_MAX_CHUNK_DAYS)
+        booked = slot_cache.booked(branch["id"], open_time, close_time, slot_minutes, first, chunk_end)
+        for day in _days(first, chunk_end):
+            taken = booked[day]
+            for i, start in enumerate(_day_grid(day, open_time, close_time, slot_minutes, tz)):
+                if start > after and not taken >> i & 1:
+                    yield start, branch["id"], branch
+        first = chunk_end + timedelta(days=1)
+
+
+def next_free_slots(
+    branches: Sequence[Dict], after: Optional[datetime] = None, limit: int = 5
+) -> List[Tuple[datetime, Dict]]:
+    """
+    Prvih `limit` slobodnih termina preko svih filijala (dict-ovi iz snapshot-a),
+    hronološki. Tokovi po filijali se lenjo spajaju heap-om, pa se bitmape čitaju
+    samo za dane do poslednjeg vraćenog termina.
+    """
+    after = max(after or timezone.now(), timezone.now())
+    # Horizont se broji od `after`, ne od danas: i daleki `after` daje rezultat.
+    last = timezone.localdate(after) + timedelta(days=NEXT_SLOT_HORIZON_DAYS - 1)
+    merged = heapq.merge(*(_branch_stream(b, after, last) for b in branches))
+    return [(start, branch) for start, _, branch in islice(merged, limit)]
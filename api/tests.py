@@ -1,12 +1,42 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
 from datetime import datetime, timedelta, time as dtime
+from unittest import mock
 
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from rest_framework.test import APIClient
 
-from .models import Branch, Appointment
+from .models import Branch, Appointment, ChatMessage, FAQEntry, LLMCall, SlotOccupancy
+from .booking import SlotTaken, book, rebuild_occupancy
+from .faq_matcher import match_faq, match_intent, normalize
+from .intent_matcher import Automaton
+from .weather import WeatherError, WeatherProvider
+from .context_cache import build_context, bump_context_version, context_version
+from .groq_client import _ClientManager, _coalesce_wait, _normalize_output, _parse_content, groq_chat_json
+from .response_cache import ResponseCache, cache_key, response_cache
+from .write_behind import WriteBehindBuffer
+from .faq_index import BM25Index
+from .session_history import SessionHistory
+from .prompt_budget import assemble, estimate_tokens
+from .json_repair import repair_json, repair_stats
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .single_flight import CoalesceTimeout, SingleFlight
+from .answer_engine import extract_day
+from .text_normalize import fold
+from .intent_router import IntentRouter, intent_router
+from . import slots as slots_module
+from .llm_standin import StandinConfig, load_fixtures, parse_latency, start_standin
 
 User = get_user_model()
 
@@ -115,6 +145,64 @@ class AppointmentFlowTests(TestCase):
         self.assertIn("available_slots", r.data)
         self.assertIsInstance(r.data["available_slots"], list)
 
+    def test_availability_matches_per_day_slots(self):
+        today = timezone.localdate()
+        for days_ahead, hour in ((1, 8), (1, 15), (3, 10)):
+            book(self.branch, self.user, make_future_slot(self.branch, days_ahead=days_ahead, hour=hour, minute=0))
+        first, last = today - timedelta(days=1), today + timedelta(days=4)
+
+        with self.assertNumQueries(2):  # filijale (snapshot) + popunjeni termini
+            r = self.client.get(f"/api/branches/{self.branch.id}/availability/?from={first}&to={last}")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.data["slots"]), 16)
+        self.assertEqual([d["date"] for d in r.data["days"]], [str(first + timedelta(days=i)) for i in range(6)])
+
+        for day in r.data["days"]:
+            per_day = self.client.get(f"/api/branches/{self.branch.id}/slots/?date={day['date']}").data
+            expected = {timezone.localtime(datetime.fromisoformat(s)).strftime("%H:%M") for s in per_day["available_slots"]}
+            free = {t for t, bit in zip(r.data["slots"], day["bitmap"]) if bit == "1"}
+            self.assertEqual(free, expected, day["date"])
+            self.assertEqual(day["free"], len(expected))
+        self.assertEqual(r.data["days"][2]["bitmap"], "0" + "1" * 13 + "01")  # 08:00 i 15:00 zauzeti
+
+    def test_availability_validates_range(self):
+        url = f"/api/branches/{self.branch.id}/availability/"
+        self.assertEqual(len(self.client.get(url).data["days"]), 14)
+        self.assertEqual(self.client.get(url, {"from": "2026-13-01"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"from": "2026-11-10", "to": "2026-11-01"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"from": "2026-01-01", "to": "2026-12-31"}).status_code, 400)
+
+    def test_slot_cache_invalidated_on_book_and_cancel(self):
+        start_time = make_future_slot(self.branch, days_ahead=2, hour=9, minute=0)
+        url = f"/api/branches/{self.branch.id}/slots/?date={timezone.localtime(start_time).date()}"
+        self.assertIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+        with self.assertNumQueries(0):  # filijala iz snapshot-a, bitmapa iz keša
+            self.client.get(url)
+
+        self.auth_as(self.user)
+        r = self.client.post("/api/appointments/",
+                             {"branch_id": self.branch.id, "start_time": start_time.isoformat()}, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertNotIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+
+        self.assertEqual(self.client.post(f"/api/appointments/{r.data['id']}/cancel/").status_code, 200)
+        self.assertIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+
+    def test_slot_cache_ignores_bitmap_read_before_booking(self):
+        start_time = make_future_slot(self.branch, days_ahead=2, hour=10, minute=0)
+        url = f"/api/branches/{self.branch.id}/slots/?date={timezone.localtime(start_time).date()}"
+        query = slots_module._query_booked
+
+        def stale_read(*args):
+            # Upit vidi slobodan slot, a zakazivanje (i invalidacija) stiže pre upisa bitmape u keš.
+            found = query(*args)
+            book(self.branch, self.user, start_time)
+            return found
+
+        with mock.patch.object(slots_module, "_query_booked", side_effect=stale_read):
+            self.assertIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+        self.assertNotIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+
     def test_user_can_create_appointment(self):
         self.auth_as(self.user)
         start_time = make_future_slot(self.branch, days_ahead=1, hour=10, minute=0)
@@ -144,7 +232,123 @@ class AppointmentFlowTests(TestCase):
             {"branch_id": self.branch.id, "start_time": start_time.isoformat()},
             format="json",
         )
-        self.assertEqual(r2.status_code, 400)
+        self.assertEqual(r2.status_code, 409)
+        self.assertEqual(Appointment.objects.filter(branch=self.branch, start_time=start_time).count(), 1)
+
+        # Otkazan termin ne blokira slot.
+        self.client.post(f"/api/appointments/{r1.data['id']}/cancel/")
+        r3 = self.client.post(
+            "/api/appointments/",
+            {"branch_id": self.branch.id, "start_time": start_time.isoformat()},
+            format="json",
+        )
+        self.assertEqual(r3.status_code, 201)
+
+    def test_duplicate_booking_rejected_by_database(self):
+        from django.db import IntegrityError, transaction
+
+        start_time = make_future_slot(self.branch, days_ahead=1, hour=10, minute=0)
+        Appointment.objects.create(user=self.user, branch=self.branch, start_time=start_time)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(user=self.user, branch=self.branch, start_time=start_time)
+        Appointment.objects.create(user=self.user, branch=self.branch, start_time=start_time, status="canceled")
+
+    def test_slot_capacity(self):
+        self.branch.capacity = 2
+        self.branch.save()
+        other = User.objects.create_user(username="ana", password="Testpass123!", role="user")
+        third = User.objects.create_user(username="iva", password="Testpass123!", role="user")
+        start_time = make_future_slot(self.branch, days_ahead=1, hour=10, minute=0)
+        url = f"/api/branches/{self.branch.id}/slots/?date={timezone.localtime(start_time).date()}"
+
+        def post(user):
+            self.auth_as(user)
+            return self.client.post("/api/appointments/",
+                                    {"branch_id": self.branch.id, "start_time": start_time.isoformat()}, format="json")
+
+        first = post(self.user)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(post(self.user).status_code, 409)  # isti korisnik, isti slot
+        self.assertIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+        self.assertEqual(post(other).status_code, 201)
+        self.assertNotIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+        self.assertEqual(post(third).status_code, 409)
+        self.assertEqual(SlotOccupancy.objects.get(branch=self.branch, start_time=start_time).booked, 2)
+
+        self.auth_as(self.user)
+        self.client.post(f"/api/appointments/{first.data['id']}/cancel/")
+        self.assertEqual(self.client.post(f"/api/appointments/{first.data['id']}/cancel/").status_code, 400)
+        self.assertEqual(SlotOccupancy.objects.get(branch=self.branch, start_time=start_time).booked, 1)
+        self.assertIn(start_time.isoformat(), self.client.get(url).data["available_slots"])
+        self.assertEqual(post(third).status_code, 201)
+
+        SlotOccupancy.objects.all().delete()
+        self.assertEqual(rebuild_occupancy(), 1)
+        self.assertEqual(SlotOccupancy.objects.get(branch=self.branch, start_time=start_time).booked, 2)
+
+    def test_occupancy_follows_delete_cascade_and_admin(self):
+        slot = lambda h: make_future_slot(self.branch, days_ahead=1, hour=h, minute=0)
+        occupied = lambda h: SlotOccupancy.objects.get(branch=self.branch, start_time=slot(h)).booked
+        url = f"/api/branches/{self.branch.id}/slots/?date={timezone.localtime(slot(9)).date()}"
+        free = lambda h: slot(h).isoformat() in self.client.get(url).data["available_slots"]
+
+        book(self.branch, self.user, slot(9)).delete()
+        self.assertEqual(occupied(9), 0)
+        self.assertTrue(free(9))
+
+        guest = User.objects.create_user(username="gost", password="Testpass123!", role="user")
+        book(self.branch, guest, slot(10))
+        self.assertFalse(free(10))
+        guest.delete()  # kaskadno briše i termin
+        self.assertEqual(occupied(10), 0)
+        self.assertTrue(free(10))
+
+        admin = User.objects.create_superuser(username="root", email="root@example.com", password="Testpass123!")
+        appt = book(self.branch, self.user, slot(11))
+        self.client.force_login(admin)
+        form = {
+            "user": self.user.id, "branch": self.branch.id, "status": "canceled",
+            "start_time_0": timezone.localtime(slot(11)).strftime("%Y-%m-%d"), "start_time_1": "11:00:00",
+        }
+        r = self.client.post(f"/admin/api/appointment/{appt.id}/change/", form)
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(occupied(11), 0)
+        self.assertTrue(free(11))
+
+        form.update(status="booked", start_time_1="12:00:00")  # admin vraća termin, ali u drugi slot
+        self.client.post(f"/admin/api/appointment/{appt.id}/change/", form)
+        self.assertEqual((occupied(11), occupied(12)), (0, 1))
+        self.assertFalse(free(12))
+
+    def test_direct_and_admin_saves_respect_capacity(self):
+        start_time = make_future_slot(self.branch, days_ahead=1, hour=13, minute=0)
+        guest = User.objects.create_user(username="gost", password="Testpass123!", role="user")
+        book(self.branch, self.user, start_time)
+
+        with self.assertRaises(SlotTaken):
+            Appointment.objects.create(user=guest, branch=self.branch, start_time=start_time)
+        self.assertFalse(Appointment.objects.filter(user=guest).exists())
+        self.assertEqual(SlotOccupancy.objects.get(branch=self.branch, start_time=start_time).booked, 1)
+
+        appt = Appointment.objects.create(user=guest, branch=self.branch, start_time=start_time, status="canceled")
+        admin = User.objects.create_superuser(username="root", email="root@example.com", password="Testpass123!")
+        self.client.force_login(admin)
+        form = {
+            "user": guest.id, "branch": self.branch.id, "status": "booked",
+            "start_time_0": timezone.localtime(start_time).strftime("%Y-%m-%d"), "start_time_1": "13:00:00",
+        }
+        r = self.client.post(f"/admin/api/appointment/{appt.id}/change/", form)
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, "Termin je već zauzet")
+        appt.refresh_from_db()
+        self.assertEqual(appt.status, "canceled")
+        self.assertEqual(SlotOccupancy.objects.get(branch=self.branch, start_time=start_time).booked, 1)
+
+        # Učitan termin pamti svoj slot bez post_init signala; ponovni save istog slota ništa ne menja.
+        held = Appointment.objects.get(user=self.user)
+        self.assertEqual(held._held_slot, (self.branch.id, start_time))
+        held.save()
+        self.assertEqual(SlotOccupancy.objects.get(branch=self.branch, start_time=start_time).booked, 1)
 
     def test_employee_cannot_create_appointment(self):
         self.auth_as(self.employee)
@@ -198,3 +402,1008 @@ class AppointmentFlowTests(TestCase):
         r_cancel2 = self.client.post(f"/api/appointments/{appt_id}/cancel/", format="json")
         self.assertEqual(r_cancel2.status_code, 200)
         self.assertIn("message", r_cancel2.data)
+
+
+class FAQMatcherTests(TestCase):
+    def test_automaton_finds_overlapping_patterns_in_one_pass(self):
+        ac = Automaton(["he", "she", "his", "hers"])
+        found = sorted(ac.patterns[i] for i in ac.iter_matches("ushers"))
+        self.assertEqual(found, ["he", "hers", "she"])
+
+    def test_longest_keyword_wins(self):
+        r = match_faq("Koje je radno vreme?")
+        self.assertEqual(r["intent"], "branches_hours")
+
+    def test_no_match_returns_none(self):
+        self.assertIsNone(match_faq("Kakav je kurs evra?"))
+
+    def test_fold_diacritics_and_cyrillic(self):
+        self.assertEqual(fold("Šta mi TREBA"), "sta mi treba")
+        self.assertEqual(fold("Ђурђевдан, ЏЕП, љиљан"), "djurdjevdan, dzep, ljiljan")
+        self.assertEqual(fold("s\u030cta"), "sta")
+        self.assertEqual(fold("radno vreme"), "radno vreme")
+
+    def test_labeled_messages(self):
+        path = Path(__file__).parent / "testdata" / "intent_messages.jsonl"
+        for line in path.read_text(encoding="utf-8").splitlines():
+            rec = json.loads(line)
+            with self.subTest(message=rec["message"]):
+                self.assertEqual(match_intent(rec["message"]), rec["intent"])
+
+    def test_faq_entry_changes_rebuild_matcher(self):
+        self.assertIsNone(match_faq("Kako da otvorim račun za firmu?"))
+
+        entry = FAQEntry.objects.create(
+            intent="faq",
+            question="Kako da otvorim račun?",
+            answer="Dođite u filijalu sa ličnom kartom.",
+        )
+        r = match_faq("Kako da otvorim račun za firmu?")
+        self.assertEqual(r["reply"], entry.answer)
+
+        entry.is_active = False
+        entry.save()
+        self.assertIsNone(match_faq("Kako da otvorim račun za firmu?"))
+
+
+class WeatherProviderTests(TestCase):
+    SAMPLE = {"city": "Belgrade", "temperature": 21.4, "feels_like": 20.9,
+              "humidity": 40, "description": "vedro", "wind": 2.1}
+
+    def test_concurrent_misses_share_one_fetch(self):
+        calls = []
+        release = threading.Event()
+
+        def fetch(city):
+            calls.append(city)
+            release.wait(2)
+            return dict(self.SAMPLE)
+
+        provider = WeatherProvider(fetch=fetch, ttl=60, stale_ttl=60)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(provider.get("Belgrade"))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        fetch = mock.Mock(return_value=dict(self.SAMPLE))
+        provider = WeatherProvider(fetch=fetch, ttl=0, stale_ttl=60)
+        provider.get("Belgrade")
+        fetch.side_effect = WeatherError("down")
+
+        self.assertEqual(provider.get("Belgrade")["city"], "Belgrade")
+
+    def test_weather_view_uses_provider(self):
+        with mock.patch("api.views.get_current_weather", return_value=dict(self.SAMPLE)):
+            r = APIClient().get("/api/weather/?city=Belgrade")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["temperature"], 21.4)
+
+        with mock.patch("api.views.get_current_weather", side_effect=WeatherError("down")):
+            r = APIClient().get("/api/weather/")
+        self.assertEqual(r.status_code, 502)
+
+
+class ContextCacheTests(TestCase):
+    def setUp(self):
+        bump_context_version()
+        self.branch = Branch.objects.create(
+            name="Banka Centar",
+            address="Ulica 1",
+            city="Belgrade",
+            open_time=dtime(8, 0),
+            close_time=dtime(16, 0),
+        )
+
+    def test_warm_context_costs_no_queries(self):
+        self.assertIn("Banka Centar", build_context())
+        with self.assertNumQueries(0):
+            build_context()
+
+    def test_branch_change_bumps_version(self):
+        before = context_version()
+        build_context()
+
+        self.branch.close_time = dtime(17, 0)
+        self.branch.save()
+
+        self.assertNotEqual(context_version(), before)
+        self.assertIn("08:00–17:00", build_context())
+
+        self.branch.delete()
+        self.assertNotIn("Banka Centar", build_context())
+
+
+class GroqClientManagerTests(TestCase):
+    @mock.patch.dict("os.environ", {"GROQ_API_KEY": "test", "GROQ_BASE_URL": "http://127.0.0.1:9/v1"})
+    def test_client_is_reused_and_rebuilt_after_fork(self):
+        manager = _ClientManager()
+        first = manager.get()
+        self.assertIs(manager.get(), first)
+
+        manager.reset_after_fork()
+        self.assertIsNot(manager.get(), first)
+        manager.close()
+
+    @mock.patch.dict("os.environ", {"GROQ_API_KEY": ""})
+    def test_missing_key_raises(self):
+        with self.assertRaises(RuntimeError):
+            _ClientManager().get()
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        response_cache.clear()
+
+    def test_equivalent_questions_share_key(self):
+        self.assertEqual(cache_key("Koje su filijale?", "ctx"), cache_key("koje su  filijale", "ctx"))
+        self.assertNotEqual(cache_key("koje su filijale", "ctx"), cache_key("koje su filijale", "ctx2"))
+
+    def test_lru_eviction_and_counters(self):
+        c = ResponseCache(max_entries=2, ttl=60)
+        c.put("a", {"reply": "1"})
+        c.put("b", {"reply": "2"})
+        c.get("a")
+        c.put("c", {"reply": "3"})
+
+        self.assertIsNone(c.get("b"))
+        self.assertEqual(c.get("a"), {"reply": "1"})
+        stats = c.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 1, 1))
+
+    def test_only_single_turn_parsed_answers_are_cached(self):
+        answer = {"intent": "branches_list", "reply": "Imamo filijale.", "link": ""}
+        with mock.patch("api.groq_client._complete", return_value=(answer, True)) as complete:
+            groq_chat_json("Koje su filijale?", context="ctx")
+            groq_chat_json("koje su filijale", context="ctx")
+            self.assertEqual(complete.call_count, 1)
+
+            history = [{"role": "user", "content": "zdravo"}]
+            groq_chat_json("koje su filijale", context="ctx", history=history)
+            self.assertEqual(complete.call_count, 2)
+
+        with mock.patch("api.groq_client._complete", return_value=(answer, False)) as complete:
+            groq_chat_json("nešto drugo", context="ctx")
+            groq_chat_json("nešto drugo", context="ctx")
+            self.assertEqual(complete.call_count, 2)
+
+
+def fake_stream_client(content: str, step: int = 4):
+    def create(**kwargs):
+        assert kwargs.get("stream")
+        return [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + step]))])
+            for i in range(0, len(content), step)
+        ]
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class ChatStreamTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+
+    def post_stream(self, message):
+        r = self.client.post(
+            "/api/chat/stream/",
+            {"message": message, "session_id": "s1"},
+            format="json",
+            HTTP_ACCEPT="text/event-stream",
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "text/event-stream")
+        return parse_sse(b"".join(r.streaming_content).decode())
+
+    def test_llm_reply_is_streamed_then_persisted(self):
+        content = json.dumps({"intent": "general", "reply": "Kurs se menja \"dnevno\".", "link": ""})
+        with mock.patch("api.groq_client.groq_client", return_value=fake_stream_client(content)):
+            events = self.post_stream("Kakav je kurs evra?")
+
+        deltas = "".join(data["text"] for name, data in events if name == "delta")
+        self.assertEqual(deltas, 'Kurs se menja "dnevno".')
+        self.assertGreater(len([e for e in events if e[0] == "delta"]), 1)
+        name, done = events[-1]
+        self.assertEqual((name, done["intent"]), ("done", "general"))
+        self.assertEqual(
+            list(ChatMessage.objects.filter(session_id="s1").values_list("role", "content")),
+            [("user", "Kakav je kurs evra?"), ("assistant", 'Kurs se menja "dnevno".')],
+        )
+
+    def test_faq_hit_is_single_event_pair(self):
+        events = self.post_stream("Koje je radno vreme?")
+        self.assertEqual([e[0] for e in events], ["delta", "done"])
+        self.assertEqual(events[-1][1]["intent"], "branches_hours")
+
+    def test_invalid_request_is_rejected(self):
+        r = self.client.post("/api/chat/stream/", {}, format="json", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(r.status_code, 400)
+
+    def test_asgi_stream_does_not_hold_shared_sync_thread(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from .views import _aiter_sync
+
+        gate = threading.Event()
+
+        def slow_events():
+            yield "a"
+            gate.wait(2)  # LLM koji sporo šalje sledeći deo
+            yield "b"
+
+        async def run():
+            stream = _aiter_sync(slow_events())
+            first = await stream.__anext__()
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.05)
+            t0 = time.monotonic()
+            await sync_to_async(lambda: None)()  # drugi sinhroni view na istom workeru
+            waited = time.monotonic() - t0
+            gate.set()
+            second = await pending
+            await stream.aclose()
+            return first, second, waited
+
+        first, second, waited = asyncio.run(run())
+        self.assertEqual((first, second), ("a", "b"))
+        self.assertLess(waited, 1.0)
+
+
+class ChatViewTests(TestCase):
+    ANSWER = {"intent": "general", "reply": "Kurs objavljujemo svakog jutra.", "link": ""}
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_sync_chat_persists_both_turns(self):
+        with mock.patch("api.chat_service.groq_chat_json", return_value=dict(self.ANSWER)):
+            r = self.client.post("/api/chat/", {"message": "Kakav je kurs?", "session_id": "a1"}, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["reply"], self.ANSWER["reply"])
+        self.assertEqual(ChatMessage.objects.filter(session_id="a1").count(), 2)
+
+    def test_async_chat_matches_sync_contract(self):
+        user = User.objects.create_user(username="async", password="Testpass123!")
+        token = self.client.post(
+            "/api/auth/login/", {"username": "async", "password": "Testpass123!"}, format="json"
+        ).data["access"]
+
+        with mock.patch("api.chat_service.groq_chat_json_async", new=mock.AsyncMock(return_value=dict(self.ANSWER))):
+            r = self.client.post(
+                "/api/chat/async/",
+                {"message": "Kakav je kurs?", "session_id": "a2"},
+                format="json",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), self.ANSWER)
+        self.assertEqual(ChatMessage.objects.filter(session_id="a2", user=user).count(), 2)
+
+    def test_async_chat_rejects_bad_token_and_payload(self):
+        r = self.client.post("/api/chat/async/", {"message": "x"}, format="json", HTTP_AUTHORIZATION="Bearer nope")
+        self.assertEqual(r.status_code, 401)
+        r = self.client.post("/api/chat/async/", {}, format="json")
+        self.assertEqual(r.status_code, 400)
+
+    def test_async_chat_accepts_same_input_as_sync(self):
+        payloads = [
+            ({"message": "Kakav je kurs?", "session_id": "p1"}, {"format": "json"}),
+            ({"message": "Kakav je kurs?", "session_id": "p2"}, {}),  # multipart (forma browsable API-ja)
+            ("message=Kakav+je+kurs%3F&session_id=p3", {"content_type": "application/x-www-form-urlencoded"}),
+            ('{"message": ', {"content_type": "application/json"}),
+            ({}, {"format": "json"}),
+            ({"message": "x"}, {"format": "json", "HTTP_AUTHORIZATION": "Bearer nope"}),
+            ("message", {"content_type": "text/plain"}),
+        ]
+        with mock.patch("api.chat_service.groq_chat_json", return_value=dict(self.ANSWER)), \
+                mock.patch("api.chat_service.groq_chat_json_async", new=mock.AsyncMock(return_value=dict(self.ANSWER))):
+            for data, extra in payloads:
+                sync = self.client.post("/api/chat/", data, **extra)
+                async_ = self.client.post("/api/chat/async/", data, **extra)
+                with self.subTest(data=data, extra=extra):
+                    self.assertEqual(async_.status_code, sync.status_code)
+                    self.assertEqual(async_["Content-Type"], sync["Content-Type"])
+                    self.assertEqual(sorted(async_.json()), sorted(sync.json()))
+                    if sync.status_code == 200:
+                        self.assertEqual(async_.json(), sync.json())
+
+
+class WriteBehindBufferTests(TestCase):
+    def make_message(self, content):
+        return ChatMessage(session_id="wb", role="user", content=content)
+
+    def test_rows_are_written_in_one_batch_on_flush(self):
+        buf = WriteBehindBuffer(ChatMessage, flush_size=100, flush_interval=60)
+        first = self.make_message("prva")
+        buf.add(first)
+        buf.add(self.make_message("druga"))
+        self.assertEqual(ChatMessage.objects.filter(session_id="wb").count(), 0)
+
+        with self.assertNumQueries(3):  # savepoint, INSERT, release
+            self.assertEqual(buf.flush(), 2)
+        stored = list(ChatMessage.objects.filter(session_id="wb").order_by("id"))
+        self.assertEqual([m.content for m in stored], ["prva", "druga"])
+        self.assertEqual(stored[0].created_at, first.created_at)
+
+    def test_reaching_flush_size_wakes_flusher(self):
+        buf = WriteBehindBuffer(ChatMessage, flush_size=2, flush_interval=60)
+        with mock.patch.object(buf, "flush") as flush:
+            buf.add(self.make_message("a"))
+            self.assertFalse(buf._wake.is_set())
+            buf.add(self.make_message("b"))
+            buf._thread.join(0.5)
+            self.assertTrue(flush.called)
+        buf._pending.clear()
+
+    def test_disabled_buffer_saves_synchronously(self):
+        buf = WriteBehindBuffer(ChatMessage, enabled=False)
+        buf.add(self.make_message("odmah"))
+        self.assertEqual(ChatMessage.objects.filter(content="odmah").count(), 1)
+
+
+class FAQRetrievalTests(TestCase):
+    def setUp(self):
+        bump_context_version()
+        self.card = FAQEntry.objects.create(
+            question="Kako da blokiram platnu karticu?",
+            answer="Karticu možete blokirati pozivom kontakt centra 0-24.",
+        )
+        self.loan = FAQEntry.objects.create(
+            question="Koji su uslovi za stambeni kredit?",
+            answer="Za stambeni kredit potrebna je stalna zaposlenost i učešće.",
+        )
+
+    def test_bm25_ranks_matching_document_first(self):
+        index = BM25Index()
+        index.upsert(1, "blokada kartice kartica izgubljena")
+        index.upsert(2, "stambeni kredit kamata")
+        index.upsert(3, "kredit za auto")
+        ranked = [doc_id for doc_id, _, _ in index.search("stambeni kredit", k=3)]
+        self.assertEqual(ranked, [2, 3])
+
+        index.remove(2)
+        self.assertEqual([d for d, _, _ in index.search("stambeni kredit")], [3])
+
+    def test_context_carries_only_relevant_faqs(self):
+        context = build_context("Izgubio sam karticu, kako da je blokiram?")
+        self.assertIn(self.card.question, context)
+        self.assertNotIn(self.loan.question, context)
+
+        with self.assertNumQueries(0):
+            build_context("Uslovi za stambeni kredit?")
+
+    def test_context_matches_without_diacritics_and_in_cyrillic(self):
+        for message in ("Uslovi za stambeni kredit?", "uslovi za stambeni kredit", "Услови за стамбени кредит?"):
+            with self.subTest(message=message):
+                context = build_context(message)
+                self.assertIn(self.loan.question, context)
+                self.assertNotIn(self.card.question, context)
+
+        index = BM25Index()
+        index.upsert(1, "Šta je potrebno za učešće?")
+        self.assertEqual([d for d, _, _ in index.search("sta je potrebno za ucesce")], [1])
+        self.assertEqual([d for d, _, _ in index.search("Шта је учешће?")], [1])
+        self.assertEqual(index.search("šta sta je za"), [])
+
+    def test_deactivated_entry_leaves_index(self):
+        build_context("kartica")
+        self.card.is_active = False
+        self.card.save()
+        self.assertNotIn(self.card.question, build_context("Kako da blokiram karticu?"))
+
+
+class SessionHistoryTests(TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def loader(self, session_id, n):
+        self.calls.append(session_id)
+        return [{"role": "user", "content": f"{session_id}-stara"}]
+
+    def test_ring_serves_history_without_reload(self):
+        hist = SessionHistory(self.loader, max_turns=3)
+        sid = f"s-{timezone.now().timestamp()}"
+        self.assertEqual(len(hist.get(sid)), 1)
+        for i in range(4):
+            hist.append(sid, "user", f"poruka {i}")
+
+        turns = hist.get(sid)
+        self.assertEqual([t["content"] for t in turns], ["poruka 1", "poruka 2", "poruka 3"])
+        self.assertEqual(self.calls, [sid])
+
+    def test_stale_stamp_forces_reload(self):
+        a = SessionHistory(self.loader, max_turns=3)
+        b = SessionHistory(self.loader, max_turns=3)
+        sid = f"s-{timezone.now().timestamp()}"
+        a.get(sid)
+        b.get(sid)
+        b.append(sid, "user", "iz drugog workera")
+        a.get(sid)
+        self.assertEqual(self.calls, [sid, sid, sid])
+
+    def test_lru_evicts_oldest_session(self):
+        hist = SessionHistory(self.loader, max_turns=2, max_sessions=2)
+        for sid in ("x1", "x2", "x3"):
+            hist.get(sid)
+        self.assertEqual(hist.stats()["sessions"], 2)
+        self.assertEqual(hist.evictions, 1)
+
+    @mock.patch("api.chat_service.match_faq", return_value=None)
+    @mock.patch("api.chat_service.groq_chat_json")
+    def test_chat_passes_previous_turns_to_llm(self, groq, _faq):
+        from . import chat_service
+        from .groq_client import BotResponse
+
+        groq.return_value = BotResponse(reply="ok", intent="unknown", link="")
+        chat_service.session_history.clear()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="hist", password="Testpass123!"))
+        client.post("/api/chat/", {"message": "prva", "session_id": "hist-1"}, format="json")
+        client.post("/api/chat/", {"message": "druga", "session_id": "hist-1"}, format="json")
+
+        history = groq.call_args.kwargs["history"]
+        self.assertEqual([t["content"] for t in history], ["prva", "ok"])
+
+    @mock.patch("api.chat_service.match_faq", return_value=None)
+    @mock.patch("api.chat_service.groq_chat_json")
+    def test_history_is_not_shared_through_session_id(self, groq, _faq):
+        from . import chat_service
+        from .groq_client import BotResponse
+
+        groq.return_value = BotResponse(reply="ok", intent="unknown", link="")
+        owner = APIClient()
+        owner.force_authenticate(User.objects.create_user(username="vlasnik", password="Testpass123!"))
+        owner.post("/api/chat/", {"message": "moj PIN je 1234", "session_id": "tudja"}, format="json")
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username="drugi", password="Testpass123!"))
+        for client in (other, APIClient()):
+            for cold in (False, True):  # ring u memoriji i učitavanje iz baze
+                if cold:
+                    chat_service.session_history.clear()
+                client.post("/api/chat/", {"message": "ponovi", "session_id": "tudja"}, format="json")
+                self.assertNotIn("moj PIN je 1234", str(groq.call_args.kwargs["history"]))
+
+
+class PromptBudgetTests(TestCase):
+    context = (
+        "Filijale (top 10):\n- Centar (Beograd): 08:00–16:00\n- Novi Sad (Novi Sad): 09:00–17:00\n\n"
+        "FAQ (najrelevantnije):\n- Q: Kako da blokiram karticu? | A: Pozovite kontakt centar...\n"
+        "- Q: Koji su uslovi za kredit? | A: Stalna zaposlenost...\n"
+    )
+    history = [{"role": "user", "content": f"stara poruka broj {i} " * 10} for i in range(6)]
+
+    def test_fits_without_cuts_when_budget_allows(self):
+        messages, stats = assemble("sistem", "pitanje", self.context, self.history, {"korak": 1}, budget=10_000)
+        self.assertEqual(len(messages), 8)
+        self.assertFalse(stats.truncated)
+        self.assertIn("Koji su uslovi za kredit?", messages[-1]["content"])
+
+    def test_drops_history_first_then_lowest_ranked_context(self):
+        question = "Kada radi filijala?"
+        base = estimate_tokens("sistem") + estimate_tokens(question)
+        messages, stats = assemble("sistem", question, self.context, self.history, {"korak": 1}, budget=base + 80)
+
+        self.assertEqual(stats.dropped_history, len(self.history))
+        self.assertGreater(stats.dropped_context, 0)
+        self.assertLessEqual(stats.input_tokens, stats.budget)
+        user = messages[-1]["content"]
+        self.assertIn("Centar (Beograd)", user)
+        self.assertNotIn("uslovi za kredit", user)
+        self.assertIn(question, user)
+
+    def test_state_goes_last_and_question_stays(self):
+        messages, stats = assemble("sistem", "pitanje", self.context, self.history, {"korak": 1}, budget=1)
+        self.assertTrue(stats.dropped_state)
+        self.assertEqual(messages[-1]["content"], "PITANJE KORISNIKA:\npitanje")
+
+
+class JSONRepairTests(TestCase):
+    corpus = json.loads((Path(__file__).parent / "testdata" / "json_repair_corpus.json").read_text(encoding="utf-8"))
+
+    def test_corpus(self):
+        for case in self.corpus:
+            with self.subTest(case["name"]):
+                data, paths = repair_json(case["raw"])
+                self.assertEqual(list(paths), case["paths"])
+                if case["expect"] is None:
+                    self.assertIsNone(data)
+                else:
+                    self.assertEqual(_normalize_output(data), case["expect"])
+
+    def test_local_repair_skips_remote_call(self):
+        client = mock.Mock()
+        out, cacheable = _parse_content(client, "m", "{'intent': 'greeting', 'reply': 'Zdravo',}", None)
+        self.assertEqual(out["reply"], "Zdravo")
+        self.assertTrue(cacheable)
+        client.chat.completions.create.assert_not_called()
+
+    def test_truncated_output_is_shown_but_not_cached(self):
+        client = mock.Mock()
+        out, cacheable = _parse_content(client, "m", '{"intent":"general","reply":"Radimo od 8 do', None)
+        self.assertEqual(out["reply"], "Radimo od 8 do")
+        self.assertFalse(cacheable)
+        client.chat.completions.create.assert_not_called()
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker("t", window=10, min_calls=4, failure_rate=0.5, slow_seconds=2,
+                                      open_seconds=5, clock=lambda: self.now)
+
+    def test_trips_on_errors_and_slow_calls_then_probes(self):
+        b = self.breaker
+        b.record(True, 0.1)
+        b.record(False, 0.1)
+        b.record(True, 3.0)  # spor poziv se računa kao greška
+        self.assertEqual(b.state, CLOSED)
+        b.record(True, 0.1)
+        self.assertEqual(b.state, OPEN)
+        self.assertFalse(b.allow())
+
+        self.now += 5
+        self.assertEqual(b.state, HALF_OPEN)
+        self.assertTrue(b.allow())
+        self.assertFalse(b.allow())  # samo jedna proba istovremeno
+        b.record(False, 0.1)
+        self.assertEqual(b.state, OPEN)
+
+        self.now += 5
+        self.assertTrue(b.allow())
+        b.record(True, 0.1)
+        self.assertEqual(b.state, CLOSED)
+
+    def test_old_failures_leave_the_window(self):
+        b = self.breaker
+        b.record(False, 0.1)
+        b.record(False, 0.1)
+        self.now += 11
+        b.record(True, 0.1)
+        b.record(True, 0.1)
+        b.record(False, 0.1)
+        b.record(True, 0.1)
+        self.assertEqual(b.state, CLOSED)
+
+    def test_open_circuit_answers_chat_without_llm(self):
+        from .groq_client import llm_breaker
+
+        self.addCleanup(llm_breaker.reset)
+        for _ in range(llm_breaker.min_calls):
+            llm_breaker.record(False, 0.1)
+
+        with mock.patch("api.groq_client._complete") as complete:
+            r = APIClient().post("/api/chat/", {"message": "Kakav je kurs evra?"}, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["intent"], "fallback")
+        complete.assert_not_called()
+
+    def test_repair_pass_skipped_near_deadline(self):
+        client = mock.Mock()
+        before = repair_stats.stats()["remote_skipped"]
+        out, cacheable = _parse_content(client, "m", "nije json", None, deadline=time.monotonic() + 0.5)
+        self.assertFalse(cacheable)
+        self.assertEqual(out["reply"], "nije json")
+        client.chat.completions.create.assert_not_called()
+        self.assertEqual(repair_stats.stats()["remote_skipped"], before + 1)
+
+    def test_breaker_stats_are_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="u1", password="x", role="user"))
+        self.assertEqual(client.get("/api/admin/stats/llm-breaker/").status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username="a1", password="x", role="admin"))
+        r = client.get("/api/admin/stats/llm-breaker/")
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(r.data["state"], (CLOSED, OPEN, HALF_OPEN))
+
+
+class SingleFlightTests(TestCase):
+    ANSWER = {"intent": "branches_hours", "reply": "Radimo 08-16h.", "link": ""}
+
+    def setUp(self):
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+
+    def test_identical_concurrent_questions_share_one_call(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_complete(*args):
+            calls.append(args[0])
+            release.wait(2)
+            return dict(self.ANSWER), True
+
+        results = []
+        with mock.patch("api.groq_client._complete", side_effect=slow_complete):
+            threads = [
+                threading.Thread(target=lambda m=m: results.append(groq_chat_json(m, context="ctx")))
+                for m in ("Radno vreme?", "radno   VREME?", "Radno vreme?")
+            ]
+            for t in threads:
+                t.start()
+            time.sleep(0.2)
+            release.set()
+            for t in threads:
+                t.join(2)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [self.ANSWER] * 3)
+
+    def test_follower_times_out_and_errors_propagate(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=lambda: flights.do("k", lambda: release.wait(2)))
+        leader.start()
+        time.sleep(0.05)
+        with self.assertRaises(CoalesceTimeout):
+            flights.do("k", lambda: None, timeout=0.05)
+        release.set()
+        leader.join(2)
+
+        def boom():
+            raise RuntimeError("groq down")
+
+        with self.assertRaises(RuntimeError):
+            flights.do("k", boom)
+        stats = flights.stats()
+        self.assertEqual((stats["leaders"], stats["followers"], stats["timeouts"]), (2, 1, 1))
+
+    def test_async_questions_are_coalesced(self):
+        import asyncio
+        from .groq_client import groq_chat_json_async
+
+        calls = []
+
+        async def slow_acomplete(*args):
+            calls.append(args[0])
+            await asyncio.sleep(0.05)
+            return dict(self.ANSWER), True
+
+        async def run():
+            return await asyncio.gather(*(groq_chat_json_async("Radno vreme?", context="ctx") for _ in range(5)))
+
+        with mock.patch("api.groq_client._acomplete", side_effect=slow_acomplete):
+            results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(list(results), [self.ANSWER] * 5)
+
+
+class AnswerEngineTests(TestCase):
+    def setUp(self):
+        bump_context_version()
+        self.bg = Branch.objects.create(name="Knez Mihailova", address="Knez Mihailova 10", city="Beograd",
+                                        open_time=dtime(8, 0), close_time=dtime(16, 0), slot_minutes=30)
+        self.ns = Branch.objects.create(name="Bulevar", address="Bulevar oslobođenja 5", city="Novi Sad",
+                                        open_time=dtime(9, 0), close_time=dtime(12, 0), slot_minutes=60)
+        self.user = User.objects.create_user(username="eng", password="Testpass123!")
+
+    def test_hours_come_from_the_branch(self):
+        r = match_faq("Koje je radno vreme u Novom Sadu?")
+        self.assertEqual(r["intent"], "branches_hours")
+        self.assertIn("09:00 do 12:00", r["reply"])
+        self.assertNotIn("08:00", r["reply"])
+
+        r = match_faq("Kada radi filijala?")
+        self.assertIn("Knez Mihailova (Beograd) od 08:00 do 16:00", r["reply"])
+
+        r = match_faq("Радно време у Новом Саду?")
+        self.assertIn("Bulevar (Novi Sad, Bulevar oslobođenja 5) radi od 09:00 do 12:00", r["reply"])
+
+    def test_free_slots_for_city_and_day(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        tz = timezone.get_current_timezone()
+        book(self.ns, self.user, timezone.make_aware(datetime.combine(tomorrow, dtime(10, 0)), tz))
+        r = match_faq("Ima li slobodnih termina sutra u Novom Sadu?")
+        self.assertEqual(r["intent"], "appointments_slots")
+        self.assertEqual(r["reply"], "Slobodni termini sutra: Bulevar (Novi Sad): 09:00, 11:00.")
+
+    def test_next_free_slots_merges_branches(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        tz = timezone.get_current_timezone()
+        at = lambda day, h, m: timezone.make_aware(datetime.combine(day, dtime(h, m)), tz)
+        bg2 = Branch.objects.create(name="Vračar", address="Makenzijeva 1", city="Beograd",
+                                    open_time=dtime(8, 15), close_time=dtime(10, 0), slot_minutes=45)
+        book(self.bg, self.user, at(tomorrow, 8, 30))
+
+        url = "/api/slots/next/"
+        params = {"city": "beograd", "after": f"{tomorrow}T08:00", "limit": 4}
+        r = self.client.get(url, params)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(
+            [(s["branch_id"], datetime.fromisoformat(s["start_time"])) for s in r.data["slots"]],
+            [(bg2.id, at(tomorrow, 8, 15)), (self.bg.id, at(tomorrow, 9, 0)),
+             (bg2.id, at(tomorrow, 9, 0)), (self.bg.id, at(tomorrow, 9, 30))],
+        )
+        with self.assertNumQueries(0):
+            self.client.get(url, params)
+
+        r = self.client.get(url, {"city": "Нови Сад", "after": f"{tomorrow}T11:30", "limit": 2})
+        self.assertEqual([s["start_time"][:16] for s in r.data["slots"]],
+                         [f"{tomorrow + timedelta(days=1)}T09:00", f"{tomorrow + timedelta(days=1)}T10:00"])
+        far = timezone.localdate() + timedelta(days=120)
+        r = self.client.get(url, {"city": "Novi Sad", "after": f"{far}T12:00", "limit": 1})
+        self.assertEqual([s["start_time"][:16] for s in r.data["slots"]], [f"{far + timedelta(days=1)}T09:00"])
+        self.assertEqual(self.client.get(url, {"city": "Niš"}).status_code, 404)
+        self.assertEqual(self.client.get(url, {"limit": "0"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"after": "sutra"}).status_code, 400)
+
+    def test_slots_without_day_suggest_next_free(self):
+        today = timezone.localdate()
+        tz = timezone.get_current_timezone()
+        for h in (9, 10, 11):
+            book(self.ns, self.user, timezone.make_aware(datetime.combine(today, dtime(h, 0)), tz))
+        r = match_faq("Ima li slobodnih termina u Novom Sadu?")
+        self.assertEqual(r["reply"], "Danas nema slobodnih termina (Novi Sad). Prvi slobodni: Bulevar (Novi Sad) sutra u 09:00; "
+                                     "Bulevar (Novi Sad) sutra u 10:00; Bulevar (Novi Sad) sutra u 11:00.")
+
+    def test_slots_without_place_asks_for_it(self):
+        r = match_faq("Da li ima slobodnih termina?")
+        self.assertIn("Beograd, Novi Sad", r["reply"])
+
+    def test_day_extraction(self):
+        today = datetime(2026, 10, 14).date()  # sreda
+        day = lambda text: extract_day(text.lower().split(), text.lower(), today)
+        self.assertEqual(day("sutra"), datetime(2026, 10, 15).date())
+        self.assertEqual(day("u petak"), datetime(2026, 10, 16).date())
+        self.assertEqual(day("u sredu"), today)
+        self.assertEqual(day("za 3.1."), datetime(2027, 1, 3).date())
+        self.assertEqual(day("2026-11-02"), datetime(2026, 11, 2).date())
+        self.assertIsNone(day("u 8.30"))
+
+
+class LLMStandinTests(TestCase):
+    fixtures_path = Path(__file__).parent / "testdata" / "llm_fixtures.jsonl"
+
+    def start(self, **kwargs):
+        kwargs.setdefault("fixtures", load_fixtures(self.fixtures_path))
+        server, base_url = start_standin(StandinConfig(seed=1, **kwargs))
+        self.addCleanup(server.shutdown)
+        env = mock.patch.dict(os.environ, {"GROQ_BASE_URL": base_url, "GROQ_API_KEY": "standin"})
+        env.start()
+        self.addCleanup(env.stop)
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        return server, base_url
+
+    def test_replays_recorded_answer_and_default(self):
+        server, _ = self.start()
+        out = groq_chat_json("Kakav je kurs  evra", context="ctx")
+        self.assertEqual(out["intent"], "fx_rate")
+        out = groq_chat_json("Nešto sasvim novo?", context="ctx")
+        self.assertEqual(out["reply"], "Ovo je testni odgovor.")
+        self.assertEqual((server.stats["replayed"], server.stats["defaulted"]), (1, 1))
+
+    def test_chat_deadline_caps_slow_llm(self):
+        from . import chat_service
+        from .groq_client import llm_breaker
+
+        self.start(latency=parse_latency("fixed:4000"))
+        self.addCleanup(llm_breaker.reset)
+        deadline = 1.5
+        client = APIClient()
+        with mock.patch.object(chat_service, "DEADLINE_SECONDS", deadline), \
+                mock.patch.object(chat_service, "MIN_LLM_SECONDS", 0.2):
+            for n, url in enumerate(("/api/chat/", "/api/chat/async/", "/api/chat/stream/")):
+                llm_breaker.reset()
+                t0 = time.monotonic()
+                r = client.post(url, {"message": f"Koliko košta paket broj {n}?"}, format="json")
+                body = b"".join(r.streaming_content).decode() if r.streaming else r.content.decode()
+                elapsed = time.monotonic() - t0
+                with self.subTest(url=url):
+                    self.assertEqual(r.status_code, 200)
+                    self.assertIn(chat_service.FALLBACK_REPLY, body)
+                    self.assertLess(elapsed, deadline + 0.5)
+
+        # Pratilac spojenog poziva čeka najviše do sopstvenog roka.
+        self.assertLessEqual(_coalesce_wait(time.monotonic() + 0.3), 0.3)
+        self.assertEqual(_coalesce_wait(time.monotonic() - 1), 0.0)
+
+    def test_streaming_and_malformed_output(self):
+        from .groq_client import groq_chat_stream
+
+        server, _ = self.start(malformed_rate=1.0)
+        events = list(groq_chat_stream("Zdravo", context="ctx"))
+        self.assertEqual(events[-1]["type"], "done")
+        self.assertTrue(events[-1]["response"]["reply"].startswith("Zdravo!"))
+        self.assertEqual((server.stats["streamed"], server.stats["malformed"]), (1, 1))
+
+    def test_injected_errors_surface_as_exceptions(self):
+        from .groq_client import llm_breaker
+
+        self.addCleanup(llm_breaker.reset)
+        self.start(error_rate=1.0, error_codes=(500,))
+        with mock.patch.dict(os.environ, {"GROQ_MAX_RETRIES": "0"}):
+            with self.assertRaises(Exception):
+                groq_chat_json("Zdravo", context="ctx")
+
+    def test_recorder_appends_fixture(self):
+        _, upstream = self.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "rec.jsonl")
+            recorder, base_url = start_standin(StandinConfig(upstream=upstream, upstream_key="k", record_to=target))
+            self.addCleanup(recorder.shutdown)
+            with mock.patch.dict(os.environ, {"GROQ_BASE_URL": base_url}):
+                out = groq_chat_json("Šta je IPS plaćanje?", context="ctx")
+            self.assertEqual(out["intent"], "general")
+            recorded = load_fixtures(target)
+            self.assertEqual(list(recorded), ["šta je ips plaćanje"])
+
+    def test_latency_specs(self):
+        import random
+
+        rng = random.Random(0)
+        self.assertEqual(parse_latency("fixed:250")(rng, None), 0.25)
+        self.assertEqual(parse_latency("recorded:100")(rng, {"latency_ms": 640}), 0.64)
+        self.assertTrue(0.1 <= parse_latency("uniform:100,200")(rng, None) <= 0.2)
+        with self.assertRaises(ValueError):
+            parse_latency("gamma:1")
+
+
+class ChatBenchTests(TestCase):
+    def setUp(self):
+        bump_context_version()
+        server, base_url = start_standin(StandinConfig(
+            fixtures=load_fixtures(LLMStandinTests.fixtures_path), malformed_rate=0.0, seed=1,
+        ))
+        self.addCleanup(server.shutdown)
+        env = mock.patch.dict(os.environ, {"GROQ_BASE_URL": base_url, "GROQ_API_KEY": "standin"})
+        env.start()
+        self.addCleanup(env.stop)
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+
+    def test_chat_path_header(self):
+        client = APIClient()
+        paths = {}
+        for msg in ("Koje je radno vreme?", "Koliko je sati?", "Kakav je kurs evra?", "Kakav je kurs evra?"):
+            r = client.post("/api/chat/", {"message": msg, "session_id": "p1"}, format="json")
+            self.assertEqual(r.status_code, 200)
+            paths.setdefault(msg, []).append(r["X-Chat-Path"])
+        self.assertEqual(paths["Koje je radno vreme?"], ["faq"])
+        self.assertEqual(paths["Koliko je sati?"], ["fast"])
+        self.assertEqual(paths["Kakav je kurs evra?"][0], "llm")
+
+    def test_report_groups_by_path_and_category(self):
+        from .management.commands.bench_chat import Command, _percentiles
+
+        self.assertEqual(_percentiles([30.0, 10.0, 20.0])["p50_ms"], 20.0)
+        rows = [
+            {"category": "faq", "path": "faq", "status": 200, "ms": 5.0, "queries": 1},
+            {"category": "llm", "path": "llm", "status": 200, "ms": 600.0, "queries": 0},
+            {"category": "llm", "path": "repair_local", "status": 200, "ms": 650.0, "queries": 0},
+        ]
+        opts = {
+            "requests": 3, "concurrency": 1, "warmup": 0, "mix": "faq=1,llm=2", "llm_latency": "none",
+            "malformed_rate": 0.0, "error_rate": 0.0, "weather_latency": 0.0, "llm_cache": False, "seed": 1,
+        }
+        report = Command()._report(rows, 1.0, opts)
+        self.assertEqual(report["overall"]["count"], 3)
+        self.assertEqual(set(report["by_path"]), {"faq", "llm", "repair_local"})
+        self.assertEqual(report["by_category"]["llm"]["count"], 2)
+        self.assertEqual(report["by_category"]["faq"]["queries_per_request"], 1.0)
+        with self.assertRaises(CommandError):
+            Command()._parse_mix("faq=1,nepoznato=2")
+
+
+class IntentRouterTests(TestCase):
+    def setUp(self):
+        bump_context_version()
+        Branch.objects.create(name="Knez Mihailova", address="Knez Mihailova 10", city="Beograd")
+        ChatMessage.objects.create(session_id="log", role="user", content="Kakva je kamata na stambeni kredit?")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "router.npz")
+        env = mock.patch.dict(os.environ, {"INTENT_ROUTER_PATH": self.path})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_train_save_and_route(self):
+        self.assertIsNone(intent_router.route("Gde je najbliža poslovnica?"))
+
+        out = StringIO()
+        call_command("train_intent_router", stdout=out)
+        self.assertIn("holdout", out.getvalue())
+
+        router = IntentRouter.load(self.path)
+        self.assertIn("general", router.labels)
+        self.assertEqual(router.predict("Da li radite nedeljom?")[0], "branches_hours")
+        self.assertEqual(intent_router.route("Gde je najbliža poslovnica?"), "branches_list")
+        self.assertIsNone(intent_router.route("kurs franka"))
+
+    def test_log_messages_are_opt_in_and_never_labeled_general(self):
+        from .management.commands.train_intent_router import Command
+
+        ChatMessage.objects.create(session_id="log", role="user", content="Koliko je stepeni u Nišu?")
+
+        def corpus(**opts):
+            opts = {"extra": [], "log_messages": 0, "log_weight": 0.25, **opts}
+            return {text: (label, weight) for text, label, weight in Command()._corpus(opts)}
+
+        samples = corpus()
+        self.assertNotIn(normalize("Kakva je kamata na stambeni kredit?"), samples)
+        self.assertNotIn(normalize("Koliko je stepeni u Nišu?"), samples)
+
+        samples = corpus(log_messages=100)
+        self.assertNotIn(normalize("Kakva je kamata na stambeni kredit?"), samples)
+        self.assertEqual(samples[normalize("Koliko je stepeni u Nišu?")], ("weather_current", 0.25))
+
+    def test_chat_answers_routed_intent_without_llm(self):
+        call_command("train_intent_router", stdout=StringIO(), holdout=0)
+        client = APIClient()
+        with mock.patch("api.chat_service.groq_chat_json") as llm:
+            r = client.post("/api/chat/", {"message": "Gde je najbliža poslovnica?", "session_id": "r1"}, format="json")
+        llm.assert_not_called()
+        self.assertEqual(r["X-Chat-Path"], "router")
+        self.assertIsNone(match_faq("Gde je najbliža poslovnica?"))
+        self.assertEqual(r.data["intent"], "branches_list")
+        self.assertIn("Knez Mihailova 10", r.data["reply"])
+
+
+class LLMLedgerTests(TestCase):
+    def setUp(self):
+        fixtures = load_fixtures(LLMStandinTests.fixtures_path)
+        server, base_url = start_standin(StandinConfig(fixtures=fixtures, seed=1))
+        self.addCleanup(server.shutdown)
+        self.server = server
+        env = mock.patch.dict(os.environ, {"GROQ_BASE_URL": base_url, "GROQ_API_KEY": "standin", "GROQ_MAX_RETRIES": "0"})
+        env.start()
+        self.addCleanup(env.stop)
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        from .groq_client import llm_breaker
+        self.addCleanup(llm_breaker.reset)
+
+    def test_calls_are_recorded_with_usage_and_outcome(self):
+        groq_chat_json("Kakav je kurs evra?", context="ctx")
+        groq_chat_json("Kakav je kurs evra?", context="ctx")
+        self.server.config.malformed_rate = 1.0
+        groq_chat_json("Zdravo", context="ctx")
+        self.server.config.malformed_rate = 0.0
+        self.server.config.error_rate = 1.0
+        with self.assertRaises(Exception):
+            groq_chat_json("Šta je IPS plaćanje?", context="ctx")
+
+        rows = list(LLMCall.objects.order_by("id").values_list("kind", "outcome", "intent"))
+        self.assertEqual(rows, [
+            ("completion", "ok", "fx_rate"),
+            ("cache", "ok", "fx_rate"),
+            ("completion", "repaired", "greeting"),
+            ("completion", "error", ""),
+        ])
+        first = LLMCall.objects.order_by("id").first()
+        self.assertEqual((first.prompt_tokens, first.completion_tokens), (412, 31))
+
+    def test_usage_stats_by_hour_and_intent(self):
+        groq_chat_json("Kakav je kurs evra?", context="ctx")
+        groq_chat_json("Kakav je kurs evra?", context="ctx")
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="u2", password="x", role="user"))
+        self.assertEqual(client.get("/api/admin/stats/llm/").status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username="a2", password="x", role="admin"))
+        with mock.patch.dict(os.environ, {"GROQ_PRICE_INPUT_PER_MTOK": "1", "GROQ_PRICE_OUTPUT_PER_MTOK": "2"}):
+            r = client.get("/api/admin/stats/llm/", {"hours": 2})
+        self.assertEqual(r.status_code, 200)
+        totals = r.data["totals"]
+        self.assertEqual((totals["requests"], totals["llm_calls"], totals["cache_hits"]), (2, 1, 1))
+        self.assertEqual(totals["cache_rate"], 0.5)
+        self.assertAlmostEqual(totals["cost_usd"], (412 * 1 + 31 * 2) / 1e6)
+        self.assertEqual(len(r.data["by_hour"]), 1)
+        self.assertEqual([row["intent"] for row in r.data["by_intent"]], ["fx_rate"])
+        self.assertEqual(client.get("/api/admin/stats/llm/", {"hours": "x"}).status_code, 400)
@@ -0,0 +1,26 @@
+"""
+Normalizacija teksta za determinističko prepoznavanje namera: mala slova,
+bez dijakritika i ćirilica preslovljena u latinicu, pa "šta", "sta" i "шта"
+daju isto. Tabela je unapred izračunata; po poruci to su lower i, samo za
+ne-ASCII tekst, jedan str.translate.
+"""
+from typing import Dict
+
+_CYRILLIC = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "ђ": "dj", "е": "e", "ж": "z",
+    "з": "z", "и": "i", "ј": "j", "к": "k", "л": "l", "љ": "lj", "м": "m", "н": "n",
+    "њ": "nj", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "ћ": "c", "у": "u",
+    "ф": "f", "х": "h", "ц": "c", "ч": "c", "џ": "dz", "ш": "s",
+}
+_LATIN = {"č": "c", "ć": "c", "š": "s", "ž": "z", "đ": "dj"}
+
+# Kombinujući znakovi (NFD unos, npr. "s" + U+030C) se brišu.
+_COMBINING = {cp: None for cp in range(0x0300, 0x0370)}
+
+FOLD_TABLE: Dict[int, object] = {**str.maketrans({**_CYRILLIC, **_LATIN}), **_COMBINING}
+
+
+def fold(text: str) -> str:
+    text = (text or "").lower()
+    # Čist ASCII (većina poruka bez dijakritika) nema šta da se preslovi.
+    return text if text.isascii() else text.translate(FOLD_TABLE)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import RegisterView, MeView, ChatHistoryView, EmployeeAppointmentsView, WeatherView,AppointmentsByBranchStatsView,UsersByRoleStatsView,TopUsersByAppointmentsStatsView,AppointmentsByStatusStatsView
@@ -10,7 +11,14 @@ from .views import (
     CancelAppointmentView,
     AdminAllAppointmentsView,
     BranchSlotsView,
+    BranchAvailabilityView,
+    NextFreeSlotsView,
     ChatView,
+    ChatStreamView,
+    AsyncChatView,
+    LLMBreakerView,
+    LLMUsageStatsView,
+    LLMCacheStatsView,
 )
 
 urlpatterns = [
@@ -26,8 +34,12 @@ urlpatterns = [
     path("employee/appointments/", EmployeeAppointmentsView.as_view(), name="employee_appointments"),
     path("admin/appointments/", AdminAllAppointmentsView.as_view(), name="admin_all_appointments"),
     path("branches/<int:branch_id>/slots/", BranchSlotsView.as_view(), name="branch_slots"),
+    path("branches/<int:branch_id>/availability/", BranchAvailabilityView.as_view(), name="branch_availability"),
+    path("slots/next/", NextFreeSlotsView.as_view(), name="slots_next"),
 
-    path("chat/", ChatView.as_view(), name="chat"),
+    path("chat/", (AsyncChatView if settings.CHAT_ASYNC else ChatView).as_view(), name="chat"),
+    path("chat/async/", AsyncChatView.as_view(), name="chat_async"),
+    path("chat/stream/", ChatStreamView.as_view(), name="chat_stream"),
     path("chat/history/", ChatHistoryView.as_view(), name="chat_history"),
     
     path("weather/", WeatherView.as_view(), name="weather"),
@@ -38,6 +50,9 @@ urlpatterns = [
     path("admin/stats/users-by-role/",UsersByRoleStatsView.as_view(),name="stats_users_by_role"),
     path("admin/stats/top-users/", TopUsersByAppointmentsStatsView.as_view()),
     path("admin/stats/appointments-by-status/", AppointmentsByStatusStatsView.as_view()),
+    path("admin/stats/llm-cache/", LLMCacheStatsView.as_view(), name="stats_llm_cache"),
+    path("admin/stats/llm-breaker/", LLMBreakerView.as_view(), name="stats_llm_breaker"),
+    path("admin/stats/llm/", LLMUsageStatsView.as_view(), name="stats_llm_usage"),
 ]
 
 
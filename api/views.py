@@ -1,24 +1,46 @@
-from httpx import request
-import requests
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from .faq_matcher import match_faq
+from .faq_matcher import match_faq, route_message
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import get_user_model
-from .models import Branch, Appointment, ChatMessage, FAQEntry
+from .models import Branch, Appointment, ChatMessage
 from .serializers import RegisterSerializer, UserSerializer, BranchSerializer, AppointmentSerializer
 from .permissions import IsAdminRole
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 from django.utils import timezone
 from .serializers import ChatRequestSerializer
-from .groq_client import groq_chat_json
+from .groq_client import groq_chat_stream, llm_breaker, llm_flights
+from .intent_router import intent_router
+from .json_repair import repair_stats
+from .llm_ledger import llm_ledger
+from .prompt_budget import prompt_meter
+from .response_cache import response_cache
+from .context_cache import build_context, get_snapshot
+from .booking import cancel as cancel_booking
+from .slots import availability, free_slots, next_free_slots
+from .text_normalize import fold
+from .weather import DEFAULT_CITY, WeatherConfigError, WeatherError, get_current_weather
 from .permissions import IsEmployeeRole
-import os
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+import time as _time
+import logging
+from django.db import connections
+from django.http import Http404, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+from . import chat_path, chat_service
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 User = get_user_model()
+logger = logging.getLogger(__name__)
 from django.db.models import Count
 from rest_framework.permissions import IsAuthenticated
 from .permissions import IsAdminRole
@@ -68,39 +90,47 @@ class AppointmentsByBranchStatsView(APIView):
 
         return Response(data)
 
+class LLMCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        return Response({
+            **response_cache.stats(),
+            "prompt": prompt_meter.stats(),
+            "json_repair": repair_stats.stats(),
+            "coalescing": llm_flights.stats(),
+            "intent_router": intent_router.stats(),
+        })
+
+class LLMUsageStatsView(APIView):
+    """Evidencija LLM poziva (llm_ledger) za poslednjih ?hours= sati, po satu i po nameri."""
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        try:
+            hours = min(max(int(request.query_params.get("hours", 24)), 1), 24 * 31)
+        except ValueError:
+            return Response({"error": "hours mora biti ceo broj"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(llm_ledger.report(timezone.now() - timedelta(hours=hours)))
+
+class LLMBreakerView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        return Response(llm_breaker.stats())
+
 class WeatherView(APIView):
     def get(self, request):
-        city = request.query_params.get("city", "Belgrade")
-        api_key = os.getenv("OPENWEATHER_API_KEY")
+        city = request.query_params.get("city", DEFAULT_CITY)
 
-        if not api_key:
+        try:
+            return Response(get_current_weather(city))
+        except WeatherConfigError as e:
             return Response(
-                {"error": "OPENWEATHER_API_KEY nije podešen"},
+                {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-
-        url = "https://api.openweathermap.org/data/2.5/weather"
-        params = {
-            "q": city,
-            "appid": api_key,
-            "units": "metric",
-            "lang": "sr"
-        }
-
-        try:
-            r = requests.get(url, params=params, timeout=10)
-            r.raise_for_status()
-            data = r.json()
-
-            return Response({
-                "city": data["name"],
-                "temperature": data["main"]["temp"],
-                "feels_like": data["main"]["feels_like"],
-                "humidity": data["main"]["humidity"],
-                "description": data["weather"][0]["description"],
-                "wind": data["wind"]["speed"]
-            })
-        except requests.exceptions.RequestException:
+        except WeatherError:
             return Response(
                 {"error": "Greška pri pozivu OpenWeather servisa"},
                 status=status.HTTP_502_BAD_GATEWAY
@@ -174,11 +204,9 @@ class CancelAppointmentView(APIView):
         if appt.user_id != request.user.id:
             return Response({"detail": "Nemaš pravo da otkažeš ovaj termin."}, status=403)
 
-        if appt.status == "canceled":
+        if appt.status == "canceled" or not cancel_booking(appt):
             return Response({"detail": "Termin je već otkazan."}, status=400)
 
-        appt.status = "canceled"
-        appt.save(update_fields=["status"])
         return Response({"message": "Termin otkazan."})
 
 
@@ -208,6 +236,14 @@ class EmployeeAppointmentsView(APIView):
         return Response(AppointmentSerializer(qs, many=True).data)
 
 
+def _snapshot_branch(branch_id: int) -> dict:
+    """Filijala iz context snapshot-a (bez upita kad je zagrejan); 404 ako ne postoji."""
+    for b in get_snapshot().branches:
+        if b["id"] == branch_id:
+            return b
+    raise Http404("Filijala ne postoji.")
+
+
 class BranchSlotsView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -216,66 +252,134 @@ class BranchSlotsView(APIView):
         if not date_str:
             return Response({"detail": "Query param 'date' je obavezan (YYYY-MM-DD)."}, status=400)
 
-        branch = get_object_or_404(Branch, pk=branch_id)
+        branch = _snapshot_branch(branch_id)
 
         try:
             day = datetime.strptime(date_str, "%Y-%m-%d").date()
         except ValueError:
             return Response({"detail": "Pogrešan format datuma. Koristi YYYY-MM-DD."}, status=400)
 
-        tz = timezone.get_current_timezone()
+        slots = [
+            s.isoformat()
+            for s in free_slots(branch["id"], branch["open_time"], branch["close_time"], branch["slot_minutes"], day)
+        ]
 
-        start_dt = timezone.make_aware(datetime.combine(day, branch.open_time), tz)
-        end_dt = timezone.make_aware(datetime.combine(day, branch.close_time), tz)
+        return Response({
+            "branch_id": branch["id"],
+            "date": date_str,
+            "slot_minutes": branch["slot_minutes"],
+            "capacity": branch["capacity"],
+            "open_time": branch["open_time"].strftime("%H:%M"),
+            "close_time": branch["close_time"].strftime("%H:%M"),
+            "available_slots": slots
+        })
+    
+class BranchAvailabilityView(APIView):
+    """
+    Slobodni termini za opseg dana (?from=&to=, uključivo) jednim upitom.
+    Po danu "bitmap": i-ti znak je "1" ako je slobodan i-ti termin iz "slots".
+    """
+    permission_classes = [permissions.AllowAny]
+    MAX_DAYS = 92
+    DEFAULT_DAYS = 14
 
-        slot_delta = timezone.timedelta(minutes=branch.slot_minutes)
+    def get(self, request, branch_id: int):
+        branch = _snapshot_branch(branch_id)
 
-        booked = set(
-            Appointment.objects.filter(
-                branch=branch,
-                status="booked",
-                start_time__gte=start_dt,
-                start_time__lt=end_dt,
-            ).values_list("start_time", flat=True)
+        try:
+            first_str = request.query_params.get("from")
+            first = datetime.strptime(first_str, "%Y-%m-%d").date() if first_str else timezone.localdate()
+            last_str = request.query_params.get("to")
+            last = (
+                datetime.strptime(last_str, "%Y-%m-%d").date() if last_str
+                else first + timedelta(days=self.DEFAULT_DAYS - 1)
+            )
+        except ValueError:
+            return Response({"detail": "Pogrešan format datuma. Koristi YYYY-MM-DD."}, status=400)
+        if last < first:
+            return Response({"detail": "'to' ne sme biti pre 'from'."}, status=400)
+        if (last - first).days + 1 > self.MAX_DAYS:
+            return Response({"detail": f"Najviše {self.MAX_DAYS} dana po zahtevu."}, status=400)
+
+        template, days = availability(
+            branch["id"], branch["open_time"], branch["close_time"], branch["slot_minutes"], first, last
         )
+        n = len(template)
+        return Response({
+            "branch_id": branch["id"],
+            "from": first.isoformat(),
+            "to": last.isoformat(),
+            "slot_minutes": branch["slot_minutes"],
+            "open_time": branch["open_time"].strftime("%H:%M"),
+            "close_time": branch["close_time"].strftime("%H:%M"),
+            "slots": [t.strftime("%H:%M") for t in template],
+            "days": [
+                {"date": day.isoformat(), "bitmap": format(bits, f"0{n}b")[::-1] if n else "", "free": bits.bit_count()}
+                for day, bits in days
+            ],
+        })
+
 
-        slots = []
-        cur = start_dt
-        now = timezone.now()
+class NextFreeSlotsView(APIView):
+    """
+    Prvi slobodni termini preko svih filijala (?city=&after=&limit=), hronološki.
+    Trošak raste sa brojem vraćenih termina, ne sa brojem filijala x dana.
+    """
+    permission_classes = [permissions.AllowAny]
+    DEFAULT_LIMIT = 5
+    MAX_LIMIT = 50
 
-        while cur < end_dt:
-            if cur > now and cur not in booked:
-                slots.append(cur.isoformat())
-            cur += slot_delta
+    def get(self, request):
+        city = (request.query_params.get("city") or "").strip()
+        branches = get_snapshot().branches
+        if city:
+            branches = [b for b in branches if fold(b["city"]) == fold(city)]
+            if not branches:
+                return Response({"detail": f"Nema filijala u gradu '{city}'."}, status=404)
 
+        try:
+            limit = int(request.query_params.get("limit") or self.DEFAULT_LIMIT)
+        except ValueError:
+            return Response({"detail": "'limit' mora biti ceo broj."}, status=400)
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return Response({"detail": f"'limit' mora biti između 1 i {self.MAX_LIMIT}."}, status=400)
+
+        after = None
+        after_str = request.query_params.get("after")
+        if after_str:
+            try:
+                after = datetime.fromisoformat(after_str)
+            except ValueError:
+                return Response({"detail": "Pogrešan format za 'after'. Koristi YYYY-MM-DD ili ISO datum i vreme."}, status=400)
+            if timezone.is_naive(after):
+                after = timezone.make_aware(after)
+
+        found = next_free_slots(branches, after, limit)
         return Response({
-            "branch_id": branch.id,
-            "date": date_str,
-            "slot_minutes": branch.slot_minutes,
-            "open_time": branch.open_time.strftime("%H:%M"),
-            "close_time": branch.close_time.strftime("%H:%M"),
-            "available_slots": slots
+            "city": city or None,
+            "slots": [
+                {
+                    "start_time": timezone.localtime(start).isoformat(),
+                    "branch_id": b["id"],
+                    "branch_name": b["name"],
+                    "address": b["address"],
+                    "city": b["city"],
+                }
+                for start, b in found
+            ],
         })
-    
-def build_context() -> str:
-    branches = Branch.objects.all().order_by("city", "name")[:10]
-    branch_lines = [
-        f"- {b.name} ({b.city}): {b.open_time.strftime('%H:%M')}–{b.close_time.strftime('%H:%M')}"
-        for b in branches
-    ]
-
-    parts = []
-    if branch_lines:
-        parts.append("Filijale (top 10):\n" + "\n".join(branch_lines))
-    try:
-        faqs = FAQEntry.objects.filter(is_active=True).order_by("category")[:10]
-        faq_lines = [f"- Q: {f.question} | A: {f.answer[:120]}..." for f in faqs]
-        if faq_lines:
-            parts.append("FAQ (top 10):\n" + "\n".join(faq_lines))
-    except Exception:
-        pass
 
-    return "\n\n".join(parts)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = "text/event-stream"
+    format = "sse"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return _sse("error", data).encode()
 
 
 class ChatView(APIView):
@@ -290,57 +394,154 @@ class ChatView(APIView):
 
         user_obj = request.user if request.user.is_authenticated else None
 
-        ChatMessage.objects.create(
-            user=user_obj,
-            session_id=session_id,
-            role="user",
-            content=msg,
-        )
+        response = Response(chat_service.answer(msg, session_id, user_obj))
+        response["X-Chat-Path"] = chat_path.current()
+        return response
 
-        faq = match_faq(msg)
-        if faq:
-            ChatMessage.objects.create(
-                user=user_obj,
-                session_id=session_id,
-                role="assistant",
-                content=faq["reply"],
-            )
-            return Response({"intent": faq.get("intent", "faq"), "reply": faq["reply"], "link": ""})
 
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncChatView(View):
+    """
+    Async varijanta ChatView za ASGI (uvicorn workere): čekanje na model
+    ne blokira worker. Parseri, autentifikacija, content negotiation i
+    greške su ChatView-ovi (DRF), pa oba puta primaju i vraćaju isto.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        api = ChatView(args=args, kwargs=kwargs)
+        api.headers = api.default_response_headers
+        drf_request = api.request = api.initialize_request(request, *args, **kwargs)
         try:
-            context = build_context()
-            ai = groq_chat_json(msg, context=context)
-
-            reply = ai.get("reply", "Nemam odgovor trenutno.")
-            intent = ai.get("intent", "unknown")
-            link = ai.get("link", "")
-
-            ChatMessage.objects.create(
-                user=user_obj,
-                session_id=session_id,
-                role="assistant",
-                content=reply,
-            )
+            msg, session_id, user_obj = await sync_to_async(self._validated)(api, drf_request)
+            response = Response(await chat_service.aanswer(msg, session_id, user_obj))
+            response["X-Chat-Path"] = chat_path.current()
+        except Exception as exc:
+            response = api.handle_exception(exc)
+        return api.finalize_response(drf_request, response, *args, **kwargs)
+
+    @staticmethod
+    def _validated(api, request):
+        api.initial(request)
+        ser = ChatRequestSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        user_obj = request.user if request.user.is_authenticated else None
+        return ser.validated_data["message"], ser.validated_data.get("session_id") or "default", user_obj
 
-            return Response({"intent": intent, "reply": reply, "link": link or ""})
 
-        except Exception:
-            fallback = "Mogu da pomognem sa informacijama o filijalama, terminima, dokumentima i uslugama banke."
-            ChatMessage.objects.create(
-                user=user_obj,
-                session_id=session_id,
-                role="assistant",
-                content=fallback,
-            )
-            return Response({"intent": "fallback", "reply": fallback, "link": ""})
+async def _aiter_sync(iterator):
+    """
+    Sinhroni iterator u sopstvenoj niti po stream-u: thread_sensitive sync_to_async
+    bi ceo stream držao deljenu sync nit workera i blokirao sve ostale sinhrone view-ove.
+    """
+    loop = asyncio.get_running_loop()
+    sentinel = object()
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-stream")
+    try:
+        while True:
+            item = await loop.run_in_executor(pool, next, iterator, sentinel)
+            if item is sentinel:
+                return
+            yield item
+    finally:
+        # Zatvaranje generatora i DB konekcija otvorenih u toj niti, pa gašenje niti.
+        pool.submit(getattr(iterator, "close", lambda: None))
+        pool.submit(connections.close_all)
+        pool.shutdown(wait=False)
+
+
+class ChatStreamView(APIView):
+    """
+    Isto kao ChatView, ali odgovor stiže kao Server-Sent Events:
+    "delta" događaji sa delovima odgovora, pa "done" sa intent/link.
+    """
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        ser = ChatRequestSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+
+        msg = ser.validated_data["message"]
+        session_id = ser.validated_data.get("session_id") or "default"
+        user_obj = request.user if request.user.is_authenticated else None
+
+        history = chat_service.history_for(session_id, user_obj)
+        chat_service.save_message(user_obj, session_id, "user", msg)
+
+        events = self._events(msg, session_id, user_obj, history)
+        if isinstance(request._request, ASGIRequest):
+            # Pod ASGI-jem sinhroni iterator bi bio baferovan do kraja.
+            events = _aiter_sync(events)
+
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def _events(self, msg, session_id, user_obj, history):
+        deadline_started = _time.monotonic()
+        started = _time.perf_counter()
+        first_byte_ms = None
+        final = None
+        parts = []
+
+        try:
+            faq = match_faq(msg) or route_message(msg)
+            if faq:
+                events = iter([
+                    {"type": "delta", "text": faq["reply"]},
+                    {"type": "done", "response": {"intent": faq.get("intent", "faq"), "reply": faq["reply"], "link": faq.get("link", "")}},
+                ])
+            else:
+                context = build_context(msg)
+                left = chat_service.llm_time_left(deadline_started)
+                if left is None:
+                    raise TimeoutError("chat deadline exceeded before LLM call")
+                events = groq_chat_stream(
+                    msg,
+                    context=context,
+                    history=history,
+                    max_history_turns=chat_service.HISTORY_TURNS,
+                    timeout=left,
+                )
+
+            for ev in events:
+                if ev["type"] == "delta":
+                    if first_byte_ms is None:
+                        first_byte_ms = (_time.perf_counter() - started) * 1000
+                    parts.append(ev["text"])
+                    yield _sse("delta", {"text": ev["text"]})
+                else:
+                    final = ev["response"]
+        except Exception as e:
+            logger.info("Chat stream failed: %s", e)
+
+        if final is None:
+            final = chat_service.fallback_response()
+        reply = final.get("reply") or "".join(parts) or "Nemam odgovor trenutno."
+
+        if first_byte_ms is None:
+            first_byte_ms = (_time.perf_counter() - started) * 1000
+        logger.info("chat.stream ttfb_ms=%.1f total_ms=%.1f intent=%s",
+                    first_byte_ms, (_time.perf_counter() - started) * 1000, final.get("intent"))
+
+        chat_service.save_message(user_obj, session_id, "assistant", reply)
+        yield _sse("done", {
+            "intent": final.get("intent", "unknown"),
+            "reply": reply,
+            "link": final.get("link") or "",
+            "ttfb_ms": round(first_byte_ms, 1),
+        })
+
 
 class ChatHistoryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
+        chat_service.chat_log.flush()
         qs = ChatMessage.objects.filter(
             user=request.user
-        ).order_by("created_at")
+        ).order_by("created_at", "id")
 
         data = [
             {
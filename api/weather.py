@@ -0,0 +1,153 @@
+import os
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+DEFAULT_CITY = "Belgrade"
+
+
+class WeatherError(Exception):
+    pass
+
+
+class WeatherConfigError(WeatherError):
+    pass
+
+
+def fetch_openweather(city: str) -> Dict[str, Any]:
+    api_key = os.getenv("OPENWEATHER_API_KEY")
+    if not api_key:
+        raise WeatherConfigError("OPENWEATHER_API_KEY nije podešen")
+
+    params = {
+        "q": city,
+        "appid": api_key,
+        "units": "metric",
+        "lang": "sr"
+    }
+    try:
+        r = requests.get(OPENWEATHER_URL, params=params, timeout=10)
+        r.raise_for_status()
+        data = r.json()
+        return {
+            "city": data["name"],
+            "temperature": data["main"]["temp"],
+            "feels_like": data["main"]["feels_like"],
+            "humidity": data["main"]["humidity"],
+            "description": data["weather"][0]["description"],
+            "wind": data["wind"]["speed"]
+        }
+    except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
+        raise WeatherError("Greška pri pozivu OpenWeather servisa") from e
+
+
+@dataclass
+class _Entry:
+    data: Dict[str, Any]
+    fetched_at: float
+
+
+@dataclass
+class _Flight:
+    done: threading.Event = field(default_factory=threading.Event)
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[Exception] = None
+
+
+class WeatherProvider:
+    """
+    Keš trenutnog vremena po gradu:
+    - svež unos (mlađi od ttl) vraća se odmah
+    - zastareo unos (do ttl + stale_ttl) vraća se odmah, a osvežava se u pozadini
+    - istovremeni promašaji za isti grad dele jedan poziv ka OpenWeather-u
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Dict[str, Any]] = fetch_openweather,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+        wait_timeout: float = 15.0,
+        max_cities: int = 256,
+    ):
+        self._fetch = fetch
+        self.ttl = float(os.getenv("WEATHER_CACHE_TTL", "600")) if ttl is None else ttl
+        self.stale_ttl = float(os.getenv("WEATHER_STALE_TTL", "1800")) if stale_ttl is None else stale_ttl
+        self.wait_timeout = wait_timeout
+        self.max_cities = max_cities
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._flights: Dict[str, _Flight] = {}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, city: str = DEFAULT_CITY) -> Dict[str, Any]:
+        city = (city or DEFAULT_CITY).strip() or DEFAULT_CITY
+        key = city.lower()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl:
+                    return entry.data
+                if age < self.ttl + self.stale_ttl:
+                    if key not in self._flights:
+                        flight = self._flights[key] = _Flight()
+                        threading.Thread(
+                            target=self._run_flight, args=(key, city, flight), daemon=True
+                        ).start()
+                    return entry.data
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._run_flight(key, city, flight)
+        elif not flight.done.wait(self.wait_timeout):
+            raise WeatherError("Isteklo vreme čekanja na vremensku prognozu")
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.data
+
+    def _run_flight(self, key: str, city: str, flight: _Flight) -> None:
+        try:
+            flight.data = self._fetch(city)
+        except Exception as e:
+            flight.error = e
+            logger.info("Weather fetch for %s failed: %s", city, e)
+        finally:
+            with self._lock:
+                if flight.data is not None:
+                    self._entries[key] = _Entry(flight.data, time.monotonic())
+                    if len(self._entries) > self.max_cities:
+                        oldest = min(self._entries, key=lambda k: self._entries[k].fetched_at)
+                        del self._entries[oldest]
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+provider = WeatherProvider()
+
+
+def get_current_weather(city: str = DEFAULT_CITY) -> Dict[str, Any]:
+    return provider.get(city)
+
+
+async def aget_current_weather(city: str = DEFAULT_CITY) -> Dict[str, Any]:
+    # Keš i single-flight rade preko niti, pa se poziv samo skloni sa event loop-a.
+    return await sync_to_async(provider.get, thread_sensitive=False)(city)
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import os
+import threading
+from typing import List, Optional
+
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Skuplja nesačuvane instance modela u memoriji i upisuje ih jednim
+    bulk_create-om kada ih bude flush_size ili kada prođe flush_interval sekundi.
+    Upis radi pozadinska nit, pa add() nikad ne radi I/O (bezbedno i iz async koda).
+    Kada je enabled=False, add() odmah radi save() (testovi, debug).
+    """
+
+    def __init__(
+        self,
+        model,
+        flush_size: int = 50,
+        flush_interval: float = 1.0,
+        max_pending: int = 5000,
+        enabled: bool = True,
+    ):
+        self.model = model
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self.flushed = 0
+        self.dropped = 0
+        self._reset()
+        atexit.register(self.flush)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: List = []
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, obj) -> None:
+        if not self.enabled:
+            obj.save()
+            return
+
+        with self._lock:
+            self._pending.append(obj)
+            full = len(self._pending) >= self.flush_size
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.model.__name__}", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    async def aadd(self, obj) -> None:
+        if not self.enabled:
+            await obj.asave()
+            return
+        self.add(obj)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create(batch)
+            except Exception:
+                logger.exception("Write-behind flush of %d %s rows failed", len(batch), self.model.__name__)
+                with self._lock:
+                    self._pending[:0] = batch
+                    overflow = len(self._pending) - self.max_pending
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        self.dropped += overflow
+                return 0
+            self.flushed += len(batch)
+            return len(batch)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._pending:
+                continue
+            close_old_connections()
+            self.flush()
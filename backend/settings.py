@@ -92,6 +92,34 @@ if DATABASE_URL:
     except Exception:
         raise
 
+# Deljeni keš (verzija konteksta, bitmape termina) mora biti vidljiv svim workerima:
+# u deploymentu je to Redis (REDIS_URL); lokalno, sa jednim procesom, dovoljan je LocMemCache.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+            "LOCATION": os.getenv("CACHE_LOCATION", "chatbot"),
+            # Bitmape termina su po (filijala, dan); podrazumevanih 300 ključeva bi se stalno čistilo.
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "10000"))},
+        }
+    }
+
+# Pod ASGI-jem (uvicorn workeri) /api/chat/ ide na async view.
+CHAT_ASYNC = os.getenv("CHAT_ASYNC", "0") == "1"
+
+# Chat poruke se upisuju odloženo, u serijama; testovi (settings_test) upisuju odmah.
+CHAT_LOG_WRITE_BEHIND = os.getenv("CHAT_LOG_WRITE_BEHIND", "1") == "1"
+CHAT_LOG_FLUSH_SIZE = int(os.getenv("CHAT_LOG_FLUSH_SIZE", "50"))
+CHAT_LOG_FLUSH_INTERVAL = float(os.getenv("CHAT_LOG_FLUSH_INTERVAL", "1.0"))
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
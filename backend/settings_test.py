@@ -0,0 +1,19 @@
+"""
+Podešavanja za testove: isti projekat, ali sa sopstvenim in-memory kešom,
+da testovi ne dele keš (verziju konteksta, bitmape termina) sa dev instancom,
+i sa sinhronim upisom chat poruka i LLM evidencije (bez write-behind niti).
+
+    python manage.py test                                   # bira ova podešavanja
+    DJANGO_SETTINGS_MODULE=backend.settings_test <runner>   # ostali test runneri
+"""
+from .settings import *  # noqa: F401,F403
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "tests",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+CHAT_LOG_WRITE_BEHIND = False
@@ -0,0 +1,89 @@
+"""
+Kalendar slobodnih termina za N dana: N zahteva na /slots/ (po dan) naspram
+jednog zahteva na /availability/, sa praznim ("hladno") i zagrejanim kešom
+bitmapa (slot_cache). Radi nad privremenom test bazom.
+
+    python -m benchmarks.availability --days 60 --fill 0.5 --rounds 20
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.booking import rebuild_occupancy
+from api.context_cache import bump_context_version
+from api.models import Appointment, Branch, User
+
+
+def _seed(days: int, fill: float, rng: random.Random) -> Branch:
+    branch = Branch.objects.create(name="Bench", address="Bench 1", city="Beograd",
+                                   open_time=dtime(8, 0), close_time=dtime(16, 0), slot_minutes=15)
+    user = User.objects.create_user(username="bench", password="x")
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    rows = []
+    for d in range(days):
+        day = today + timedelta(days=d)
+        for m in range(8 * 60, 16 * 60, branch.slot_minutes):
+            if rng.random() < fill:
+                start = timezone.make_aware(datetime.combine(day, dtime(m // 60, m % 60)), tz)
+                rows.append(Appointment(user=user, branch=branch, start_time=start))
+    Appointment.objects.bulk_create(rows)
+    rebuild_occupancy()
+    return branch
+
+
+def _measure(fn, rounds: int, cold: bool):
+    timings, queries = [], 0
+    for _ in range(rounds):
+        if cold:
+            bump_context_version()  # novi ključevi: prazan keš bitmapa (i snapshot filijala)
+        with CaptureQueriesContext(connection) as captured:
+            t0 = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - t0) * 1000)
+        queries += len(captured)
+    return statistics.median(timings), queries / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--fill", type=float, default=0.5, help="udeo zauzetih termina")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        branch = _seed(args.days, args.fill, random.Random(42))
+        client = Client()
+        today = timezone.localdate()
+        dates = [today + timedelta(days=d) for d in range(args.days)]
+
+        def per_day():
+            for day in dates:
+                assert client.get(f"/api/branches/{branch.id}/slots/", {"date": str(day)}).status_code == 200
+
+        def ranged():
+            r = client.get(f"/api/branches/{branch.id}/availability/", {"from": str(dates[0]), "to": str(dates[-1])})
+            assert r.status_code == 200
+
+        print(f"{args.days} dana, {Appointment.objects.count()} zauzetih termina")
+        print(f"{'način':<28} {'keš':<8} {'p50 ms':>9} {'upita':>7}")
+        for name, fn in ((f"/slots/ x {args.days}", per_day), ("/availability/ x 1", ranged)):
+            for cold in (True, False):
+                ms, q = _measure(fn, args.rounds, cold)
+                print(f"{name:<28} {'hladan' if cold else 'topao':<8} {ms:>9.2f} {q:>7.0f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
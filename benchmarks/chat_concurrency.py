@@ -0,0 +1,126 @@
+"""
+Deployment sinhrono naspram async: isti projekat pokrenut kao gunicorn sa N
+sinhronih workera (backend.wsgi) i kao gunicorn sa jednim uvicorn workerom
+(backend.asgi, CHAT_ASYNC=1). Oba dobijaju iste istovremene POST /api/chat/
+zahteve preko HTTP-a (view, serializer, upis poruka u privremenu SQLite
+bazu), a LLM je lokalni stub sa fiksnim kašnjenjem.
+
+    python -m benchmarks.chat_concurrency --requests 200 --workers 4 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stub_llm import start_stub
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server se ugasio (kod {proc.returncode})")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("server nije odgovorio na vreme")
+
+
+async def _fire(base_url: str, requests: int):
+    # Svi zahtevi stižu odjednom; latencija se meri od dolaska, pa uključuje i
+    # čekanje u redu na slobodan worker.
+    limits = httpx.Limits(max_connections=requests, max_keepalive_connections=requests)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        async def one(i: int):
+            r = await client.post("/api/chat/", json={"message": f"Objasni mi uslov broj {i}", "session_id": f"b{i}"})
+            return time.perf_counter() - arrived, r.status_code, r.headers.get("X-Chat-Path", "")
+
+        arrived = time.perf_counter()
+        return await asyncio.gather(*(one(i) for i in range(requests)))
+
+
+def _report(label: str, results, wall: float):
+    latencies = sorted(x[0] * 1000 for x in results)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    errors = sum(1 for _, code, _ in results if code != 200)
+    paths = sorted({p for _, _, p in results})
+    print(
+        f"{label:14s} requests={len(latencies)} wall={wall:.2f}s rps={len(latencies) / wall:.1f} "
+        f"p50={statistics.median(latencies):.0f}ms p95={p95:.0f}ms errors={errors} paths={','.join(paths)}"
+    )
+
+
+def _run(label: str, cmd, env, requests: int):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [*cmd, "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        _wait_ready(base_url + "/api/branches/", proc)
+        t0 = time.perf_counter()
+        results = asyncio.run(_fire(base_url, requests))
+        _report(label, results, time.perf_counter() - t0)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4, help="broj sinhronih gunicorn workera")
+    parser.add_argument("--latency", type=float, default=0.2, help="kašnjenje stub LLM-a u sekundama")
+    args = parser.parse_args()
+
+    server, llm_url = start_stub(latency=args.latency)
+    db = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+    cache_dir = tempfile.TemporaryDirectory()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{db.name}",
+        "CACHE_BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "CACHE_LOCATION": cache_dir.name,
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": llm_url,
+        "GROQ_CACHE_TTL": "0",
+        "GROQ_POOL_MAX_CONNECTIONS": str(max(args.requests, args.workers)),
+        "INTENT_ROUTER": "0",
+        "DEBUG": "0",
+    }
+    try:
+        subprocess.run([sys.executable, "manage.py", "migrate", "--noinput", "-v", "0"], cwd=ROOT, env=env, check=True)
+        gunicorn = [sys.executable, "-m", "gunicorn"]
+        _run(f"wsgi sync x{args.workers}", [*gunicorn, "backend.wsgi:application", "--workers", str(args.workers)],
+             env, args.requests)
+        _run("asgi uvicorn x1", [*gunicorn, "backend.asgi:application", "--workers", "1",
+                                 "--worker-class", "uvicorn_worker.UvicornWorker"],
+             {**env, "CHAT_ASYNC": "1"}, args.requests)
+    finally:
+        server.shutdown()
+        cache_dir.cleanup()
+        os.unlink(db.name)
+
+
+if __name__ == "__main__":
+    main()
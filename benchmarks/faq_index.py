@@ -0,0 +1,63 @@
+"""
+Latencija BM25 pretrage nad sintetičkim FAQ korpusom (bez baze).
+
+    python -m benchmarks.faq_index --docs 10000 --queries 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from api.faq_index import BM25Index
+
+
+def _corpus(n_docs: int, vocab_size: int, rng: random.Random):
+    vocab = [f"rec{i}" for i in range(vocab_size)]
+    weights = [1.0 / (i + 1) for i in range(vocab_size)]  # Zipf
+    for doc_id in range(n_docs):
+        length = rng.randint(15, 60)
+        yield doc_id, " ".join(rng.choices(vocab, weights=weights, k=length))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    docs = list(_corpus(args.docs, args.vocab, rng))
+    index = BM25Index()
+
+    t0 = time.perf_counter()
+    for doc_id, text in docs:
+        index.upsert(doc_id, text)
+    t_ingest = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    index.search("rec1", k=1)
+    t_build = time.perf_counter() - t0
+
+    queries = [" ".join(rng.choice(docs)[1].split()[:rng.randint(2, 8)]) for _ in range(args.queries)]
+    timings = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q, k=args.k)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+
+    t0 = time.perf_counter()
+    index.upsert(0, docs[1][1])
+    index.search("rec1", k=1)
+    t_update = time.perf_counter() - t0
+
+    print(f"docs={args.docs} ingest={t_ingest * 1000:.0f}ms materialize={t_build * 1000:.1f}ms "
+          f"update+rematerialize={t_update * 1000:.1f}ms")
+    print(f"queries={len(timings)} p50={statistics.median(timings):.0f}us "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:.0f}us p99={timings[int(len(timings) * 0.99) - 1]:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
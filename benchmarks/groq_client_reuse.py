@@ -0,0 +1,73 @@
+"""
+Latencija po pozivu groq_chat_json-a sa novim klijentom za svaki poziv
+(staro ponašanje) i sa deljenim pool-om konekcija.
+
+    python -m benchmarks.groq_client_reuse --calls 200 --latency 0.005
+"""
+import argparse
+import os
+import statistics
+import time
+from unittest import mock
+
+from openai import OpenAI
+
+from api import groq_client as gc
+from api.llm_ledger import llm_ledger
+from api.response_cache import response_cache
+from benchmarks.stub_llm import start_stub
+
+
+def _fresh_client() -> OpenAI:
+    return OpenAI(api_key=os.environ["GROQ_API_KEY"], base_url=os.environ["GROQ_BASE_URL"])
+
+
+def _run(calls: int, fresh: bool):
+    timings = []
+    for i in range(calls):
+        t0 = time.perf_counter()
+        if fresh:
+            client = _fresh_client()
+            with mock.patch.object(gc, "groq_client", return_value=client):
+                gc.groq_chat_json(f"pitanje {i}")
+            client.close()
+        else:
+            gc.groq_chat_json(f"pitanje {i}")
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def _report(label: str, timings, connections: int):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:8s} calls={len(timings)} mean={statistics.mean(timings):.2f}ms "
+        f"p50={statistics.median(timings):.2f}ms p95={p95:.2f}ms new_tcp_connections={connections}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="kašnjenje stub servera u sekundama")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(latency=args.latency)
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["GROQ_BASE_URL"] = base_url
+    response_cache.ttl = 0
+    # Meri se samo klijent; sintetički pozivi ne smeju u LLMCall (ni u bazu koja možda nije migrirana).
+    llm_ledger.enabled = False
+
+    _run(5, fresh=False)
+    for label, fresh in (("fresh", True), ("pooled", False)):
+        server.connections = 0
+        timings = _run(args.calls, fresh=fresh)
+        _report(label, timings, server.connections)
+
+    gc.client_manager.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Pogoci determinističkog matchera nad označenim porukama iz api/testdata
+(latinica sa i bez dijakritika, ćirilica) uz staru normalizaciju (samo
+lower) i novu (text_normalize.fold), i cena normalizacije po poruci.
+
+    python -m benchmarks.intent_normalize --rounds 20000
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from api.faq_matcher import INTENT_KEYWORDS
+from api.intent_matcher import IntentMatcher, Target
+from api.text_normalize import fold
+
+LABELED = Path(__file__).resolve().parent.parent / "api" / "testdata" / "intent_messages.jsonl"
+
+
+def _build(norm) -> IntentMatcher:
+    return IntentMatcher([
+        (Target(intent=intent, priority=p), [norm(k) for k in keywords])
+        for p, (intent, keywords) in enumerate(INTENT_KEYWORDS)
+    ])
+
+
+def _score(norm, labeled):
+    matcher = _build(norm)
+    hits = correct = wrong = 0
+    for rec in labeled:
+        found = matcher.match(norm(rec["message"]))
+        intent = found[0].intent if found else None
+        hits += rec["intent"] is not None and intent == rec["intent"]
+        correct += intent == rec["intent"]
+        wrong += intent is not None and intent != rec["intent"]
+    return hits, correct, wrong
+
+
+def _cost_ns(norm, messages, rounds: int) -> float:
+    t0 = time.perf_counter_ns()
+    for _ in range(rounds):
+        for m in messages:
+            norm(m)
+    return (time.perf_counter_ns() - t0) / (rounds * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    labeled = [json.loads(line) for line in LABELED.read_text(encoding="utf-8").splitlines() if line.strip()]
+    messages = [rec["message"] for rec in labeled]
+    expected = sum(rec["intent"] is not None for rec in labeled)
+
+    print(f"{'normalizacija':<14} {'pogoci':>10} {'tačno':>10} {'pogrešno':>9} {'ns/poruka':>10}")
+    for name, norm in (("lower", str.lower), ("fold", fold)):
+        hits, correct, wrong = _score(norm, labeled)
+        cost = _cost_ns(norm, messages, args.rounds)
+        print(f"{name:<14} {hits:>4}/{expected:<5} {correct:>4}/{len(labeled):<5} {wrong:>9} {cost:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
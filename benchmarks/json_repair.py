@@ -0,0 +1,53 @@
+"""
+Lokalna popravka JSON izlaza nad korpusom iz api/testdata: latencija po slučaju
+i koliko slučajeva bi ranije išlo na drugi (repair) LLM poziv.
+
+    python -m benchmarks.json_repair --rounds 2000
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from api.groq_client import _extract_first_json_object_balanced
+from api.json_repair import repair_json
+
+CORPUS = Path(__file__).resolve().parent.parent / "api" / "testdata" / "json_repair_corpus.json"
+
+
+def _old_parse_ok(raw: str) -> bool:
+    for candidate in (raw, _extract_first_json_object_balanced(raw)):
+        try:
+            json.loads(candidate)
+            return True
+        except ValueError:
+            pass
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = json.loads(CORPUS.read_text(encoding="utf-8"))
+    remote_before = remote_after = 0
+
+    print(f"{'slučaj':<26} {'putanje':<48} {'p50 us':>8}")
+    for case in corpus:
+        raw = case["raw"]
+        timings = []
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            data, paths = repair_json(raw)
+            timings.append((time.perf_counter() - t0) * 1e6)
+        remote_before += not _old_parse_ok(raw)
+        remote_after += data is None
+        print(f"{case['name']:<26} {','.join(paths):<48} {statistics.median(timings):>8.1f}")
+
+    print(f"\nrepair LLM pozivi: pre={remote_before}/{len(corpus)} posle={remote_after}/{len(corpus)}")
+
+
+if __name__ == "__main__":
+    main()
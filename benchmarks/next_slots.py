@@ -0,0 +1,94 @@
+"""
+"Prvi slobodni termin u gradu": petlja filijala x dan preko /slots/ logike
+(free_slots) naspram heap spajanja tokova po filijali (next_free_slots).
+Radi nad privremenom test bazom; prvi dani su gotovo puni.
+
+    python -m benchmarks.next_slots --branches 20 --full-days 10 --limit 5
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.booking import rebuild_occupancy
+from api.context_cache import bump_context_version, get_snapshot
+from api.models import Appointment, Branch, User
+from api.slots import free_slots, next_free_slots
+
+
+def _seed(branches: int, full_days: int, rng: random.Random):
+    user = User.objects.create_user(username="bench", password="x")
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    rows = []
+    for n in range(branches):
+        branch = Branch.objects.create(name=f"Bench {n}", address=f"Bench {n}", city="Beograd",
+                                       open_time=dtime(8, 0), close_time=dtime(16, 0), slot_minutes=15)
+        for d in range(full_days + 1):
+            day = today + timedelta(days=d)
+            for m in range(8 * 60, 16 * 60, branch.slot_minutes):
+                # Poslednji dan je poluprazan, pa prvi slobodni termini padaju tek tada.
+                if d < full_days or rng.random() < 0.5:
+                    start = timezone.make_aware(datetime.combine(day, dtime(m // 60, m % 60)), tz)
+                    rows.append(Appointment(user=user, branch=branch, start_time=start))
+    Appointment.objects.bulk_create(rows)
+    rebuild_occupancy()
+
+
+def naive(branches, limit: int):
+    found = []
+    day = timezone.localdate()
+    while len(found) < limit:
+        for b in branches:
+            found += [(s, b) for s in free_slots(b["id"], b["open_time"], b["close_time"], b["slot_minutes"], day)]
+        day += timedelta(days=1)
+    return sorted(found, key=lambda x: (x[0], x[1]["id"]))[:limit]
+
+
+def _measure(fn, rounds: int, cold: bool):
+    timings, queries = [], 0
+    for _ in range(rounds):
+        if cold:
+            bump_context_version()
+        branches = get_snapshot().branches
+        with CaptureQueriesContext(connection) as captured:
+            t0 = time.perf_counter()
+            fn(branches)
+            timings.append((time.perf_counter() - t0) * 1000)
+        queries += len(captured)
+    return statistics.median(timings), queries / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--branches", type=int, default=20)
+    parser.add_argument("--full-days", type=int, default=10, help="broj potpuno zauzetih dana od danas")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        _seed(args.branches, args.full_days, random.Random(42))
+        branches = get_snapshot().branches
+        assert naive(branches, args.limit) == next_free_slots(branches, limit=args.limit)
+
+        print(f"{args.branches} filijala, {args.full_days} punih dana, limit {args.limit}")
+        print(f"{'način':<24} {'keš':<8} {'p50 ms':>9} {'upita':>7}")
+        for name, fn in (("filijala x dan", lambda b: naive(b, args.limit)),
+                         ("heap merge", lambda b: next_free_slots(b, limit=args.limit))):
+            for cold in (True, False):
+                ms, q = _measure(fn, args.rounds, cold)
+                print(f"{name:<24} {'hladan' if cold else 'topao':<8} {ms:>9.2f} {q:>7.0f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Minimalan OpenAI-kompatibilan server za benchmarke: uvek isti odgovor posle
+zadatog kašnjenja, uz brojač novih TCP konekcija. Tanak omotač oko
+api/llm_standin (fixture-i, raspodele kašnjenja, greške, stream).
+"""
+from typing import Tuple
+
+from api.llm_standin import DEFAULT_CONTENT, StandinConfig, StandinServer, parse_latency, start_standin
+
+
+def start_stub(latency: float = 0.0, content: str = DEFAULT_CONTENT) -> Tuple[StandinServer, str]:
+    return start_standin(StandinConfig(
+        default_content=content,
+        latency=parse_latency(f"fixed:{latency * 1000}"),
+    ))